@@ -0,0 +1,57 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of GNix.
+#########################################################################################
+# GNix - The Graphical Nix Project                                                      #
+#---------------------------------------------------------------------------------------#
+# GNix is free software: you can redistribute it and/or modify                          #
+# it under the terms of the GNU General Public License as published by                  #
+# the Free Software Foundation, either version 3 of the License, or any later version.  #
+#                                                                                       #
+# GNix is distributed in the hope that it will be useful,                               #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of                        #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the                         #
+# GNU General Public License for more details.                                          #
+#                                                                                       #
+# You should have received a copy of the GNU General Public License                     #
+# along with GNix.  If not, see <https://www.gnu.org/licenses/>.                        #
+#########################################################################################
+"""Folder template loading and scaffolding times"""
+import itertools
+
+import pytest
+
+from src.nix_manager.nixos_folder_templates.templates import templateRegistry
+from src.nix_manager.scaffold import expand_tree, scaffolder
+
+
+def load_all(registry: templateRegistry) -> list:
+    return [registry[key] for key in registry]
+
+
+def test_templates_uncached(benchmark):
+    benchmark(lambda: load_all(templateRegistry(cache_path=None)))
+
+
+def test_templates_cached(benchmark, tmp_path):
+    cache_path = str(tmp_path / "folder-templates.pickle")
+    load_all(templateRegistry(cache_path=cache_path))
+    benchmark(lambda: load_all(templateRegistry(cache_path=cache_path)))
+
+
+@pytest.mark.parametrize("hosts", [1, 16, 256])
+def test_expand_tree(benchmark, hosts):
+    tree = templateRegistry(cache_path=None)["default"].as_dict()
+    names = [f"host{i}" for i in range(hosts)]
+    benchmark(expand_tree, tree, hosts=names)
+
+
+@pytest.mark.parametrize("hosts", [1, 16])
+def test_scaffold(benchmark, tmp_path, hosts):
+    names = [f"host{i}" for i in range(hosts)]
+    destinations = (str(tmp_path / f"config{i}") for i in itertools.count())
+
+    def setup():
+        return (scaffolder("default", hosts=names), next(destinations)), {}
+
+    benchmark.pedantic(lambda scaffold, destination: scaffold.create(destination), setup=setup, rounds=20)
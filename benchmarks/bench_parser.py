@@ -0,0 +1,57 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of GNix.
+#########################################################################################
+# GNix - The Graphical Nix Project                                                      #
+#---------------------------------------------------------------------------------------#
+# GNix is free software: you can redistribute it and/or modify                          #
+# it under the terms of the GNU General Public License as published by                  #
+# the Free Software Foundation, either version 3 of the License, or any later version.  #
+#                                                                                       #
+# GNix is distributed in the hope that it will be useful,                               #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of                        #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the                         #
+# GNU General Public License for more details.                                          #
+#                                                                                       #
+# You should have received a copy of the GNU General Public License                     #
+# along with GNix.  If not, see <https://www.gnu.org/licenses/>.                        #
+#########################################################################################
+"""parse_nix throughput, find_key_pair latency and peak RSS over synthetic configs"""
+import pytest
+from nix_parser import find_key_pair, parse_nix
+
+from .conftest import peak_rss, rounds_for
+
+MiB = 2**20
+
+PARSE_AND_EXIT = """
+import sys
+from nix_parser import parse_nix
+with open(sys.argv[1], encoding="utf-8") as f:
+    parse_nix(f.read(), lazy=sys.argv[2] == "lazy")
+"""
+
+
+@pytest.mark.parametrize("mode", ["lazy", "dict"])
+def test_parse_throughput(benchmark, synthetic, mode):
+    script, _ = synthetic
+    benchmark.group = f"parse_nix {mode}"
+    benchmark.pedantic(parse_nix, args=(script,), kwargs={"lazy": mode == "lazy"}, rounds=rounds_for(len(script)))
+    benchmark.extra_info["bytes"] = len(script)
+    benchmark.extra_info["MiB/s"] = len(script) / MiB / benchmark.stats.stats.min
+
+
+@pytest.mark.parametrize("mode", ["lazy", "dict"])
+def test_find_key_pair_latency(benchmark, synthetic, shape, mode):
+    script, attribute = synthetic
+    tree = parse_nix(script, lazy=mode == "lazy")
+    benchmark.group = f"find_key_pair {mode}"
+    # the attribute is defined near the end, the worst case for a tree walk
+    result = benchmark(find_key_pair, tree, attribute)
+    assert result is not None
+
+
+@pytest.mark.parametrize("mode", ["lazy", "dict"])
+def test_parse_peak_rss(rss_baselines, synthetic_file, shape, size, mode):
+    peak_kib = peak_rss(PARSE_AND_EXIT, synthetic_file, mode)
+    rss_baselines.check(f"parse_nix-{mode}-{shape}-{size}", peak_kib)
@@ -0,0 +1,204 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of GNix.
+#########################################################################################
+# GNix - The Graphical Nix Project                                                      #
+#---------------------------------------------------------------------------------------#
+# GNix is free software: you can redistribute it and/or modify                          #
+# it under the terms of the GNU General Public License as published by                  #
+# the Free Software Foundation, either version 3 of the License, or any later version.  #
+#                                                                                       #
+# GNix is distributed in the hope that it will be useful,                               #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of                        #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the                         #
+# GNU General Public License for more details.                                          #
+#                                                                                       #
+# You should have received a copy of the GNU General Public License                     #
+# along with GNix.  If not, see <https://www.gnu.org/licenses/>.                        #
+#########################################################################################
+"""Before/after parser comparison, run with `python -m benchmarks.compare [REVISION]`
+
+Builds the extension of REVISION (by default the merge-base of HEAD with the
+upstream branch) and of the working tree with maturin, then runs the
+`benchmarks.parse_nix` measurements for each build in a fresh interpreter and
+prints them side by side. Modes the older build does not have are left out.
+
+Older builds print the whole AST from `parse_nix` (`println!("{:?}", ast)`).
+That line is removed from the baseline before it is built, so the comparison
+times parsing only; `--keep-debug-print` builds the baseline as it is.
+Needs git, cargo and maturin; pass `--output FILE` to record the table.
+"""
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# upstream branches tried, in order, for the default baseline
+UPSTREAM_REFS = ("@{upstream}", "origin/HEAD", "origin/main", "origin/master")
+DEBUG_PRINT = 'println!("{:?}", ast);'
+
+# MARK: measuring
+
+def measure() -> dict:
+    """Runs the measurements against whichever `nix_parser` is importable.
+    Times are in milliseconds and memory in MiB
+    """
+    import nix_parser
+    from benchmarks.parse_nix import EXAMPLE_CONFIG, ast_memory, parse_time, scaled_config
+
+    with open(EXAMPLE_CONFIG) as f:
+        script = f.read()
+    scaled = scaled_config(script, 100)
+
+    results = {
+        "parse example (ms)": parse_time(script, repeat=200) * 1000,
+        "parse example x100 (ms)": parse_time(scaled, repeat=10) * 1000,
+        "memory dict x100 (MiB)": ast_memory(scaled) / 2**20,
+    }
+    for mode in ("typed", "lazy"):
+        try:
+            nix_parser.parse_nix("{ }", **{mode: True})
+        except TypeError:
+            continue
+        results[f"memory {mode} x100 (MiB)"] = ast_memory(scaled, **{mode: True}) / 2**20
+    return results
+
+# MARK: building
+
+def build(source: str, target: str) -> None:
+    """Builds the extension in `source` with maturin and installs it into `target`
+
+    Args:
+        source (str): checkout holding the `nix_parser` crate
+        target (str): directory to install the built package into
+    """
+    wheels = os.path.join(target, "wheels")
+    subprocess.run(
+        ["maturin", "build", "--release", "--interpreter", sys.executable,
+         "--manifest-path", os.path.join(source, "nix_parser", "Cargo.toml"), "--out", wheels],
+        check=True,
+    )
+    wheel = os.path.join(wheels, os.listdir(wheels)[0])
+    subprocess.run(
+        [sys.executable, "-m", "pip", "install", "--quiet", "--no-deps", "--target", target, wheel],
+        check=True,
+    )
+
+
+def git(*args: str) -> str:
+    return subprocess.run(["git", "-C", ROOT, *args], capture_output=True, text=True, check=True).stdout.strip()
+
+
+def default_baseline() -> str:
+    """Merge-base of HEAD with the first upstream branch that exists
+
+    Raises:
+        SystemExit: there is no upstream branch to compare against
+    """
+    for ref in UPSTREAM_REFS:
+        try:
+            return git("merge-base", "HEAD", ref)
+        except subprocess.CalledProcessError:
+            continue
+    raise SystemExit("no upstream branch found, pass the baseline REVISION")
+
+
+def strip_debug_print(source: str) -> int:
+    """Removes the `println!("{:?}", ast)` debug print from the crate in `source`,
+    returns the number of lines removed"""
+    removed = 0
+    for path in glob.glob(os.path.join(source, "nix_parser", "src", "**", "*.rs"), recursive=True):
+        with open(path, encoding="utf-8") as f:
+            lines = f.readlines()
+        kept = [line for line in lines if line.strip() != DEBUG_PRINT]
+        if len(kept) != len(lines):
+            removed += len(lines) - len(kept)
+            with open(path, "w", encoding="utf-8") as f:
+                f.writelines(kept)
+    return removed
+
+
+def build_revision(revision: str, target: str, keep_debug_print: bool) -> None:
+    """Builds the extension of a git revision in a temporary worktree
+
+    Args:
+        revision (str): commit to build
+        target (str): directory to install the built package into
+        keep_debug_print (bool): build the revision as it is, AST print included
+    """
+    worktree = os.path.join(target, "src")
+    git("worktree", "add", "--detach", worktree, revision)
+    try:
+        if not keep_debug_print and strip_debug_print(worktree):
+            print(f"removed the AST debug print from {revision}", file=sys.stderr)
+        build(worktree, target)
+    finally:
+        git("worktree", "remove", "--force", worktree)
+
+
+def run_measure(target: str) -> dict:
+    """Measures the build installed in `target` in a new interpreter
+
+    Args:
+        target (str): directory the build was installed into
+    """
+    env = dict(os.environ, PYTHONPATH=target)
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.compare", "--measure"],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+# MARK: report
+
+def table(revision: str, before: dict, after: dict) -> str:
+    """Markdown table of both runs with the relative change
+
+    Args:
+        revision (str): label of the baseline column
+        before (dict): results of the baseline build
+        after (dict): results of the working tree build
+    """
+    lines = [f"| | {revision} | working tree | change |", "|---|---:|---:|---:|"]
+    for name, value in after.items():
+        if name in before:
+            change = f"{(value / before[name] - 1) * 100:+.1f}%" if before[name] else ""
+            lines.append(f"| {name} | {before[name]:.3f} | {value:.3f} | {change} |")
+        else:
+            lines.append(f"| {name} | | {value:.3f} | |")
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.compare", description=__doc__.splitlines()[0])
+    parser.add_argument("revision", nargs="?", help="baseline commit (default: merge-base with the upstream branch)")
+    parser.add_argument("--keep-debug-print", action="store_true", help="time the baseline with its AST debug print")
+    parser.add_argument("--output", help="also write the table to this file")
+    parser.add_argument("--measure", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure()))
+        return
+
+    revision = args.revision or default_baseline()
+    label = git("rev-parse", "--short", revision)
+    if args.keep_debug_print:
+        label += " (with AST print)"
+    with tempfile.TemporaryDirectory() as baseline, tempfile.TemporaryDirectory() as current:
+        build_revision(revision, baseline, args.keep_debug_print)
+        build(ROOT, current)
+        report = table(label, run_measure(baseline), run_measure(current))
+
+    print(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of GNix.
+#########################################################################################
+# GNix - The Graphical Nix Project                                                      #
+#---------------------------------------------------------------------------------------#
+# GNix is free software: you can redistribute it and/or modify                          #
+# it under the terms of the GNU General Public License as published by                  #
+# the Free Software Foundation, either version 3 of the License, or any later version.  #
+#                                                                                       #
+# GNix is distributed in the hope that it will be useful,                               #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of                        #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the                         #
+# GNU General Public License for more details.                                          #
+#                                                                                       #
+# You should have received a copy of the GNU General Public License                     #
+# along with GNix.  If not, see <https://www.gnu.org/licenses/>.                        #
+#########################################################################################
+"""Regression benchmarks, needs pytest-benchmark. Run from the repository root:
+
+    python -m pytest benchmarks --benchmark-save=baseline   # record timing baselines
+    python -m pytest benchmarks --update-rss-baselines      # record peak RSS baselines
+    python -m pytest benchmarks                             # fail on regressions
+    python -m pytest benchmarks --bench-max-size=100MiB     # include the largest configs
+
+Timings are compared with the latest saved run by pytest-benchmark, see
+pytest.ini for the threshold. Peak RSS is compared here, against
+.benchmarks/rss.json.
+"""
+import functools
+import json
+import os
+import platform
+import sys
+
+import pytest
+
+from .synthetic import GENERATORS, SIZES, parse_size, synthetic_config
+
+RSS_BASELINES = os.path.join(os.path.dirname(__file__), ".benchmarks", "rss.json")
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("gnix benchmarks")
+    group.addoption("--bench-max-size", default="10MiB", help="largest synthetic config, e.g. 100MiB (default: 10MiB)")
+    group.addoption("--rss-threshold", type=float, default=0.2, help="allowed peak RSS growth as a fraction (default: 0.2)")
+    group.addoption("--update-rss-baselines", action="store_true", help="store the measured peak RSS as the new baselines")
+
+
+def pytest_generate_tests(metafunc):
+    if "size" in metafunc.fixturenames:
+        max_size = parse_size(metafunc.config.getoption("bench_max_size"))
+        metafunc.parametrize("size", [name for name, size in SIZES.items() if size <= max_size])
+    if "shape" in metafunc.fixturenames:
+        metafunc.parametrize("shape", list(GENERATORS))
+
+
+@functools.lru_cache(maxsize=2)
+def cached_config(shape: str, size: str) -> tuple:
+    return synthetic_config(shape, SIZES[size])
+
+
+@pytest.fixture
+def synthetic(shape, size) -> tuple:
+    """(script, attribute) of the synthetic config of this shape and size"""
+    return cached_config(shape, size)
+
+
+@pytest.fixture
+def synthetic_file(synthetic, shape, size, tmp_path_factory) -> str:
+    path = tmp_path_factory.getbasetemp() / f"{shape}-{size}.nix"
+    if not path.exists():
+        path.write_text(synthetic[0], encoding="utf-8")
+    return str(path)
+
+
+def rounds_for(size: int) -> int:
+    """Timed rounds for a script of `size` bytes, about 32 MiB of input per benchmark"""
+    return max(3, min(200, 32 * 2**20 // max(size, 1)))
+
+
+# MARK: peak RSS
+def machine() -> str:
+    """Baselines are kept per platform and interpreter, like pytest-benchmark's storage"""
+    return f"{platform.system()}-{platform.python_implementation()}-{platform.python_version()}-{platform.machine()}"
+
+
+class rssBaselines:
+    """Peak RSS per benchmark in KiB, compared against and optionally replacing the stored ones"""
+    def __init__(self, path: str, threshold: float, update: bool):
+        self.path = path
+        self.threshold = threshold
+        self.update = update
+        try:
+            with open(path, encoding="utf-8") as f:
+                self.baselines = json.load(f)
+        except (OSError, ValueError):
+            self.baselines = {}
+        self.measured = {}
+
+    def check(self, name: str, peak_kib: int) -> None:
+        self.measured[name] = peak_kib
+        baseline = self.baselines.get(machine(), {}).get(name)
+        if self.update or baseline is None:
+            return
+        limit = baseline * (1 + self.threshold)
+        if peak_kib > limit:
+            pytest.fail(f"{name}: peak RSS {peak_kib / 1024:.1f} MiB exceeds the baseline {baseline / 1024:.1f} MiB by more than {self.threshold:.0%}")
+
+    def save(self) -> None:
+        self.baselines.setdefault(machine(), {}).update(self.measured)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(self.baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+
+@pytest.fixture(scope="session")
+def rss_baselines(request):
+    baselines = rssBaselines(
+        RSS_BASELINES,
+        threshold=request.config.getoption("rss_threshold"),
+        update=request.config.getoption("update_rss_baselines"),
+    )
+    yield baselines
+    if baselines.update and baselines.measured:
+        baselines.save()
+
+
+def peak_rss(code: str, *args: str) -> int:
+    """Peak resident set size in KiB of a fresh interpreter running `code`"""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(path for path in sys.path if path))
+    pid = os.posix_spawn(sys.executable, [sys.executable, "-c", code, *args], env)
+    _, status, usage = os.wait4(pid, 0)
+    if os.waitstatus_to_exitcode(status) != 0:
+        pytest.fail(f"measuring peak RSS failed with status {os.waitstatus_to_exitcode(status)}")
+    return usage.ru_maxrss
@@ -0,0 +1,247 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of GNix.
+#########################################################################################
+# GNix - The Graphical Nix Project                                                      #
+#---------------------------------------------------------------------------------------#
+# GNix is free software: you can redistribute it and/or modify                          #
+# it under the terms of the GNU General Public License as published by                  #
+# the Free Software Foundation, either version 3 of the License, or any later version.  #
+#                                                                                       #
+# GNix is distributed in the hope that it will be useful,                               #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of                        #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the                         #
+# GNU General Public License for more details.                                          #
+#                                                                                       #
+# You should have received a copy of the GNU General Public License                     #
+# along with GNix.  If not, see <https://www.gnu.org/licenses/>.                        #
+#########################################################################################
+"""Parser benchmarks, run with `python -m benchmarks.parse_nix`"""
+import fnmatch
+import os
+import resource
+import time
+
+import nix_parser
+
+from src.nix_manager.nix_syntax import join_path, split_path
+
+EXAMPLE_CONFIG = "tests/static/example-nixos-config.nix"
+
+
+def scaled_config(script: str, copies: int) -> str:
+    """Builds a valid Nix attribute set containing `copies` copies of `script`
+
+    Args:
+        script (str): Nix expression to repeat
+        copies (int): number of copies
+
+    Returns:
+        str: Nix script roughly `copies` times the size of `script`
+    """
+    bindings = "\n".join(f"  host{i} = ({script});" for i in range(copies))
+    return "{\n" + bindings + "\n}\n"
+
+
+def parse_time(script: str, repeat: int) -> float:
+    """Best of `repeat` timed `parse_nix` runs on `script`, in seconds
+
+    Args:
+        script (str): Nix script to parse
+        repeat (int): number of timed runs
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        nix_parser.parse_nix(script)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench(name: str, script: str, repeat: int) -> None:
+    """Times `parse_nix` on `script` and prints the best run and peak RSS
+
+    Args:
+        name (str): label printed with the results
+        script (str): Nix script to parse
+        repeat (int): number of timed runs
+    """
+    best = parse_time(script, repeat)
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{name:<24} {len(script) / 1024:>9.1f} KiB {best * 1000:>10.3f} ms  peak RSS {peak_rss:.1f} MiB")
+
+
+def bench_reparse(name: str, script: str, target: str, replacement: str, repeat: int) -> None:
+    """Compares `reparse_nix` with a full lazy parse for one edit of `script`
+
+    Args:
+        name (str): label printed with the results
+        script (str): Nix script to edit
+        target (str): text replaced, its last occurrence is edited
+        replacement (str): new text
+        repeat (int): number of timed runs
+    """
+    encoded = script.encode()
+    start = encoded.rindex(target.encode())
+    end = start + len(target.encode())
+    edited = (encoded[:start] + replacement.encode() + encoded[end:]).decode()
+    tree = nix_parser.parse_nix(script, lazy=True)
+
+    full = incremental = float("inf")
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        nix_parser.parse_nix(edited, lazy=True)
+        full = min(full, time.perf_counter() - begin)
+        begin = time.perf_counter()
+        nix_parser.reparse_nix(tree, script, start, end, replacement)
+        incremental = min(incremental, time.perf_counter() - begin)
+    print(f"{name:<24} full {full * 1000:>10.3f} ms  incremental {incremental * 1000:>10.3f} ms")
+
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes"""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def ast_memory(script: str, **kwargs) -> int:
+    """Bytes of resident memory held by the AST `parse_nix(script, **kwargs)` returns,
+    measured in a forked child so each mode starts from the same heap
+
+    Args:
+        script (str): Nix script to parse
+    """
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read)
+        before = current_rss()
+        ast = nix_parser.parse_nix(script, **kwargs)
+        os.write(write, str(current_rss() - before).encode())
+        del ast
+        os._exit(0)
+    os.close(write)
+    with os.fdopen(read) as f:
+        used = int(f.read() or 0)
+    os.waitpid(pid, 0)
+    return used
+
+
+def bench_memory(name: str, script: str, **kwargs) -> None:
+    """Prints the resident memory held by the AST `parse_nix(script, **kwargs)` returns
+
+    Args:
+        name (str): label printed with the results
+        script (str): Nix script to parse
+    """
+    print(f"{name:<24} AST holds {ast_memory(script, **kwargs) / 2**20:>8.1f} MiB")
+
+
+def python_query(node: dict, pattern: list[str], value: str, prefix: tuple = ()) -> list[str]:
+    """Pure Python equivalent of `Query("<pattern> = <value>")` over a dict AST,
+    used as the baseline for `bench_query`
+
+    Args:
+        node (dict): expression as returned by `parse_nix`
+        pattern (list[str]): attribute path segments, `**` must come first
+        value (str): identifier the attribute must be bound to
+        prefix (tuple): attribute path of `node`
+
+    Returns:
+        list[str]: dotted paths of the matching bindings, quoted like `QueryMatch.path`
+    """
+    (kind, fields), = node.items()
+    # the same nodes `nix_parser`'s attribute index descends into
+    if kind == "Function":
+        children = [fields["body"]]
+    elif kind in ("LetIn", "With", "Assert"):
+        children = [fields["target"]]
+    elif kind == "IfThenElse":
+        children = [fields["then"], fields["else_"]]
+    elif kind == "FunctionApplication":
+        children = fields["arguments"]
+    elif kind == "Map":
+        children = None
+    else:
+        return []
+    if children is not None:
+        return [path for child in children for path in python_query(child, pattern, value, prefix)]
+
+    found = []
+    for binding in fields["bindings"]:
+        if "KeyValue" not in binding:
+            continue
+        key_value = binding["KeyValue"]
+        names = [attribute_name(part) for part in key_value["from"]]
+        if None in names:
+            continue
+        path = prefix + tuple(names)
+        to = key_value["to"]
+        tail = pattern[1:] if pattern[0] == "**" else pattern
+        matched = len(path) >= len(tail) if pattern[0] == "**" else len(path) == len(tail)
+        if matched and all(fnmatch.fnmatchcase(name, segment) for name, segment in zip(path[-len(tail):], tail)):
+            if to.get("Identifier", {}).get("id") == value:
+                found.append(join_path(path))
+        found.extend(python_query(to, pattern, value, path))
+    return found
+
+
+def attribute_name(part: dict) -> str | None:
+    """Static name of one attribute path segment, `None` for `${...}` segments
+
+    Args:
+        part (dict): element of a `KeyValue`'s `from`
+
+    Returns:
+        str | None: `foo` for both `foo` and `"foo"`
+    """
+    if "Raw" in part:
+        return part["Raw"]["content"]
+    string = part.get("Expression", {}).get("String")
+    if string is None or not all("Raw" in piece for piece in string["parts"]):
+        return None
+    return "".join(piece["Raw"]["content"] for piece in string["parts"])
+
+
+def bench_query(name: str, script: str, selector: str, repeat: int) -> None:
+    """Compares a compiled `Query` over a lazy tree with `python_query` over the dict AST
+
+    Args:
+        name (str): label printed with the results
+        script (str): Nix script to search
+        selector (str): `<path> = <identifier>` selector understood by both
+        repeat (int): number of timed runs
+    """
+    path, value = (side.strip() for side in selector.split("="))
+    pattern = split_path(path)
+    query = nix_parser.Query(selector)
+    tree = nix_parser.parse_nix(script, lazy=True)
+    ast = nix_parser.parse_nix(script)
+
+    native = python = float("inf")
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        matches = query.run(tree)
+        native = min(native, time.perf_counter() - begin)
+        begin = time.perf_counter()
+        expected = python_query(ast, pattern, value)
+        python = min(python, time.perf_counter() - begin)
+    assert sorted(match.path for match in matches) == sorted(expected)
+    print(f"{name:<24} python {python * 1000:>10.3f} ms  native {native * 1000:>10.3f} ms  ({len(matches)} matches)")
+
+
+def main() -> None:
+    with open(EXAMPLE_CONFIG) as f:
+        script = f.read()
+
+    bench("example-nixos-config", script, repeat=200)
+    bench("example-nixos-config x100", scaled_config(script, 100), repeat=10)
+    bench_memory("memory dict x100", scaled_config(script, 100))
+    bench_memory("memory typed x100", scaled_config(script, 100), typed=True)
+    bench_memory("memory lazy x100", scaled_config(script, 100), lazy=True)
+    bench_reparse("reparse systemPackages", scaled_config(script, 100), "gnumake", "gnumake htop", repeat=10)
+    bench_query("query programs x100", scaled_config(script, 100), "**.programs.*.enable = true", repeat=10)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of GNix.
+#########################################################################################
+# GNix - The Graphical Nix Project                                                      #
+#---------------------------------------------------------------------------------------#
+# GNix is free software: you can redistribute it and/or modify                          #
+# it under the terms of the GNU General Public License as published by                  #
+# the Free Software Foundation, either version 3 of the License, or any later version.  #
+#                                                                                       #
+# GNix is distributed in the hope that it will be useful,                               #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of                        #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the                         #
+# GNU General Public License for more details.                                          #
+#                                                                                       #
+# You should have received a copy of the GNU General Public License                     #
+# along with GNix.  If not, see <https://www.gnu.org/licenses/>.                        #
+#########################################################################################
+"""GUI startup benchmark, run with `python -m benchmarks.startup`
+
+Every run starts a fresh interpreter on the offscreen Qt platform, so it works
+without a display. Startup is timed with the `loadUi` fallback and then with
+the `.ui` files compiled, which are left compiled afterwards.
+"""
+import glob
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from src.pages.ui import UI_DIRECTORY, compile_all
+
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+from PyQt5.QtWidgets import QApplication
+app = QApplication(sys.argv[:1])
+qt = time.perf_counter()
+from src.app import GNix
+imported = time.perf_counter()
+window = GNix()
+window.show()
+app.processEvents()
+shown = time.perf_counter()
+print(json.dumps({"qt": qt - start, "import": imported - qt, "window": shown - imported}))
+"""
+
+def run_once() -> dict:
+    """Starts the GUI in a new interpreter and returns the time of each phase in seconds"""
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    begin = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD], env=env, capture_output=True, text=True, check=True
+    ).stdout
+    phases = json.loads(output.strip().splitlines()[-1])
+    phases["process"] = time.perf_counter() - begin
+    return phases
+
+def bench(name: str, repeat: int) -> None:
+    """Prints the median of each startup phase over `repeat` launches
+
+    Args:
+        name (str): label printed with the results
+        repeat (int): number of launches
+    """
+    runs = [run_once() for _ in range(repeat)]
+    medians = {phase: statistics.median(run[phase] for run in runs) for phase in runs[0]}
+    print(f"{name:<24} " + "  ".join(f"{phase} {seconds * 1000:>8.1f} ms" for phase, seconds in medians.items()))
+
+def main() -> None:
+    for path in glob.glob(os.path.join(UI_DIRECTORY, "*_ui.py")):
+        os.remove(path)
+    bench("startup loadUi", repeat=10)
+    compile_all()
+    bench("startup compiled .ui", repeat=10)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of GNix.
+#########################################################################################
+# GNix - The Graphical Nix Project                                                      #
+#---------------------------------------------------------------------------------------#
+# GNix is free software: you can redistribute it and/or modify                          #
+# it under the terms of the GNU General Public License as published by                  #
+# the Free Software Foundation, either version 3 of the License, or any later version.  #
+#                                                                                       #
+# GNix is distributed in the hope that it will be useful,                               #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of                        #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the                         #
+# GNU General Public License for more details.                                          #
+#                                                                                       #
+# You should have received a copy of the GNU General Public License                     #
+# along with GNix.  If not, see <https://www.gnu.org/licenses/>.                        #
+#########################################################################################
+"""Synthetic Nix configurations of a requested size for the benchmarks
+
+Every generator returns a valid Nix attribute set of at least `size` bytes
+built from one repeated block shape, and a dotted attribute defined near
+the end of it for lookup benchmarks.
+"""
+import itertools
+
+KiB = 1024
+MiB = 1024 * KiB
+
+# name -> bytes, from a single module to a very large generated configuration
+SIZES = {
+    "1KiB": KiB,
+    "64KiB": 64 * KiB,
+    "1MiB": MiB,
+    "10MiB": 10 * MiB,
+    "100MiB": 100 * MiB,
+}
+
+# levels of one nested block, well below the parser's recursion limits
+NESTING_DEPTH = 32
+
+
+def parse_size(size: str) -> int:
+    """`10MiB`, `64KiB`, `1024` -> bytes"""
+    for suffix, factor in (("MiB", MiB), ("KiB", KiB), ("M", MiB), ("K", KiB)):
+        if size.endswith(suffix):
+            return int(float(size[:-len(suffix)]) * factor)
+    return int(size)
+
+
+def fill(size: str, blocks) -> tuple:
+    """Joins blocks from the iterable `blocks` of (text, attribute) until `size` bytes are reached"""
+    parts = ["{\n"]
+    length = 2
+    attribute = None
+    for text, attribute in blocks:
+        parts.append(text)
+        length += len(text)
+        if length >= size:
+            break
+    parts.append("}\n")
+    return "".join(parts), attribute
+
+
+def deep_blocks():
+    """`hostN = { l0 = { l1 = { ... }; }; };` nested NESTING_DEPTH levels"""
+    for i in itertools.count():
+        opening = "".join(f"{'  ' * (level + 2)}l{level} = {{\n" for level in range(NESTING_DEPTH))
+        leaf = f"{'  ' * (NESTING_DEPTH + 2)}enable = {'true' if i % 2 == 0 else 'false'};\n"
+        closing = "".join(f"{'  ' * (level + 2)}}};\n" for level in reversed(range(NESTING_DEPTH)))
+        path = ".".join(f"l{level}" for level in range(NESTING_DEPTH))
+        yield f"  host{i} = {{\n{opening}{leaf}{closing}  }};\n", f"host{i}.{path}.enable"
+
+
+def wide_blocks():
+    """Flat dotted bindings with mixed values, like a large `configuration.nix`"""
+    for i in itertools.count():
+        yield (
+            f"  services.service{i}.enable = true;\n"
+            f"  services.service{i}.port = {1024 + i % 60000};\n"
+            f"  services.service{i}.name = \"service-{i}\";\n"
+            f"  services.service{i}.settings = {{ level = {i % 7}; path = ./service{i}.conf; }};\n",
+            f"services.service{i}.port",
+        )
+
+
+def list_blocks(elements_per_block: int = 64):
+    """A single long `environment.systemPackages` list"""
+    yield "  environment.systemPackages = with pkgs; [\n", None
+    for i in itertools.count():
+        names = " ".join(f"package{i * elements_per_block + j}" for j in range(elements_per_block))
+        yield f"    {names}\n", "environment.systemPackages"
+
+
+def long_list(size: int) -> tuple:
+    script, attribute = fill(size - len("  ];\n"), list_blocks())
+    return script[:-2] + "  ];\n}\n", "environment.systemPackages"
+
+
+GENERATORS = {
+    "deep": lambda size: fill(size, deep_blocks()),
+    "wide": lambda size: fill(size, wide_blocks()),
+    "list": long_list,
+}
+
+
+def synthetic_config(shape: str, size: int) -> tuple:
+    """(script, attribute) of the `shape` generator, see GENERATORS
+
+    Args:
+        shape (str): `deep`, `wide` or `list`
+        size (int): minimum size of the script in bytes
+
+    Returns:
+        tuple: the Nix script and a dotted attribute it defines near its end
+    """
+    return GENERATORS[shape](size)
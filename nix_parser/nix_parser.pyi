@@ -1,28 +1,236 @@
-def parse_nix(nix_script: str) -> dict:
+def parse_nix(nix_script: str, lazy: bool = False, typed: bool = False) -> dict|"LazyNode"|"Expression":
     """Parses a Nix script into a dictionary
      # Arguments
      `nix_script` - A string containing the Nix script to parse.
+     `lazy`       - keep the tree on the Rust side and return a `LazyNode`
+                    handle, children are only built when they are accessed
+     `typed`      - return the typed classes below (`Map`, `Identifier`, ...)
+                    instead of dictionaries. Spans are stored as packed
+                    integers and identifiers/attribute names are shared strings,
+                    which makes large trees much smaller than the dict form
 
      # Returns
-     A dictionary representing the parsed Nix script.
+     A dictionary representing the parsed Nix script. Nodes are externally
+     tagged, e.g. `{"Map": {"recursive": False, "bindings": [...], "span": {...}}}`
+
+     # Changed
+     Nodes with an `expression` field keep all of their fields. Earlier
+     versions replaced such a node's fields with the `expression` alone:
+     ```
+     {"With": {"expression": ..., "target": ..., "span": ...}}        was {"With": <expression>}
+     {"Assert": {"expression": ..., "target": ..., "span": ...}}      was {"Assert": <expression>}
+     {"HasAttribute": {"expression": ..., "attribute_path": [...], ...}}
+     {"PropertyAccess": {"expression": ..., "attribute_path": [...], "default": ..., ...}}
+     {"Interpolation": {"expression": ..., "span": ...}}              was {"Interpolation": <expression>}
+     ```
+     so the target of `with`/`assert`, accessed attributes and defaults are no
+     longer lost
 
      # Errors
-     Returns a `PyRuntimeError` if parsing or serialization fails.
+     Raises `ValueError` if both `lazy` and `typed` are set
      ```
      """
 
-def find_key_pair(node: dict|list, key: str) -> dict|None:
+def parse_nix_file(path: str, lazy: bool = False, typed: bool = False) -> dict|"LazyNode":
+    """Parses a Nix file, see `parse_nix`. The file is read directly into the
+    buffer the parser consumes, it is never decoded into a Python `str`
+     # Errors
+     Raises `OSError` if the file cannot be read
+     """
+
+def parse_nix_bytes(data: bytes|bytearray|memoryview, lazy: bool = False, typed: bool = False) -> dict|"LazyNode":
+    """Parses UTF-8 Nix source from any object supporting the buffer protocol,
+    see `parse_nix`. Contiguous buffers, e.g. an `mmap.mmap` of the file, are
+    validated in place and copied once into the parser's input
+     # Errors
+     Raises `ValueError` if `data` is not valid UTF-8
+     """
+
+def find_key_pair(node: dict|list|"LazyNode", key: str) -> dict|"LazyNode"|None:
     """
     Recursively search the AST for a KeyValue node where `from` is `key`
     and return the first instance of `key` being defined
     # Arguments
-    `node` - A dictionary, a nix AST
+    `node` - A dictionary, a nix AST, or a `LazyNode`
     `key`  - key to search for
 
+    A dotted `key` (`networking.hostName`, `services."a.b"`) names a full
+    attribute path below `node` instead, nested sets included, and the first
+    definition in source order is returned. Dict ASTs and lazy trees give the
+    same result, lazy trees answer from the attribute index
+
+    # Returns
+    `dict|LazyNode|None` - the value defined in `key`, a `LazyNode` when
+    searching a lazy tree
+    """
+
+def find_definitions(node: "LazyNode", path: str) -> PyList["LazyNode"]:
+    """
+    Look up every binding defining the full dotted attribute `path`
+    (e.g. `networking.hostName`) in the tree `node` belongs to. Uses the
+    attribute index built at parse time, no tree walk is performed.
+    # Arguments
+    `node` - any `LazyNode` of the tree, as returned by `parse_nix(..., lazy=True)`
+    `path` - full dotted attribute path, segments that are not plain identifiers
+             are double quoted (`networking."a.b"`)
+
     # Returns
-    `dict|None` - the value defined in `key`
+    `list[LazyNode]` - `KeyValue`/`Inherit` bindings, in source order
     """
 
+def find_definitions_with_prefix(node: "LazyNode", prefix: str) -> PyList[tuple[str, "LazyNode"]]:
+    """
+    Look up every indexed attribute path starting with `prefix`
+    (e.g. `services.`) in the tree `node` belongs to
+    # Arguments
+    `node`   - any `LazyNode` of the tree
+    `prefix` - path prefix
+
+    # Returns
+    `list[tuple[str, LazyNode]]` - (path, binding) pairs sorted by path, paths
+    quoted as in `find_definitions`
+    """
+
+def parse_nix_many(paths: PyList[str], lazy: bool = False) -> PyList["ParseResult"]:
+    """Reads and parses many Nix files in parallel on a Rust thread pool, the
+    GIL is released until every file is parsed
+     # Arguments
+     `paths` - files to parse
+     `lazy`  - return `LazyNode` handles instead of dictionaries
+
+     # Returns
+     One `ParseResult` per path, in the order of `paths`. Files that cannot
+     be read have `ast = None` and the reason in `error`
+     """
+
+def parse_nix_sources(sources: PyList[tuple[str, bytes]], lazy: bool = False) -> PyList["ParseResult"]:
+    """Parses Nix sources already read into memory in parallel, like
+    `parse_nix_many`, so a caller can hash and parse the very same bytes
+     # Arguments
+     `sources` - (path, UTF-8 content) pairs, the path only labels the result
+     `lazy`    - return `LazyNode` handles instead of dictionaries
+
+     # Returns
+     One `ParseResult` per source, in order. Content that is not valid
+     UTF-8 has `ast = None` and the reason in `error`
+     """
+
+def parse_directory(root: str, glob: str = "**/*.nix", lazy: bool = False) -> PyList["ParseResult"]:
+    """Parses every file below `root` whose relative path matches `glob`, see
+    `parse_nix_many`. Hidden directories such as `.git` and symlinks to
+    directories, e.g. a flake's `result`, are skipped. A subdirectory that
+    cannot be listed is reported as a result with its `error` set and the walk
+    goes on; a file whose parse panicked only fails its own result
+     # Arguments
+     `root` - directory to scan
+     `glob` - pattern matched against paths relative to `root`, supports `**`, `*` and `?`
+     `lazy` - return `LazyNode` handles instead of dictionaries
+
+     # Errors
+     Raises `OSError` if `root` cannot be listed
+     """
+
+PARSER_VERSION: str
+"""Crate version and binary tree format version, e.g. `0.1.0-1`"""
+
+def dump_tree(node: "LazyNode") -> bytes:
+    """Serialises the tree `node` belongs to into a compact binary format,
+    positions are stored as fixed width integers and strings are interned"""
+
+def load_tree(data: bytes) -> "LazyNode":
+    """Loads a tree written by `dump_tree` and returns its root
+     # Errors
+     Raises `ValueError` if `data` is truncated, corrupt or from another format version
+     """
+
+def reparse_nix(node: "LazyNode", script: str, start: int, end: int, replacement: str) -> "LazyNode":
+    """Incrementally re-parses `script` after replacing the bytes `start..end`
+    (UTF-8 offsets) with `replacement`. Only the top-level bindings touched by
+    the edit are parsed again, the rest of the tree `node` belongs to is reused
+    with its positions shifted, text added after the last binding included.
+    Falls back to a full parse, traced as `full reparse`, when the edit reaches
+    outside the top-level bindings
+     # Arguments
+     `node`        - any `LazyNode` of the tree parsed from `script`
+     `script`      - the text before the edit
+     `start`/`end` - byte range replaced
+     `replacement` - new text
+
+     # Returns
+     `LazyNode` - root of the tree of the edited text
+
+     # Errors
+     Raises `ValueError` if the range is not valid for `script`
+     """
+
+def trace_enabled() -> bool:
+    """Whether per-phase trace events are recorded, set from the `GNIX_TRACE`
+    environment variable on import"""
+
+def set_trace_enabled(enabled: bool) -> None:
+    """Starts or stops recording trace events. While disabled, recording costs
+    one atomic load per phase and per allocation"""
+
+def take_trace_events() -> PyList[tuple[str, int, int, int, int, int]]:
+    """Removes and returns the events recorded so far
+     # Returns
+     `list` - (phase, start in µs since the Unix epoch, duration in µs, OS thread id,
+     allocations, allocated bytes) per timed phase, e.g. `nixel parse`,
+     `arena build`, `attribute index`, `python objects`, `find_key_pair`
+     """
+
+class ParseResult:
+    path: str
+    ast: Optional[dict|"LazyNode"]
+    error: Optional[str]
+
+class Query:
+    """A selector compiled once and run natively over lazy trees
+     ```
+     services.*.enable = true     bindings by attribute path, `*`/`?` match
+                                  inside one segment, `**` any number of them
+     fetchFromGitHub()            calls of a function, by name or dotted path
+     fetchFromGitHub().rev        attributes of the sets passed to those calls
+     ```
+     A trailing `= value` compares the bound value against a number, an
+     identifier (`true`, `null`, ...) or a double quoted string. Queries pickle
+     as their `source`, e.g. to be passed to worker processes
+
+     # Errors
+     Raises `ValueError` if `selector` is not valid
+     """
+    source: str
+    def __init__(self, selector: str) -> None: ...
+    def run(self, node: "LazyNode") -> PyList["QueryMatch"]:
+        """Every match in the tree `node` belongs to. Attribute selectors
+        return bindings sorted by path, call selectors in source order"""
+    def run_many(self, nodes: PyList["LazyNode"]) -> PyList[PyList["QueryMatch"]]:
+        """Runs the query over many trees in parallel with the GIL released,
+        one list of matches per node"""
+
+class QueryMatch:
+    path: str
+    """attribute path of the binding, or the dotted name of the called function"""
+    node: "LazyNode"
+    """the `KeyValue`/`Inherit` binding or `FunctionApplication` that matched"""
+    span: "Span"
+
+class LazyNode:
+    """Handle to a node of a tree kept on the Rust side, supports the same keys
+    as the dictionaries returned by `parse_nix`"""
+    kind: str
+    span: Optional["Span"]
+    text: Optional[str]
+    def keys(self) -> PyList[str]: ...
+    def __contains__(self, key: str) -> bool: ...
+    def __getitem__(self, key: str) -> "LazyNode"|PyList["LazyNode"]|str|bool|"Span"|None: ...
+    def to_dict(self) -> dict:
+        """Builds the whole subtree below this node as `parse_nix` would. A node
+        taken from `parent[key]` converts like `parent.to_dict()[key]`, e.g.
+        expression parts of an attribute path keep their `{"Expression": ...}`"""
+    def to_typed(self) -> "Expression":
+        """Builds the whole subtree below this node as `parse_nix(typed=True)` would"""
+
 from typing import Optional, Union
 from typing import List as PyList
 
@@ -110,8 +318,9 @@ class FunctionHeadDestructuredArgument:
 
 class FunctionHeadDestructured:
     ellipsis: bool
-    identifier: Identifier
-    arguments: FunctionHeadDestructuredArgument
+    identifier: Optional[Identifier]
+    arguments: PyList[FunctionHeadDestructuredArgument]
+    span: Span
 
 FunctionHead = Union[
     FunctionHeadSimple,
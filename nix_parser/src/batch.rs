@@ -0,0 +1,290 @@
+// SPDX-License-Identifier: GPL-3.0-or-later
+//
+// This file is part of GNix.
+// GNix - The Graphical Nix Project
+// -----------------------------------------------------------------------------------------|
+// GNix is free software: you can redistribute it and/or modify                             |
+// it under the terms of the GNU General Public License as published by                     |
+// the Free Software Foundation, either version 3 of the License, or any later version.     |
+//                                                                                          |
+// GNix is distributed in the hope that it will be useful,                                  |
+// but WITHOUT ANY WARRANTY; without even the implied warranty of                           |
+// MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the                            |
+// GNU General Public License for more details.                                             |
+//                                                                                          |
+// You should have received a copy of the GNU General Public License                        |
+// along with GNix.  If not, see <https://www.gnu.org/licenses/>.                           |
+// -----------------------------------------------------------------------------------------|
+
+use std::any::Any;
+use std::fs;
+use std::io;
+use std::panic::{self, AssertUnwindSafe};
+use std::path::{Path, PathBuf};
+use std::sync::atomic::{AtomicUsize, Ordering};
+use std::sync::Arc;
+use std::thread;
+
+use pyo3::exceptions::PyOSError;
+use pyo3::prelude::*;
+use pyo3::pybacked::PyBackedBytes;
+
+use crate::lazy::{node_to_py, LazyNode};
+use crate::trace;
+use crate::tree::Tree;
+
+// ==================== BATCH PARSING ====================
+// Files are read and parsed into `Tree`s on a pool of scoped worker threads with
+// the GIL released; Python objects are only created once every file is done.
+
+// MARK: ParseResult
+#[pyclass(frozen)]
+pub struct ParseResult {
+    #[pyo3(get)]
+    path: String,
+    #[pyo3(get)]
+    ast: Option<PyObject>,
+    #[pyo3(get)]
+    error: Option<String>,
+}
+
+#[pymethods]
+impl ParseResult {
+    pub fn __repr__(&self) -> String {
+        match &self.error {
+            Some(error) => format!("ParseResult('{}', error='{}')", self.path, error),
+            None => format!("ParseResult('{}')", self.path),
+        }
+    }
+}
+
+// MARK: parse_files
+pub fn parse_file(path: &Path) -> Result<Tree, String> {
+    let script = {
+        let _scope = trace::scope("read file");
+        fs::read_to_string(path).map_err(|e| e.to_string())?
+    };
+    Ok(Tree::parse(script))
+}
+
+/// Parses every file in `paths` on up to one thread per core, results keep the order of `paths`
+pub fn parse_files(paths: &[PathBuf]) -> Vec<Result<Tree, String>> {
+    parallel_map(paths, |path| parse_file(path))
+        .into_iter()
+        .map(|result| result.unwrap_or_else(|panic| Err(format!("parser panicked: {}", panic))))
+        .collect()
+}
+
+fn panic_message(payload: Box<dyn Any + Send>) -> String {
+    match payload.downcast::<String>() {
+        Ok(message) => *message,
+        Err(payload) => payload.downcast_ref::<&str>().map_or("unknown error", |message| *message).to_string(),
+    }
+}
+
+/// Runs `f` over `items` on up to one scoped thread per core, results keep the order of
+/// `items`. A panic in `f` only fails its own item, which maps to `Err` with the panic message.
+pub fn parallel_map<T, R, F>(items: &[T], f: F) -> Vec<Result<R, String>>
+where
+    T: Sync,
+    R: Send,
+    F: Fn(&T) -> R + Sync,
+{
+    let workers = thread::available_parallelism()
+        .map(|n| n.get())
+        .unwrap_or(1)
+        .min(items.len().max(1));
+    let next = AtomicUsize::new(0);
+    let mut results: Vec<Result<R, String>> = (0..items.len()).map(|_| Err("not run".to_string())).collect();
+
+    thread::scope(|scope| {
+        let handles: Vec<_> = (0..workers)
+            .map(|_| scope.spawn(|| {
+                let mut done = Vec::new();
+                loop {
+                    let i = next.fetch_add(1, Ordering::Relaxed);
+                    if i >= items.len() {
+                        break;
+                    }
+                    let result = panic::catch_unwind(AssertUnwindSafe(|| f(&items[i])));
+                    done.push((i, result.map_err(panic_message)));
+                }
+                done
+            }))
+            .collect();
+        for handle in handles {
+            for (i, result) in handle.join().unwrap_or_default() {
+                results[i] = result;
+            }
+        }
+    });
+    results
+}
+
+// MARK: collect_files
+/// Files below `root` whose path relative to `root` matches `pattern`, with the
+/// error of every directory below `root` that could not be listed. Hidden
+/// directories are skipped, and so are symlinks to directories, e.g. a flake's
+/// `result -> /nix/store/...`, which also keeps symlink cycles from looping
+pub fn collect_files(root: &Path, pattern: &str) -> io::Result<Vec<(PathBuf, Option<String>)>> {
+    let mut found = Vec::new();
+    let mut directories = vec![root.to_path_buf()];
+    while let Some(directory) = directories.pop() {
+        let entries = match fs::read_dir(&directory) {
+            Ok(entries) => entries,
+            // only `root` itself failing fails the whole walk
+            Err(e) if directory == root => return Err(e),
+            Err(e) => {
+                found.push((directory, Some(e.to_string())));
+                continue;
+            }
+        };
+        let mut entries: Vec<(PathBuf, io::Result<fs::FileType>)> = entries
+            .map(|entry| match entry {
+                Ok(entry) => (entry.path(), entry.file_type()),
+                // an entry that could not be read is reported on its directory
+                Err(e) => (directory.clone(), Err(e)),
+            })
+            .collect();
+        entries.sort_by(|a, b| a.0.cmp(&b.0));
+        for (path, file_type) in entries.into_iter().rev() {
+            let file_type = match file_type {
+                Ok(file_type) => file_type,
+                Err(e) => {
+                    found.push((path, Some(e.to_string())));
+                    continue;
+                }
+            };
+            // `file_type` does not follow symlinks, `is_dir` on the path would
+            if file_type.is_dir() {
+                let hidden = path.file_name().is_some_and(|name| name.to_string_lossy().starts_with('.'));
+                if !hidden {
+                    directories.push(path);
+                }
+            } else if file_type.is_symlink() && path.is_dir() {
+                continue;
+            } else if let Ok(relative) = path.strip_prefix(root) {
+                if glob_match(pattern, &relative.to_string_lossy()) {
+                    found.push((path, None));
+                }
+            }
+        }
+    }
+    Ok(found)
+}
+
+/// Matches `/` separated `path` against `pattern`, supports `**`, `*` and `?`
+pub fn glob_match(pattern: &str, path: &str) -> bool {
+    let pattern: Vec<&str> = pattern.split('/').collect();
+    let path: Vec<&str> = path.split('/').collect();
+    match_segments(&pattern, &path)
+}
+
+pub fn match_segments<P: AsRef<str>, S: AsRef<str>>(pattern: &[P], path: &[S]) -> bool {
+    match pattern.split_first() {
+        None => path.is_empty(),
+        Some((segment, rest)) if segment.as_ref() == "**" => {
+            (0..=path.len()).any(|skip| match_segments(rest, &path[skip..]))
+        }
+        Some((segment, rest)) => match path.split_first() {
+            Some((name, path_rest)) => {
+                match_segment(segment.as_ref().as_bytes(), name.as_ref().as_bytes()) && match_segments(rest, path_rest)
+            }
+            None => false,
+        },
+    }
+}
+
+fn match_segment(pattern: &[u8], name: &[u8]) -> bool {
+    match (pattern.split_first(), name.split_first()) {
+        (None, None) => true,
+        (Some((b'*', rest)), _) => {
+            match_segment(rest, name) || (!name.is_empty() && match_segment(pattern, &name[1..]))
+        }
+        (Some((b'?', rest)), Some((_, name_rest))) => match_segment(rest, name_rest),
+        (Some((p, rest)), Some((n, name_rest))) if p == n => match_segment(rest, name_rest),
+        _ => false,
+    }
+}
+
+// MARK: Python API
+fn results_to_py(py: Python, paths: &[PathBuf], trees: Vec<Result<Tree, String>>, lazy: bool) -> PyResult<Vec<ParseResult>> {
+    paths
+        .iter()
+        .zip(trees)
+        .map(|(path, tree)| {
+            let path = path.to_string_lossy().into_owned();
+            match tree {
+                Ok(tree) => {
+                    let ast = if lazy {
+                        let root = tree.root;
+                        Py::new(py, LazyNode::new(Arc::new(tree), root))?.into_py(py)
+                    } else {
+                        node_to_py(py, &tree, tree.root)?
+                    };
+                    Ok(ParseResult { path, ast: Some(ast), error: None })
+                }
+                Err(error) => Ok(ParseResult { path, ast: None, error: Some(error) }),
+            }
+        })
+        .collect()
+}
+
+/// Parses many files in parallel with the GIL released
+#[pyfunction]
+#[pyo3(signature = (paths, lazy=false))]
+pub fn parse_nix_many(py: Python, paths: Vec<PathBuf>, lazy: bool) -> PyResult<Vec<ParseResult>> {
+    let trees = py.allow_threads(|| {
+        let _scope = trace::scope("parse_nix_many");
+        parse_files(&paths)
+    });
+    results_to_py(py, &paths, trees, lazy)
+}
+
+/// Parses Nix sources already read into memory in parallel with the GIL released,
+/// `path` only labels each result
+#[pyfunction]
+#[pyo3(signature = (sources, lazy=false))]
+pub fn parse_nix_sources(py: Python, sources: Vec<(PathBuf, PyBackedBytes)>, lazy: bool) -> PyResult<Vec<ParseResult>> {
+    let (paths, sources): (Vec<PathBuf>, Vec<PyBackedBytes>) = sources.into_iter().unzip();
+    let data: Vec<&[u8]> = sources.iter().map(|source| &**source).collect();
+    let trees = py.allow_threads(|| {
+        let _scope = trace::scope("parse_nix_sources");
+        parallel_map(&data, |data| {
+            std::str::from_utf8(data)
+                .map(|script| Tree::parse(script.to_owned()))
+                .map_err(|e| e.to_string())
+        })
+        .into_iter()
+        .map(|result| result.unwrap_or_else(|panic| Err(format!("parser panicked: {}", panic))))
+        .collect::<Vec<_>>()
+    });
+    results_to_py(py, &paths, trees, lazy)
+}
+
+/// Parses every file below `root` matching `glob` in parallel with the GIL released
+#[pyfunction]
+#[pyo3(signature = (root, glob="**/*.nix", lazy=false))]
+pub fn parse_directory(py: Python, root: PathBuf, glob: &str, lazy: bool) -> PyResult<Vec<ParseResult>> {
+    let (paths, trees) = py
+        .allow_threads(|| {
+            let _scope = trace::scope("parse_directory");
+            let found = collect_files(&root, glob)?;
+            let files: Vec<PathBuf> = found.iter().filter(|(_, error)| error.is_none()).map(|(path, _)| path.clone()).collect();
+            let mut parsed = parse_files(&files).into_iter();
+            // unreadable directories become error results in walk order
+            let (paths, trees): (Vec<PathBuf>, Vec<Result<Tree, String>>) = found
+                .into_iter()
+                .map(|(path, error)| {
+                    let tree = match error {
+                        Some(error) => Err(error),
+                        None => parsed.next().unwrap_or_else(|| Err("not parsed".to_string())),
+                    };
+                    (path, tree)
+                })
+                .unzip();
+            Ok::<_, io::Error>((paths, trees))
+        })
+        .map_err(|e| PyOSError::new_err(e.to_string()))?;
+    results_to_py(py, &paths, trees, lazy)
+}
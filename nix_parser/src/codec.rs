@@ -0,0 +1,205 @@
+// SPDX-License-Identifier: GPL-3.0-or-later
+//
+// This file is part of GNix.
+// GNix - The Graphical Nix Project
+// -----------------------------------------------------------------------------------------|
+// GNix is free software: you can redistribute it and/or modify                             |
+// it under the terms of the GNU General Public License as published by                     |
+// the Free Software Foundation, either version 3 of the License, or any later version.     |
+//                                                                                          |
+// GNix is distributed in the hope that it will be useful,                                  |
+// but WITHOUT ANY WARRANTY; without even the implied warranty of                           |
+// MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the                            |
+// GNU General Public License for more details.                                             |
+//                                                                                          |
+// You should have received a copy of the GNU General Public License                        |
+// along with GNix.  If not, see <https://www.gnu.org/licenses/>.                           |
+// -----------------------------------------------------------------------------------------|
+
+use std::sync::Arc;
+
+use pyo3::exceptions::PyValueError;
+use pyo3::prelude::*;
+use pyo3::types::PyBytes;
+
+use crate::index::AttrIndex;
+use crate::lazy::LazyNode;
+use crate::trace;
+use crate::tree::{Edge, Field, Kind, Node, TextSpan, Tree, NO_SYMBOL};
+
+// ==================== BINARY TREE FORMAT ====================
+// Little endian, fixed width records:
+//
+//   header   b"GNXT" | format u32 | nodes u32 | edges u32 | symbols u32 | root u32
+//   node     kind u8 | flag u8 | text u32 | span 4 x u32 | first_edge u32 | edge_count u32
+//   edge     field u8 | node u32
+//   symbol   length u32 | utf-8 bytes
+//
+// The attribute index is rebuilt on load, it is cheaper than storing it.
+
+pub const MAGIC: &[u8; 4] = b"GNXT";
+pub const FORMAT_VERSION: u32 = 1;
+
+// MARK: encode
+pub fn encode(tree: &Tree) -> Vec<u8> {
+    let symbol_bytes: usize = tree.symbols.iter().map(|symbol| symbol.len() + 4).sum();
+    let mut out = Vec::with_capacity(24 + tree.nodes.len() * 26 + tree.edges.len() * 5 + symbol_bytes);
+    out.extend_from_slice(MAGIC);
+    for value in [
+        FORMAT_VERSION,
+        tree.nodes.len() as u32,
+        tree.edges.len() as u32,
+        tree.symbols.len() as u32,
+        tree.root,
+    ] {
+        out.extend_from_slice(&value.to_le_bytes());
+    }
+    for node in &tree.nodes {
+        out.push(node.kind as u8);
+        out.push(node.flag as u8);
+        for value in [
+            node.text,
+            node.span.start_line,
+            node.span.start_column,
+            node.span.end_line,
+            node.span.end_column,
+            node.first_edge,
+            node.edge_count,
+        ] {
+            out.extend_from_slice(&value.to_le_bytes());
+        }
+    }
+    for edge in &tree.edges {
+        out.push(edge.field as u8);
+        out.extend_from_slice(&edge.node.to_le_bytes());
+    }
+    for symbol in &tree.symbols {
+        out.extend_from_slice(&(symbol.len() as u32).to_le_bytes());
+        out.extend_from_slice(symbol.as_bytes());
+    }
+    out
+}
+
+// MARK: decode
+struct Reader<'a> {
+    data: &'a [u8],
+    offset: usize,
+}
+
+impl<'a> Reader<'a> {
+    fn take(&mut self, length: usize) -> Result<&'a [u8], String> {
+        let end = self.offset.checked_add(length).filter(|&end| end <= self.data.len())
+            .ok_or_else(|| "truncated tree data".to_string())?;
+        let bytes = &self.data[self.offset..end];
+        self.offset = end;
+        Ok(bytes)
+    }
+
+    fn u8(&mut self) -> Result<u8, String> {
+        Ok(self.take(1)?[0])
+    }
+
+    fn u32(&mut self) -> Result<u32, String> {
+        let bytes = self.take(4)?;
+        Ok(u32::from_le_bytes([bytes[0], bytes[1], bytes[2], bytes[3]]))
+    }
+}
+
+pub fn decode(data: &[u8]) -> Result<Tree, String> {
+    let mut reader = Reader { data, offset: 0 };
+    if reader.take(4)? != MAGIC {
+        return Err("not a GNix tree".to_string());
+    }
+    let version = reader.u32()?;
+    if version != FORMAT_VERSION {
+        return Err(format!("unsupported tree format {}", version));
+    }
+    let node_count = reader.u32()? as usize;
+    let edge_count = reader.u32()? as usize;
+    let symbol_count = reader.u32()? as usize;
+    let root = reader.u32()?;
+
+    // every count is bounded by the remaining input before allocating
+    if node_count.saturating_mul(26) > data.len() || edge_count.saturating_mul(5) > data.len() {
+        return Err("truncated tree data".to_string());
+    }
+
+    let mut tree = Tree::default();
+    tree.nodes.reserve(node_count);
+    for _ in 0..node_count {
+        let kind = *Kind::ALL.get(reader.u8()? as usize).ok_or("unknown node kind")?;
+        let flag = reader.u8()? != 0;
+        let text = reader.u32()?;
+        let span = TextSpan {
+            start_line: reader.u32()?,
+            start_column: reader.u32()?,
+            end_line: reader.u32()?,
+            end_column: reader.u32()?,
+        };
+        let first_edge = reader.u32()?;
+        let edge_count = reader.u32()?;
+        tree.nodes.push(Node { kind, flag, text, span, first_edge, edge_count });
+    }
+    tree.edges.reserve(edge_count);
+    for _ in 0..edge_count {
+        let field = *Field::ALL.get(reader.u8()? as usize).ok_or("unknown field")?;
+        let node = reader.u32()?;
+        tree.edges.push(Edge { field, node });
+    }
+    for _ in 0..symbol_count {
+        let length = reader.u32()? as usize;
+        let text = std::str::from_utf8(reader.take(length)?).map_err(|e| e.to_string())?;
+        tree.symbols.push(text.into());
+    }
+    tree.root = root;
+    validate(&tree)?;
+    tree.index = AttrIndex::build(&tree);
+    Ok(tree)
+}
+
+/// Checks every reference in a decoded tree so a corrupt cache entry cannot panic
+/// or loop later. Children are always built before their parent, so every edge
+/// must point at a lower node id.
+fn validate(tree: &Tree) -> Result<(), String> {
+    if tree.root as usize >= tree.nodes.len() {
+        return Err("root out of range".to_string());
+    }
+    for (id, node) in tree.nodes.iter().enumerate() {
+        let start = node.first_edge as usize;
+        let Some(edges) = tree.edges.get(start..start + node.edge_count as usize) else {
+            return Err("edge range out of bounds".to_string());
+        };
+        if edges.iter().any(|edge| edge.node as usize >= id) {
+            return Err("edge target out of range".to_string());
+        }
+        if node.text != NO_SYMBOL && node.text as usize >= tree.symbols.len() {
+            return Err("symbol out of range".to_string());
+        }
+    }
+    Ok(())
+}
+
+// MARK: Python API
+/// Serialises the tree `node` belongs to into the compact binary format
+#[pyfunction]
+pub fn dump_tree<'py>(py: Python<'py>, node: &Bound<'py, LazyNode>) -> Bound<'py, PyBytes> {
+    let tree = node.get().tree.clone();
+    let data = py.allow_threads(|| {
+        let _scope = trace::scope("encode tree");
+        encode(&tree)
+    });
+    PyBytes::new_bound(py, &data)
+}
+
+/// Loads a tree written by `dump_tree`, returns its root
+#[pyfunction]
+pub fn load_tree(py: Python, data: &[u8]) -> PyResult<LazyNode> {
+    let tree = py
+        .allow_threads(|| {
+            let _scope = trace::scope("decode tree");
+            decode(data)
+        })
+        .map_err(PyValueError::new_err)?;
+    let root = tree.root;
+    Ok(LazyNode::new(Arc::new(tree), root))
+}
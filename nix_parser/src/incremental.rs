@@ -0,0 +1,279 @@
+// SPDX-License-Identifier: GPL-3.0-or-later
+//
+// This file is part of GNix.
+// GNix - The Graphical Nix Project
+// -----------------------------------------------------------------------------------------|
+// GNix is free software: you can redistribute it and/or modify                             |
+// it under the terms of the GNU General Public License as published by                     |
+// the Free Software Foundation, either version 3 of the License, or any later version.     |
+//                                                                                          |
+// GNix is distributed in the hope that it will be useful,                                  |
+// but WITHOUT ANY WARRANTY; without even the implied warranty of                           |
+// MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the                            |
+// GNU General Public License for more details.                                             |
+//                                                                                          |
+// You should have received a copy of the GNU General Public License                        |
+// along with GNix.  If not, see <https://www.gnu.org/licenses/>.                           |
+// -----------------------------------------------------------------------------------------|
+
+use std::collections::HashMap;
+use std::sync::Arc;
+
+use pyo3::exceptions::PyValueError;
+use pyo3::prelude::*;
+
+use crate::index::AttrIndex;
+use crate::lazy::LazyNode;
+use crate::source::{advance, LineIndex};
+use crate::trace;
+use crate::tree::{Edge, Field, Kind, Node, NodeId, Symbol, TextSpan, Tree, NO_SYMBOL};
+
+// ==================== INCREMENTAL RE-PARSE ====================
+// An edit inside the top-level attribute set of a file only re-parses the
+// bindings it touches: from the binding the edit starts in (or after) to the
+// binding it ends in (or before). Those bindings are parsed on their own, padded
+// so nixel reports positions in the coordinates of the whole file, and spliced
+// into a copy of the old tree. Nodes after the edit keep their records and only
+// get their positions shifted. An edit after the last binding (a binding
+// appended to the set) re-parses the last binding up to the closing brace.
+// Edits that reach outside the bindings (the function head, the braces) or that
+// leave the fragment unparsable fall back to a full parse, traced as
+// `full reparse`.
+
+// MARK: Edit
+#[derive(Clone, Copy)]
+struct Shift {
+    start: (u32, u32),
+    old_end: (u32, u32),
+    new_end: (u32, u32),
+}
+
+impl Shift {
+    fn position(&self, line: u32, column: u32) -> (u32, u32) {
+        if (line, column) < self.old_end {
+            return (line, column);
+        }
+        if line == self.old_end.0 {
+            (self.new_end.0, self.new_end.1 + column - self.old_end.1)
+        } else {
+            (line - self.old_end.0 + self.new_end.0, column)
+        }
+    }
+
+    fn span(&self, span: TextSpan) -> TextSpan {
+        // nodes ending exactly where the edit starts are left alone
+        let (start_line, start_column) = self.position(span.start_line, span.start_column);
+        let (end_line, end_column) = if (span.end_line, span.end_column) <= self.start {
+            (span.end_line, span.end_column)
+        } else {
+            self.position(span.end_line, span.end_column)
+        };
+        TextSpan { start_line, start_column, end_line, end_column }
+    }
+}
+
+/// The attribute set whose bindings are the top level of the file
+pub fn config_map(tree: &Tree) -> Option<NodeId> {
+    let mut id = tree.root;
+    loop {
+        let field = match tree.node(id).kind {
+            Kind::Map => return Some(id),
+            Kind::Function => Field::Body,
+            Kind::LetIn | Kind::With | Kind::Assert => Field::Target,
+            _ => return None,
+        };
+        id = tree.child(id, field)?;
+    }
+}
+
+fn has_errors(tree: &Tree) -> bool {
+    tree.nodes.iter().any(|node| node.kind == Kind::Error)
+}
+
+// MARK: reparse
+/// Tree of `script` with bytes `start..end` replaced by `replacement`
+pub fn reparse(tree: &Tree, script: &str, start: usize, end: usize, replacement: &str) -> Tree {
+    let new_script = [&script[..start], replacement, &script[end..]].concat();
+    if let Some(new_tree) = try_reparse(tree, script, &new_script, start, end, replacement) {
+        return new_tree;
+    }
+    let _scope = trace::scope("full reparse");
+    Tree::parse(new_script)
+}
+
+/// Byte offset of the closing brace of the attribute set `map`
+fn closing_brace(tree: &Tree, map: NodeId, script: &str, lines: &LineIndex) -> Option<usize> {
+    let span = tree.node(map).span;
+    let brace = lines.offset(span.end_line, span.end_column).checked_sub(1)?;
+    (script.as_bytes().get(brace) == Some(&b'}')).then_some(brace)
+}
+
+fn try_reparse(tree: &Tree, script: &str, new_script: &str, start: usize, end: usize, replacement: &str) -> Option<Tree> {
+    let map = config_map(tree)?;
+    let lines = LineIndex::new(script);
+    let bindings: Vec<NodeId> = tree.children(map, Field::Bindings).collect();
+    let range = |binding: NodeId| {
+        let span = tree.node(binding).span;
+        (lines.offset(span.start_line, span.start_column), lines.offset(span.end_line, span.end_column))
+    };
+
+    // first binding starting at or before the edit, last binding ending at or after it
+    let first = bindings.iter().rposition(|&binding| range(binding).0 <= start)?;
+    let (last, old_end, terminator) = match bindings[first..].iter().position(|&binding| range(binding).1 >= end) {
+        Some(offset) => (first + offset, range(bindings[first + offset]).1, ";}"),
+        // the edit ends after the last binding, the fragment runs up to the brace
+        None => {
+            let brace = closing_brace(tree, map, script, &lines)?;
+            if end > brace {
+                return None;
+            }
+            (bindings.len() - 1, brace, "}")
+        }
+    };
+    let old_start = range(bindings[first]).0;
+    if !script.is_char_boundary(old_start) || !script.is_char_boundary(old_end) {
+        return None;
+    }
+    let new_end = old_end + replacement.len() - (end - start);
+
+    // pad the fragment so it starts at the same line and column as in the file
+    let (line, column) = lines.position(old_start);
+    let mut fragment = String::with_capacity(line as usize + column as usize + new_end - old_start + 2);
+    fragment.push('{');
+    if line == 1 {
+        fragment.extend(std::iter::repeat(' ').take((column as usize).checked_sub(2)?));
+    } else {
+        fragment.extend(std::iter::repeat('\n').take(line as usize - 1));
+        fragment.extend(std::iter::repeat(' ').take(column as usize - 1));
+    }
+    fragment.push_str(&new_script[old_start..new_end]);
+    fragment.push_str(terminator);
+
+    let parsed = Tree::parse(fragment);
+    if parsed.node(parsed.root).kind != Kind::Map || has_errors(&parsed) {
+        return None;
+    }
+    let replacements: Vec<NodeId> = parsed.children(parsed.root, Field::Bindings).collect();
+    if replacements.is_empty() {
+        return None;
+    }
+
+    let start_position = lines.position(start);
+    let shift = Shift {
+        start: start_position,
+        old_end: lines.position(end),
+        new_end: advance(start_position.0, start_position.1, replacement),
+    };
+    let mut splicer = Splicer {
+        out: Tree::default(),
+        symbol_ids: HashMap::new(),
+        old: tree,
+        fragment: &parsed,
+        map,
+        bindings: &bindings,
+        replaced: first..=last,
+        replacements: &replacements,
+        shift,
+    };
+    let root = splicer.copy_old(tree.root);
+    let mut out = splicer.out;
+    out.root = root;
+    out.index = AttrIndex::build(&out);
+    Some(out)
+}
+
+// MARK: Splicer
+struct Splicer<'a> {
+    out: Tree,
+    symbol_ids: HashMap<&'a str, Symbol>,
+    old: &'a Tree,
+    fragment: &'a Tree,
+    map: NodeId,
+    bindings: &'a [NodeId],
+    replaced: std::ops::RangeInclusive<usize>,
+    replacements: &'a [NodeId],
+    shift: Shift,
+}
+
+impl<'a> Splicer<'a> {
+    fn intern(&mut self, text: &'a str) -> Symbol {
+        if let Some(&symbol) = self.symbol_ids.get(text) {
+            return symbol;
+        }
+        let symbol = self.out.symbols.len() as Symbol;
+        self.out.symbols.push(text.into());
+        self.symbol_ids.insert(text, symbol);
+        symbol
+    }
+
+    fn push(&mut self, source: &'a Tree, node: &Node, span: TextSpan, edges: Vec<Edge>) -> NodeId {
+        let text = match node.text {
+            NO_SYMBOL => NO_SYMBOL,
+            symbol => self.intern(source.symbol(symbol)),
+        };
+        let first_edge = self.out.edges.len() as u32;
+        let edge_count = edges.len() as u32;
+        self.out.edges.extend(edges);
+        self.out.nodes.push(Node { kind: node.kind, flag: node.flag, text, span, first_edge, edge_count });
+        (self.out.nodes.len() - 1) as NodeId
+    }
+
+    /// Copies a node of the old tree, shifting positions after the edit
+    fn copy_old(&mut self, id: NodeId) -> NodeId {
+        let old = self.old;
+        let edges = if id == self.map {
+            let (bindings, replacements, replaced) = (self.bindings, self.replacements, self.replaced.clone());
+            let mut edges = Vec::new();
+            for (i, &binding) in bindings.iter().enumerate() {
+                if i == *replaced.start() {
+                    for &replacement in replacements {
+                        let node = self.copy_fragment(replacement);
+                        edges.push(Edge { field: Field::Bindings, node });
+                    }
+                }
+                if !replaced.contains(&i) {
+                    let node = self.copy_old(binding);
+                    edges.push(Edge { field: Field::Bindings, node });
+                }
+            }
+            edges
+        } else {
+            old.edges(id)
+                .iter()
+                .map(|edge| Edge { field: edge.field, node: self.copy_old(edge.node) })
+                .collect()
+        };
+        let node = old.node(id);
+        let span = self.shift.span(node.span);
+        self.push(old, node, span, edges)
+    }
+
+    /// Copies a node of the re-parsed fragment, its positions are already final
+    fn copy_fragment(&mut self, id: NodeId) -> NodeId {
+        let fragment = self.fragment;
+        let edges = fragment
+            .edges(id)
+            .iter()
+            .map(|edge| Edge { field: edge.field, node: self.copy_fragment(edge.node) })
+            .collect();
+        let node = fragment.node(id);
+        self.push(fragment, node, node.span, edges)
+    }
+}
+
+// MARK: Python API
+/// Re-parses `script` after replacing bytes `start..end` with `replacement`,
+/// reusing every part of the tree `node` belongs to that the edit does not touch
+#[pyfunction]
+pub fn reparse_nix(py: Python, node: &Bound<'_, LazyNode>, script: &str, start: usize, end: usize, replacement: &str) -> PyResult<LazyNode> {
+    if start > end || end > script.len() || !script.is_char_boundary(start) || !script.is_char_boundary(end) {
+        return Err(PyValueError::new_err(format!("invalid edit range {}..{}", start, end)));
+    }
+    let tree = node.get().tree.clone();
+    let new_tree = py.allow_threads(|| {
+        let _scope = trace::scope("reparse");
+        reparse(&tree, script, start, end, replacement)
+    });
+    let root = new_tree.root;
+    Ok(LazyNode::new(Arc::new(new_tree), root))
+}
@@ -0,0 +1,212 @@
+// SPDX-License-Identifier: GPL-3.0-or-later
+//
+// This file is part of GNix.
+// GNix - The Graphical Nix Project
+// -----------------------------------------------------------------------------------------|
+// GNix is free software: you can redistribute it and/or modify                             |
+// it under the terms of the GNU General Public License as published by                     |
+// the Free Software Foundation, either version 3 of the License, or any later version.     |
+//                                                                                          |
+// GNix is distributed in the hope that it will be useful,                                  |
+// but WITHOUT ANY WARRANTY; without even the implied warranty of                           |
+// MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the                            |
+// GNU General Public License for more details.                                             |
+//                                                                                          |
+// You should have received a copy of the GNU General Public License                        |
+// along with GNix.  If not, see <https://www.gnu.org/licenses/>.                           |
+// -----------------------------------------------------------------------------------------|
+
+use std::collections::HashMap;
+
+use crate::tree::{Field, Kind, NodeId, Tree};
+
+// ==================== ATTRIBUTE INDEX ====================
+// Maps full dotted attribute paths (`networking.hostName`) to every binding that
+// defines them. Segments that are not plain identifiers are quoted as in Nix
+// (`networking."a.b"`), so a quoted `"a.b"` never collides with a nested `a.b`.
+// Built once per tree, exact lookups are a hash lookup and prefix queries are a
+// binary search over the sorted paths.
+//
+// Nested attribute sets extend the path of the binding they are the value of.
+// Function bodies, `let`/`with`/`assert` targets, `if` branches and function
+// application arguments (`lib.mkIf cond { ... }`) keep the current path;
+// attribute sets anywhere else (lists, `let` bindings, ...) are not part of the
+// config tree and are not indexed.
+
+// MARK: AttrIndex
+#[derive(Clone, Debug, Default)]
+pub struct AttrIndex {
+    definitions: HashMap<Box<str>, Vec<NodeId>>,
+    sorted_paths: Vec<Box<str>>,
+}
+
+impl AttrIndex {
+    pub fn build(tree: &Tree) -> Self {
+        let mut index = AttrIndex::default();
+        if !tree.nodes.is_empty() {
+            visit_bindings(tree, tree.root, "", &mut |path, binding| index.insert(path, binding));
+        }
+        index.sorted_paths = index.definitions.keys().cloned().collect();
+        index.sorted_paths.sort_unstable();
+        index
+    }
+
+    pub fn len(&self) -> usize {
+        self.sorted_paths.len()
+    }
+
+    pub fn is_empty(&self) -> bool {
+        self.sorted_paths.is_empty()
+    }
+
+    /// Every binding defining exactly `path`, in source order
+    pub fn get(&self, path: &str) -> &[NodeId] {
+        self.definitions.get(path).map(Vec::as_slice).unwrap_or_default()
+    }
+
+    /// Every indexed path starting with `prefix`, sorted, with its bindings
+    pub fn with_prefix<'a>(&'a self, prefix: &'a str) -> impl Iterator<Item = (&'a str, &'a [NodeId])> + 'a {
+        let start = self.sorted_paths.partition_point(|path| &**path < prefix);
+        self.sorted_paths[start..]
+            .iter()
+            .take_while(move |path| path.starts_with(prefix))
+            .map(move |path| (&**path, self.get(path)))
+    }
+
+    fn insert(&mut self, path: String, binding: NodeId) {
+        self.definitions.entry(path.into_boxed_str()).or_default().push(binding);
+    }
+}
+
+/// Report every statically named binding reachable from `id` as `(path, binding)`,
+/// following the same rules as the index. Paths are relative to `prefix`.
+pub fn visit_bindings(tree: &Tree, id: NodeId, prefix: &str, sink: &mut dyn FnMut(String, NodeId)) {
+    match tree.node(id).kind {
+        Kind::Map => {
+            for binding in tree.children(id, Field::Bindings) {
+                visit_binding(tree, binding, prefix, sink);
+            }
+        }
+        Kind::Function => {
+            if let Some(body) = tree.child(id, Field::Body) {
+                visit_bindings(tree, body, prefix, sink);
+            }
+        }
+        Kind::LetIn | Kind::With | Kind::Assert => {
+            if let Some(target) = tree.child(id, Field::Target) {
+                visit_bindings(tree, target, prefix, sink);
+            }
+        }
+        Kind::IfThenElse => {
+            for field in [Field::Then, Field::Else] {
+                if let Some(branch) = tree.child(id, field) {
+                    visit_bindings(tree, branch, prefix, sink);
+                }
+            }
+        }
+        Kind::FunctionApplication => {
+            for argument in tree.children(id, Field::Arguments) {
+                visit_bindings(tree, argument, prefix, sink);
+            }
+        }
+        _ => {}
+    }
+}
+
+fn visit_binding(tree: &Tree, binding: NodeId, prefix: &str, sink: &mut dyn FnMut(String, NodeId)) {
+    match tree.node(binding).kind {
+        Kind::KeyValue => {
+            let mut path = prefix.to_string();
+            for part in tree.children(binding, Field::From) {
+                // dynamic attributes (`${name} = ...`) have no static path
+                let Some(segment) = attribute_name(tree, part) else {
+                    return;
+                };
+                push_segment(&mut path, &segment);
+            }
+            if let Some(value) = tree.child(binding, Field::To) {
+                visit_bindings(tree, value, &path, sink);
+            }
+            sink(path, binding);
+        }
+        Kind::Inherit => {
+            for attribute in tree.children(binding, Field::Attributes) {
+                if let Some(name) = attribute_name(tree, attribute) {
+                    let mut path = prefix.to_string();
+                    push_segment(&mut path, &name);
+                    sink(path, binding);
+                }
+            }
+        }
+        _ => {}
+    }
+}
+
+/// Static name of an attribute path segment, `foo` or `"foo"`
+pub fn attribute_name(tree: &Tree, part: NodeId) -> Option<String> {
+    match tree.node(part).kind {
+        Kind::Raw => tree.text(part).map(str::to_string),
+        Kind::String => tree
+            .children(part, Field::Parts)
+            .map(|raw| match tree.node(raw).kind {
+                Kind::Raw => tree.text(raw),
+                _ => None,
+            })
+            .collect::<Option<String>>(),
+        _ => None,
+    }
+}
+
+// MARK: Paths
+fn is_identifier(segment: &str) -> bool {
+    let mut chars = segment.chars();
+    chars.next().is_some_and(|c| c.is_ascii_alphabetic() || c == '_')
+        && chars.all(|c| c.is_ascii_alphanumeric() || "_'-".contains(c))
+}
+
+/// Appends `segment` to the dotted `path`, quoted unless it is a plain identifier
+pub fn push_segment(path: &mut String, segment: &str) {
+    if !path.is_empty() {
+        path.push('.');
+    }
+    if is_identifier(segment) {
+        path.push_str(segment);
+        return;
+    }
+    path.push('"');
+    for c in segment.chars() {
+        if matches!(c, '"' | '\\') {
+            path.push('\\');
+        }
+        path.push(c);
+    }
+    path.push('"');
+}
+
+/// Dotted path of `segments`, as used by the index
+pub fn join_path<S: AsRef<str>>(segments: &[S]) -> String {
+    let mut path = String::new();
+    for segment in segments {
+        push_segment(&mut path, segment.as_ref());
+    }
+    path
+}
+
+/// Segments of a dotted path, the inverse of `join_path`. Dots inside double
+/// quotes do not split and the quotes are removed, `a."b.c"` is `["a", "b.c"]`.
+pub fn split_path(path: &str) -> Vec<String> {
+    let mut segments = Vec::new();
+    let mut segment = String::new();
+    let mut quoted = false;
+    let mut chars = path.chars();
+    while let Some(c) = chars.next() {
+        match c {
+            '\\' if quoted => segment.extend(chars.next()),
+            '"' => quoted = !quoted,
+            '.' if !quoted => segments.push(std::mem::take(&mut segment)),
+            c => segment.push(c),
+        }
+    }
+    segments.push(segment);
+    segments
+}
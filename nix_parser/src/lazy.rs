@@ -0,0 +1,218 @@
+// SPDX-License-Identifier: GPL-3.0-or-later
+//
+// This file is part of GNix.
+// GNix - The Graphical Nix Project
+// -----------------------------------------------------------------------------------------|
+// GNix is free software: you can redistribute it and/or modify                             |
+// it under the terms of the GNU General Public License as published by                     |
+// the Free Software Foundation, either version 3 of the License, or any later version.     |
+//                                                                                          |
+// GNix is distributed in the hope that it will be useful,                                  |
+// but WITHOUT ANY WARRANTY; without even the implied warranty of                           |
+// MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the                            |
+// GNU General Public License for more details.                                             |
+//                                                                                          |
+// You should have received a copy of the GNU General Public License                        |
+// along with GNix.  If not, see <https://www.gnu.org/licenses/>.                           |
+// -----------------------------------------------------------------------------------------|
+
+use std::sync::Arc;
+
+use pyo3::exceptions::PyKeyError;
+use pyo3::prelude::*;
+use pyo3::types::{PyDict, PyList};
+
+use crate::parser::grammar::{pack_position, Span};
+use crate::tree::{Field, Kind, NodeId, TextSpan, Tree};
+use crate::typed::tree_to_typed;
+
+// ==================== TREE CONVERSION ====================
+// MARK: node_to_py
+pub fn text_span_to_py(py: Python, span: &TextSpan) -> PyResult<PyObject> {
+    let start = PyDict::new_bound(py);
+    start.set_item("line", span.start_line)?;
+    start.set_item("column", span.start_column)?;
+    let end = PyDict::new_bound(py);
+    end.set_item("line", span.end_line)?;
+    end.set_item("column", span.end_column)?;
+    let dict = PyDict::new_bound(py);
+    dict.set_item("start", start)?;
+    dict.set_item("end", end)?;
+    Ok(dict.into_py(py))
+}
+
+pub fn packed_span(span: &TextSpan) -> Span {
+    Span::packed(
+        pack_position(span.start_line, span.start_column),
+        pack_position(span.end_line, span.end_column),
+    )
+}
+
+/// Fields of `id` as a dict, in the same shape `parse_nix` produces
+fn node_fields_to_py<'py>(py: Python<'py>, tree: &Tree, id: NodeId) -> PyResult<Bound<'py, PyDict>> {
+    let node = tree.node(id);
+    let fields = PyDict::new_bound(py);
+    if let Some(key) = node.kind.text_key() {
+        fields.set_item(key, tree.text(id).unwrap_or_default())?;
+    }
+    if let Some(key) = node.kind.flag_key() {
+        fields.set_item(key, node.flag)?;
+    }
+    for &field in node.kind.fields() {
+        if node.kind.is_list(field) {
+            let py_list = PyList::empty_bound(py);
+            for child in tree.children(id, field) {
+                py_list.append(child_to_py(py, tree, node.kind, field, child)?)?;
+            }
+            fields.set_item(field.name(), py_list)?;
+        } else {
+            match tree.child(id, field) {
+                Some(child) => fields.set_item(field.name(), child_to_py(py, tree, node.kind, field, child)?)?,
+                None => fields.set_item(field.name(), py.None())?,
+            }
+        }
+    }
+    if node.kind.has_span() {
+        fields.set_item("span", text_span_to_py(py, &node.span)?)?;
+    }
+    Ok(fields)
+}
+
+fn child_to_py(py: Python, tree: &Tree, parent: Kind, field: Field, child: NodeId) -> PyResult<PyObject> {
+    let kind = tree.node(child).kind;
+    if field == Field::Identifier {
+        // identifiers of function heads are plain structs, not expressions
+        return Ok(node_fields_to_py(py, tree, child)?.into_py(py));
+    }
+    let converted = node_to_py(py, tree, child)?;
+    if parent.is_part_list(field) && kind.is_expression() {
+        let wrapper = PyDict::new_bound(py);
+        wrapper.set_item("Expression", converted)?;
+        return Ok(wrapper.into_py(py));
+    }
+    Ok(converted)
+}
+
+pub fn node_to_py(py: Python, tree: &Tree, id: NodeId) -> PyResult<PyObject> {
+    let kind = tree.node(id).kind;
+    let fields = node_fields_to_py(py, tree, id)?;
+    if kind == Kind::DestructuredArgument {
+        return Ok(fields.into_py(py));
+    }
+    let node = PyDict::new_bound(py);
+    node.set_item(kind.name(), fields)?;
+    Ok(node.into_py(py))
+}
+
+// ==================== LAZY NODES ====================
+// MARK: LazyNode
+/// Handle to one node of a tree kept on the Rust side. Children are only turned
+/// into Python objects when they are accessed.
+#[pyclass(frozen)]
+pub struct LazyNode {
+    pub tree: Arc<Tree>,
+    pub id: NodeId,
+    /// Kind and field of the parent when this node was reached through `__getitem__`,
+    /// `to_dict` then gives the same shape the parent's `to_dict` has for the field
+    /// (`{"Expression": ...}` around expression parts, bare function head identifiers)
+    pub parent: Option<(Kind, Field)>,
+}
+
+impl LazyNode {
+    pub fn new(tree: Arc<Tree>, id: NodeId) -> Self {
+        Self { tree, id, parent: None }
+    }
+
+    pub fn child_to_py(&self, py: Python, id: NodeId) -> PyResult<PyObject> {
+        Ok(Py::new(py, LazyNode::new(self.tree.clone(), id))?.into_py(py))
+    }
+
+    fn field_to_py(&self, py: Python, field: Field, id: NodeId) -> PyResult<PyObject> {
+        let parent = Some((self.tree.node(self.id).kind, field));
+        Ok(Py::new(py, LazyNode { tree: self.tree.clone(), id, parent })?.into_py(py))
+    }
+}
+
+#[pymethods]
+impl LazyNode {
+    #[getter]
+    pub fn kind(&self) -> &'static str {
+        self.tree.node(self.id).kind.name()
+    }
+
+    #[getter]
+    pub fn span(&self) -> Option<Span> {
+        let node = self.tree.node(self.id);
+        if !node.kind.has_span() {
+            return None;
+        }
+        Some(packed_span(&node.span))
+    }
+
+    #[getter]
+    pub fn text(&self) -> Option<String> {
+        self.tree.text(self.id).map(str::to_string)
+    }
+
+    pub fn keys(&self) -> Vec<&'static str> {
+        let kind = self.tree.node(self.id).kind;
+        let mut keys: Vec<&'static str> = kind.text_key().into_iter().chain(kind.flag_key()).collect();
+        keys.extend(kind.fields().iter().map(|field| field.name()));
+        if kind.has_span() {
+            keys.push("span");
+        }
+        keys
+    }
+
+    pub fn __contains__(&self, key: &str) -> bool {
+        self.keys().iter().any(|candidate| *candidate == key)
+    }
+
+    pub fn __getitem__(&self, py: Python, key: &str) -> PyResult<PyObject> {
+        let node = self.tree.node(self.id);
+        if node.kind.text_key() == Some(key) {
+            return Ok(self.text().into_py(py));
+        }
+        if node.kind.flag_key() == Some(key) {
+            return Ok(node.flag.into_py(py));
+        }
+        if key == "span" && node.kind.has_span() {
+            return Ok(self.span().into_py(py));
+        }
+        let Some(field) = Field::from_name(key).filter(|field| node.kind.fields().contains(field)) else {
+            return Err(PyKeyError::new_err(key.to_string()));
+        };
+        if node.kind.is_list(field) {
+            let py_list = PyList::empty_bound(py);
+            for child in self.tree.children(self.id, field) {
+                py_list.append(self.field_to_py(py, field, child)?)?;
+            }
+            return Ok(py_list.into_py(py));
+        }
+        match self.tree.child(self.id, field) {
+            Some(child) => self.field_to_py(py, field, child),
+            None => Ok(py.None()),
+        }
+    }
+
+    /// Materialises this node and everything below it, as `parse_nix` would. A node
+    /// taken from `parent[field]` converts like `parent.to_dict()[field]`.
+    pub fn to_dict(&self, py: Python) -> PyResult<PyObject> {
+        match self.parent {
+            Some((kind, field)) => child_to_py(py, &self.tree, kind, field, self.id),
+            None => node_to_py(py, &self.tree, self.id),
+        }
+    }
+
+    /// Builds the subtree below this node as typed AST classes, see `parse_nix(typed=True)`
+    pub fn to_typed(&self, py: Python) -> PyResult<PyObject> {
+        tree_to_typed(py, &self.tree, self.id)
+    }
+
+    pub fn __repr__(&self) -> String {
+        match self.span() {
+            Some(span) => format!("LazyNode({}, {})", self.kind(), span.__repr__()),
+            None => format!("LazyNode({})", self.kind()),
+        }
+    }
+}
@@ -16,19 +16,37 @@
 // along with GNix.  If not, see <https://www.gnu.org/licenses/>.                           |
 // -----------------------------------------------------------------------------------------|
 
+pub mod batch;
+pub mod codec;
+pub mod incremental;
+pub mod index;
+pub mod lazy;
 pub mod parser;
+pub mod query;
+pub mod source;
+pub mod trace;
+pub mod tree;
+pub mod typed;
 pub mod utils;
 
 use pyo3::prelude::*;
 use pyo3::Bound;
 use pyo3::wrap_pyfunction;
 
+use batch::*;
+use codec::{dump_tree, load_tree, FORMAT_VERSION};
+use incremental::reparse_nix;
+use lazy::LazyNode;
 use parser::grammar::*;
+use query::{Query, QueryMatch};
+use trace::{set_trace_enabled, take_trace_events, trace_enabled};
 use utils::*;
 
 /// Define the Python module.
 #[pymodule]
 fn nix_parser(_py: Python<'_>, m: &Bound<'_, PyModule>) -> PyResult<()> {
+    trace::init_from_env();
+
     // Core types
     m.add_class::<Position>()?;
     m.add_class::<Span>()?;
@@ -88,7 +106,35 @@ fn nix_parser(_py: Python<'_>, m: &Bound<'_, PyModule>) -> PyResult<()> {
     m.add_class::<BindingInherit>()?;
     m.add_class::<BindingKeyValue>()?;
 
+    // Lazy trees
+    m.add_class::<LazyNode>()?;
+
+    // Batch parsing
+    m.add_class::<ParseResult>()?;
+
+    // Queries
+    m.add_class::<Query>()?;
+    m.add_class::<QueryMatch>()?;
+
+    // Tracing
+    m.add_function(wrap_pyfunction!(trace_enabled, m)?)?;
+    m.add_function(wrap_pyfunction!(set_trace_enabled, m)?)?;
+    m.add_function(wrap_pyfunction!(take_trace_events, m)?)?;
+
     m.add_function(wrap_pyfunction!(parse_nix, m)?)?;
+    m.add_function(wrap_pyfunction!(parse_nix_file, m)?)?;
+    m.add_function(wrap_pyfunction!(parse_nix_bytes, m)?)?;
     m.add_function(wrap_pyfunction!(find_key_pair, m)?)?;
+    m.add_function(wrap_pyfunction!(find_definitions, m)?)?;
+    m.add_function(wrap_pyfunction!(find_definitions_with_prefix, m)?)?;
+    m.add_function(wrap_pyfunction!(parse_nix_many, m)?)?;
+    m.add_function(wrap_pyfunction!(parse_nix_sources, m)?)?;
+    m.add_function(wrap_pyfunction!(parse_directory, m)?)?;
+    m.add_function(wrap_pyfunction!(dump_tree, m)?)?;
+    m.add_function(wrap_pyfunction!(load_tree, m)?)?;
+    m.add_function(wrap_pyfunction!(reparse_nix, m)?)?;
+
+    // Cache keys must change whenever the parser or the tree format does
+    m.add("PARSER_VERSION", format!("{}-{}", env!("CARGO_PKG_VERSION"), FORMAT_VERSION))?;
     Ok(())
 }
\ No newline at end of file
@@ -17,6 +17,7 @@
 // -----------------------------------------------------------------------------------------|
 
 use pyo3::prelude::*;
+use pyo3::types::PyString;
 
 use std::fmt;
 
@@ -44,37 +45,62 @@ impl Position {
     pub fn __repr__(&self) -> String { format!("{}", self) }
 }
 // MARK: Span
+// Positions are packed as `line << 32 | column`, a span is two integers instead
+// of two Position objects. Positions are only built when accessed.
 #[pyclass]
-#[derive(Clone)]
+#[derive(Clone, Copy)]
 pub struct Span {
-    #[pyo3(get)]
-    start: Position,
-    #[pyo3(get)]
-    end: Position,
+    start: u64,
+    end: u64,
+}
+
+pub fn pack_position(line: u32, column: u32) -> u64 { (line as u64) << 32 | column as u64 }
+
+fn unpack_position(packed: u64) -> Position { Position::new((packed >> 32) as i64, (packed & 0xffff_ffff) as i64) }
+
+impl Span {
+    pub fn packed(start: u64, end: u64) -> Self { Self { start, end } }
 }
 
 impl fmt::Display for Span {
     fn fmt(&self, f: &mut fmt::Formatter<'_>) -> fmt::Result {
-        write!(f, "Span({}, {})", self.start, self.end)
+        write!(f, "Span({}, {})", unpack_position(self.start), unpack_position(self.end))
     }
 }
 
 #[pymethods]
 impl Span {
     #[new]
-    pub fn new(start: Position, end: Position) -> Self { Self { start, end } }
+    pub fn new(start: Position, end: Position) -> Self {
+        Self {
+            start: pack_position(start.line as u32, start.column as u32),
+            end: pack_position(end.line as u32, end.column as u32),
+        }
+    }
+    #[getter]
+    pub fn start(&self) -> Position { unpack_position(self.start) }
+    #[getter]
+    pub fn end(&self) -> Position { unpack_position(self.end) }
     pub fn __repr__(&self) -> String { format!("{}", self) }
 }
 // MARK: Identifier
+// `id` is a shared Python string, identical names in a tree are one object
 #[pyclass]
-#[derive(Clone)]
 pub struct Identifier {
     #[pyo3(get)]
-    id: String,
+    id: Py<PyString>,
     #[pyo3(get)]
     span: Span,
 }
 
+impl Clone for Identifier {
+    fn clone(&self) -> Self {
+        Python::with_gil(|py| {
+            Self { id: self.id.clone_ref(py), span: self.span }
+        })
+    }
+}
+
 impl fmt::Display for Identifier {
     fn fmt(&self, f: &mut fmt::Formatter<'_>) -> fmt::Result {
         write!(f, "Identifier({})", self.id)
@@ -84,7 +110,7 @@ impl fmt::Display for Identifier {
 #[pymethods]
 impl Identifier {
     #[new]
-    pub fn new(id: String, span: Span) -> Self { Self { id, span } }
+    pub fn new(id: Py<PyString>, span: Span) -> Self { Self { id, span } }
     pub fn __repr__(&self) -> String { format!("{}", self.id) }
 }
 // MARK: ERROR
@@ -212,22 +238,34 @@ impl FunctionHeadDestructuredArgument {
 }
 // MARK: FunctionHeadDestructured
 #[pyclass]
-#[derive(Clone)]
 pub struct FunctionHeadDestructured {
     #[pyo3(get)]
     ellipsis: bool,
     #[pyo3(get)]
-    identifier: Identifier,
+    identifier: Option<Identifier>,
     #[pyo3(get)]
-    arguments: FunctionHeadDestructuredArgument,
+    arguments: Vec<PyObject>,
     #[pyo3(get)]
     span: Span,
 }
 
+impl Clone for FunctionHeadDestructured {
+    fn clone(&self) -> Self {
+        Python::with_gil(|py| {
+            Self {
+                ellipsis: self.ellipsis,
+                identifier: self.identifier.clone(),
+                arguments: self.arguments.iter().map(|x| x.clone_ref(py)).collect(),
+                span: self.span,
+            }
+        })
+    }
+}
+
 #[pymethods]
 impl FunctionHeadDestructured {
     #[new]
-    pub fn new(ellipsis: bool, identifier: Identifier, arguments: FunctionHeadDestructuredArgument, span: Span) -> Self {
+    pub fn new(ellipsis: bool, identifier: Option<Identifier>, arguments: Vec<PyObject>, span: Span) -> Self {
         Self { ellipsis, identifier, arguments, span }
     }
     pub fn __repr__(&self) -> String {
@@ -366,18 +404,25 @@ impl PartInterpolation {
 }
 // MARK: PartRaw
 #[pyclass]
-#[derive(Clone)]
 pub struct PartRaw {
     #[pyo3(get)]
-    content: String,
+    content: Py<PyString>,
     #[pyo3(get)]
     span: Span,
 }
 
+impl Clone for PartRaw {
+    fn clone(&self) -> Self {
+        Python::with_gil(|py| {
+            Self { content: self.content.clone_ref(py), span: self.span }
+        })
+    }
+}
+
 #[pymethods]
 impl PartRaw {
     #[new]
-    pub fn new(content: String, span: Span) -> Self {
+    pub fn new(content: Py<PyString>, span: Span) -> Self {
         PartRaw { content, span }
     }
     pub fn __repr__(&self) -> String {
@@ -0,0 +1,370 @@
+// SPDX-License-Identifier: GPL-3.0-or-later
+//
+// This file is part of GNix.
+// GNix - The Graphical Nix Project
+// -----------------------------------------------------------------------------------------|
+// GNix is free software: you can redistribute it and/or modify                             |
+// it under the terms of the GNU General Public License as published by                     |
+// the Free Software Foundation, either version 3 of the License, or any later version.     |
+//                                                                                          |
+// GNix is distributed in the hope that it will be useful,                                  |
+// but WITHOUT ANY WARRANTY; without even the implied warranty of                           |
+// MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the                            |
+// GNU General Public License for more details.                                             |
+//                                                                                          |
+// You should have received a copy of the GNU General Public License                        |
+// along with GNix.  If not, see <https://www.gnu.org/licenses/>.                           |
+// -----------------------------------------------------------------------------------------|
+
+use std::sync::Arc;
+
+use pyo3::exceptions::{PyRuntimeError, PyValueError};
+use pyo3::prelude::*;
+use pyo3::types::PyType;
+
+use crate::batch::{match_segments, parallel_map};
+use crate::index::{attribute_name, join_path, push_segment, split_path, visit_bindings};
+use crate::lazy::{packed_span, LazyNode};
+use crate::parser::grammar::Span;
+use crate::trace;
+use crate::tree::{Field, Kind, NodeId, Tree};
+
+// ==================== QUERIES ====================
+// Selectors are compiled once and then run natively over the arena tree, Python
+// objects are only created for the nodes that match.
+//
+//     services.*.enable          bindings by attribute path, `*` and `?` match
+//                                inside one segment, `**` matches any number
+//     fetchFromGitHub()          calls of a function, by name or dotted path
+//     fetchFromGitHub().rev      attributes of the sets passed to those calls
+//
+// Any selector naming attributes may end in `= value`, where the value is a
+// number, an identifier (`true`, `null`, ...) or a double quoted string without
+// interpolations, compared against the value the attribute is bound to.
+
+// MARK: Selector
+#[derive(Clone, Debug, PartialEq)]
+enum Literal {
+    Word(String),
+    Text(String),
+}
+
+#[derive(Clone, Debug)]
+pub struct Selector {
+    call: Option<Vec<String>>,
+    path: Vec<String>,
+    value: Option<Literal>,
+}
+
+impl Selector {
+    pub fn compile(source: &str) -> Result<Self, String> {
+        let (target, value) = match find_unquoted(source, "=") {
+            Some(at) => (&source[..at], Some(parse_literal(source[at + 1..].trim())?)),
+            None => (source, None),
+        };
+        let target = target.trim();
+        let (call, path) = match find_unquoted(target, "()") {
+            Some(at) => {
+                let rest = &target[at + 2..];
+                let path = if rest.is_empty() {
+                    Vec::new()
+                } else {
+                    let rest = rest
+                        .strip_prefix('.')
+                        .ok_or_else(|| format!("expected '.' after '()' in '{}'", source))?;
+                    parse_path(rest)?
+                };
+                (Some(parse_path(&target[..at])?), path)
+            }
+            None => (None, parse_path(target)?),
+        };
+        if value.is_some() && path.is_empty() {
+            return Err(format!("'{}' compares a value but names no attribute", source));
+        }
+        Ok(Self { call, path, value })
+    }
+
+    /// Every match in `tree` as `(path, node)`. Attribute selectors give the
+    /// bindings in path order, call selectors give matches in source order.
+    pub fn run(&self, tree: &Tree) -> Vec<(String, NodeId)> {
+        let _scope = trace::scope("query");
+        let mut found = Vec::new();
+        if tree.nodes.is_empty() {
+            return found;
+        }
+        match &self.call {
+            Some(call) => self.run_calls(tree, call, &mut found),
+            None => self.run_paths(tree, &mut found),
+        }
+        found
+    }
+
+    fn run_paths(&self, tree: &Tree, found: &mut Vec<(String, NodeId)>) {
+        // leading segments without wildcards narrow the search to one index range
+        let literal = self.path.iter().take_while(|segment| !is_pattern(segment)).count();
+        if literal == self.path.len() {
+            let path = join_path(&self.path);
+            for &binding in tree.index.get(&path) {
+                self.push_binding(tree, &path, binding, found);
+            }
+            return;
+        }
+        let mut prefix = join_path(&self.path[..literal]);
+        if !prefix.is_empty() {
+            prefix.push('.');
+        }
+        for (path, bindings) in tree.index.with_prefix(&prefix) {
+            if match_segments(&self.path, &split_path(path)) {
+                for &binding in bindings {
+                    self.push_binding(tree, path, binding, found);
+                }
+            }
+        }
+    }
+
+    fn run_calls(&self, tree: &Tree, call: &[String], found: &mut Vec<(String, NodeId)>) {
+        for id in tree.walk(tree.root) {
+            if tree.node(id).kind != Kind::FunctionApplication {
+                continue;
+            }
+            let Some(name) = tree.child(id, Field::Function).and_then(|function| callee_name(tree, function)) else {
+                continue;
+            };
+            let segments = split_path(&name);
+            // a bare name matches the last segment, so `fetchurl()` finds `pkgs.fetchurl`
+            let matched = match call {
+                [single] if single != "**" => match_segments(call, &segments[segments.len() - 1..]),
+                _ => match_segments(call, &segments),
+            };
+            if !matched {
+                continue;
+            }
+            if self.path.is_empty() {
+                found.push((name, id));
+                continue;
+            }
+            for argument in tree.children(id, Field::Arguments) {
+                visit_bindings(tree, argument, "", &mut |path, binding| {
+                    if match_segments(&self.path, &split_path(&path)) {
+                        self.push_binding(tree, &path, binding, found);
+                    }
+                });
+            }
+        }
+    }
+
+    fn push_binding(&self, tree: &Tree, path: &str, binding: NodeId, found: &mut Vec<(String, NodeId)>) {
+        let matched = match &self.value {
+            None => true,
+            Some(literal) => tree
+                .child(binding, Field::To)
+                .is_some_and(|value| literal_matches(tree, value, literal)),
+        };
+        if matched {
+            found.push((path.to_string(), binding));
+        }
+    }
+}
+
+fn is_pattern(segment: &str) -> bool {
+    segment.contains(['*', '?'])
+}
+
+/// Byte offset of the first `needle` outside double quotes
+fn find_unquoted(text: &str, needle: &str) -> Option<usize> {
+    let mut quoted = false;
+    let mut escaped = false;
+    for (at, c) in text.char_indices() {
+        match c {
+            _ if escaped => escaped = false,
+            '\\' if quoted => escaped = true,
+            '"' => quoted = !quoted,
+            _ if !quoted && text[at..].starts_with(needle) => return Some(at),
+            _ => {}
+        }
+    }
+    None
+}
+
+fn parse_path(text: &str) -> Result<Vec<String>, String> {
+    let mut segments = Vec::new();
+    let mut rest = text.trim();
+    loop {
+        let (segment, tail) = match find_unquoted(rest, ".") {
+            Some(at) => (rest[..at].trim(), Some(&rest[at + 1..])),
+            None => (rest.trim(), None),
+        };
+        segments.push(parse_segment(segment, text)?);
+        match tail {
+            Some(tail) => rest = tail,
+            None => break,
+        }
+    }
+    Ok(segments)
+}
+
+fn parse_segment(segment: &str, path: &str) -> Result<String, String> {
+    if let Some(quoted) = segment.strip_prefix('"') {
+        return match quoted.strip_suffix('"') {
+            Some(inner) if !inner.is_empty() => Ok(unescape(inner)),
+            _ => Err(format!("invalid quoted attribute {} in '{}'", segment, path)),
+        };
+    }
+    let valid = !segment.is_empty()
+        && segment.chars().all(|c| c.is_ascii_alphanumeric() || "_-'*?".contains(c));
+    if !valid {
+        return Err(format!("invalid attribute '{}' in '{}'", segment, path));
+    }
+    Ok(segment.to_string())
+}
+
+fn parse_literal(text: &str) -> Result<Literal, String> {
+    if let Some(quoted) = text.strip_prefix('"') {
+        return match quoted.strip_suffix('"') {
+            Some(inner) if !has_unescaped_quote(inner) => Ok(Literal::Text(unescape(inner))),
+            _ => Err(format!("invalid string {}", text)),
+        };
+    }
+    let valid = !text.is_empty()
+        && text.chars().all(|c| c.is_ascii_alphanumeric() || "_-'.".contains(c));
+    if !valid {
+        return Err(format!("invalid value '{}'", text));
+    }
+    Ok(Literal::Word(text.to_string()))
+}
+
+fn has_unescaped_quote(text: &str) -> bool {
+    let mut escaped = false;
+    for c in text.chars() {
+        match c {
+            _ if escaped => escaped = false,
+            '\\' => escaped = true,
+            '"' => return true,
+            _ => {}
+        }
+    }
+    escaped
+}
+
+fn unescape(text: &str) -> String {
+    let mut out = String::with_capacity(text.len());
+    let mut chars = text.chars();
+    while let Some(c) = chars.next() {
+        match c {
+            '\\' => out.extend(chars.next()),
+            c => out.push(c),
+        }
+    }
+    out
+}
+
+/// Dotted name of a called function, `fetchFromGitHub` or `pkgs.fetchFromGitHub`
+fn callee_name(tree: &Tree, function: NodeId) -> Option<String> {
+    match tree.node(function).kind {
+        Kind::Identifier => tree.text(function).map(str::to_string),
+        Kind::PropertyAccess if tree.child(function, Field::Default).is_none() => {
+            let mut name = callee_name(tree, tree.child(function, Field::Expression)?)?;
+            for part in tree.children(function, Field::AttributePath) {
+                push_segment(&mut name, &attribute_name(tree, part)?);
+            }
+            Some(name)
+        }
+        _ => None,
+    }
+}
+
+fn literal_matches(tree: &Tree, value: NodeId, literal: &Literal) -> bool {
+    match (tree.node(value).kind, literal) {
+        (Kind::Identifier | Kind::Integer | Kind::Float, Literal::Word(word)) => tree.text(value) == Some(word.as_str()),
+        (Kind::String | Kind::IndentedString, Literal::Text(text)) => {
+            let mut content = String::new();
+            for part in tree.children(value, Field::Parts) {
+                match tree.node(part).kind {
+                    Kind::Raw => content.push_str(tree.text(part).unwrap_or_default()),
+                    _ => return false,
+                }
+            }
+            content == *text
+        }
+        _ => false,
+    }
+}
+
+// MARK: Python API
+/// A node found by a `Query`, with the attribute path it was found under
+#[pyclass(frozen)]
+pub struct QueryMatch {
+    #[pyo3(get)]
+    path: String,
+    #[pyo3(get)]
+    node: Py<LazyNode>,
+    #[pyo3(get)]
+    span: Span,
+}
+
+#[pymethods]
+impl QueryMatch {
+    pub fn __repr__(&self) -> String {
+        format!("QueryMatch('{}', {})", self.path, self.span)
+    }
+}
+
+fn matches_to_py(py: Python, tree: &Arc<Tree>, found: Vec<(String, NodeId)>) -> PyResult<Vec<QueryMatch>> {
+    found
+        .into_iter()
+        .map(|(path, id)| {
+            Ok(QueryMatch {
+                path,
+                node: Py::new(py, LazyNode::new(tree.clone(), id))?,
+                span: packed_span(&tree.node(id).span),
+            })
+        })
+        .collect()
+}
+
+/// A compiled selector, raises ValueError if `selector` is not valid
+#[pyclass(frozen)]
+pub struct Query {
+    selector: Selector,
+    #[pyo3(get)]
+    source: String,
+}
+
+#[pymethods]
+impl Query {
+    #[new]
+    pub fn new(selector: &str) -> PyResult<Self> {
+        let compiled = Selector::compile(selector).map_err(PyValueError::new_err)?;
+        Ok(Self { selector: compiled, source: selector.to_string() })
+    }
+
+    /// Every match in the tree `node` belongs to
+    pub fn run(&self, py: Python, node: &Bound<LazyNode>) -> PyResult<Vec<QueryMatch>> {
+        let tree = node.get().tree.clone();
+        let found = py.allow_threads(|| self.selector.run(&tree));
+        matches_to_py(py, &tree, found)
+    }
+
+    /// Runs the query over every tree in parallel, one list of matches per node
+    pub fn run_many(&self, py: Python, nodes: Vec<Bound<LazyNode>>) -> PyResult<Vec<Vec<QueryMatch>>> {
+        let trees: Vec<Arc<Tree>> = nodes.iter().map(|node| node.get().tree.clone()).collect();
+        let found = py.allow_threads(|| parallel_map(&trees, |tree| self.selector.run(tree)));
+        trees
+            .iter()
+            .zip(found)
+            .map(|(tree, found)| {
+                let found = found.map_err(|panic| PyRuntimeError::new_err(format!("query panicked: {}", panic)))?;
+                matches_to_py(py, tree, found)
+            })
+            .collect()
+    }
+
+    /// Pickled as its source, so a compiled query can be sent to worker processes
+    pub fn __reduce__<'py>(slf: &Bound<'py, Self>) -> (Bound<'py, PyType>, (String,)) {
+        (slf.get_type(), (slf.get().source.clone(),))
+    }
+
+    pub fn __repr__(&self) -> String {
+        format!("Query('{}')", self.source)
+    }
+}
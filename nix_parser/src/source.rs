@@ -0,0 +1,57 @@
+// SPDX-License-Identifier: GPL-3.0-or-later
+//
+// This file is part of GNix.
+// GNix - The Graphical Nix Project
+// -----------------------------------------------------------------------------------------|
+// GNix is free software: you can redistribute it and/or modify                             |
+// it under the terms of the GNU General Public License as published by                     |
+// the Free Software Foundation, either version 3 of the License, or any later version.     |
+//                                                                                          |
+// GNix is distributed in the hope that it will be useful,                                  |
+// but WITHOUT ANY WARRANTY; without even the implied warranty of                           |
+// MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the                            |
+// GNU General Public License for more details.                                             |
+//                                                                                          |
+// You should have received a copy of the GNU General Public License                        |
+// along with GNix.  If not, see <https://www.gnu.org/licenses/>.                           |
+// -----------------------------------------------------------------------------------------|
+
+// ==================== SOURCE POSITIONS ====================
+// nixel positions are 1-based lines and 1-based byte columns, spans end one past
+// their last byte. `LineIndex` converts between them and byte offsets.
+
+// MARK: LineIndex
+pub struct LineIndex {
+    line_starts: Vec<usize>,
+    length: usize,
+}
+
+impl LineIndex {
+    pub fn new(text: &str) -> Self {
+        let mut line_starts = vec![0];
+        line_starts.extend(text.bytes().enumerate().filter(|&(_, byte)| byte == b'\n').map(|(i, _)| i + 1));
+        Self { line_starts, length: text.len() }
+    }
+
+    /// (line, column) of byte `offset`
+    pub fn position(&self, offset: usize) -> (u32, u32) {
+        let line = self.line_starts.partition_point(|&start| start <= offset) - 1;
+        ((line + 1) as u32, (offset - self.line_starts[line] + 1) as u32)
+    }
+
+    /// Byte offset of (`line`, `column`), clamped to the text
+    pub fn offset(&self, line: u32, column: u32) -> usize {
+        let Some(&start) = self.line_starts.get((line as usize).saturating_sub(1)) else {
+            return self.length;
+        };
+        (start + (column as usize).saturating_sub(1)).min(self.length)
+    }
+}
+
+/// Position reached after writing `text` starting at (`line`, `column`)
+pub fn advance(line: u32, column: u32, text: &str) -> (u32, u32) {
+    match text.rfind('\n') {
+        Some(last) => (line + text.matches('\n').count() as u32, (text.len() - last) as u32),
+        None => (line, column + text.len() as u32),
+    }
+}
@@ -0,0 +1,207 @@
+// SPDX-License-Identifier: GPL-3.0-or-later
+//
+// This file is part of GNix.
+// GNix - The Graphical Nix Project
+// -----------------------------------------------------------------------------------------|
+// GNix is free software: you can redistribute it and/or modify                             |
+// it under the terms of the GNU General Public License as published by                     |
+// the Free Software Foundation, either version 3 of the License, or any later version.     |
+//                                                                                          |
+// GNix is distributed in the hope that it will be useful,                                  |
+// but WITHOUT ANY WARRANTY; without even the implied warranty of                           |
+// MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the                            |
+// GNU General Public License for more details.                                             |
+//                                                                                          |
+// You should have received a copy of the GNU General Public License                        |
+// along with GNix.  If not, see <https://www.gnu.org/licenses/>.                           |
+// -----------------------------------------------------------------------------------------|
+
+use std::alloc::{GlobalAlloc, Layout, System};
+use std::cell::Cell;
+use std::sync::atomic::{AtomicBool, AtomicU64, Ordering};
+use std::sync::{Mutex, OnceLock};
+use std::time::{Instant, SystemTime, UNIX_EPOCH};
+
+use pyo3::prelude::*;
+
+// ==================== TRACING ====================
+// Opt-in per-phase timings and allocation counts, enabled by the GNIX_TRACE
+// environment variable when the module is imported or by `set_trace_enabled`.
+// A disabled `scope` is a single relaxed atomic load, and so is the check the
+// counting allocator makes on every allocation.
+//
+// Timestamps are microseconds since the Unix epoch, so events line up with the
+// ones Python records in `src.nix_manager.profiling`.
+
+pub const TRACE_VARIABLE: &str = "GNIX_TRACE";
+
+static ENABLED: AtomicBool = AtomicBool::new(false);
+static EVENTS: Mutex<Vec<TraceEvent>> = Mutex::new(Vec::new());
+static CLOCK: OnceLock<(Instant, u64)> = OnceLock::new();
+static NEXT_THREAD: AtomicU64 = AtomicU64::new(1);
+
+thread_local! {
+    // (allocations, allocated bytes) made by this thread while tracing
+    static ALLOCATED: Cell<(u64, u64)> = const { Cell::new((0, 0)) };
+    static THREAD_ID: Cell<u64> = const { Cell::new(0) };
+}
+
+// MARK: allocator
+/// The system allocator, counting allocations per thread while tracing is enabled
+pub struct CountingAllocator;
+
+unsafe impl GlobalAlloc for CountingAllocator {
+    unsafe fn alloc(&self, layout: Layout) -> *mut u8 {
+        count(layout.size());
+        unsafe { System.alloc(layout) }
+    }
+
+    unsafe fn alloc_zeroed(&self, layout: Layout) -> *mut u8 {
+        count(layout.size());
+        unsafe { System.alloc_zeroed(layout) }
+    }
+
+    unsafe fn realloc(&self, ptr: *mut u8, layout: Layout, new_size: usize) -> *mut u8 {
+        count(new_size);
+        unsafe { System.realloc(ptr, layout, new_size) }
+    }
+
+    unsafe fn dealloc(&self, ptr: *mut u8, layout: Layout) {
+        unsafe { System.dealloc(ptr, layout) }
+    }
+}
+
+#[global_allocator]
+static ALLOCATOR: CountingAllocator = CountingAllocator;
+
+#[inline]
+fn count(size: usize) {
+    if ENABLED.load(Ordering::Relaxed) {
+        // `try_with` because allocations also happen while thread locals are torn down
+        let _ = ALLOCATED.try_with(|allocated| {
+            let (count, bytes) = allocated.get();
+            allocated.set((count + 1, bytes + size as u64));
+        });
+    }
+}
+
+fn allocated() -> (u64, u64) {
+    ALLOCATED.try_with(Cell::get).unwrap_or_default()
+}
+
+// MARK: events
+#[derive(Clone, Debug)]
+pub struct TraceEvent {
+    pub name: &'static str,
+    pub start_us: u64,
+    pub duration_us: u64,
+    pub thread: u64,
+    pub allocations: u64,
+    pub allocated_bytes: u64,
+}
+
+pub fn is_enabled() -> bool {
+    ENABLED.load(Ordering::Relaxed)
+}
+
+pub fn set_enabled(enabled: bool) {
+    CLOCK.get_or_init(clock_origin);
+    ENABLED.store(enabled, Ordering::Relaxed);
+}
+
+/// Enables tracing when GNIX_TRACE is set to anything but `""` or `0`
+pub fn init_from_env() {
+    let enabled = std::env::var(TRACE_VARIABLE).is_ok_and(|value| !value.is_empty() && value != "0");
+    if enabled {
+        set_enabled(true);
+    }
+}
+
+fn clock_origin() -> (Instant, u64) {
+    let since_epoch = SystemTime::now().duration_since(UNIX_EPOCH).unwrap_or_default();
+    (Instant::now(), since_epoch.as_micros() as u64)
+}
+
+fn timestamp_us(instant: Instant) -> u64 {
+    let (origin, origin_us) = *CLOCK.get_or_init(clock_origin);
+    origin_us + instant.saturating_duration_since(origin).as_micros() as u64
+}
+
+/// OS thread id, matching Python's `threading.get_native_id` on Linux
+fn thread_id() -> u64 {
+    THREAD_ID.with(|id| {
+        if id.get() == 0 {
+            let native = std::fs::read_link("/proc/thread-self")
+                .ok()
+                .and_then(|link| link.file_name()?.to_str()?.parse().ok());
+            // elsewhere, a made up id outside the range of real ones
+            id.set(native.unwrap_or_else(|| (1 << 48) + NEXT_THREAD.fetch_add(1, Ordering::Relaxed)));
+        }
+        id.get()
+    })
+}
+
+/// Moves every recorded event out of the buffer
+pub fn take_events() -> Vec<TraceEvent> {
+    std::mem::take(&mut *EVENTS.lock().unwrap_or_else(|poisoned| poisoned.into_inner()))
+}
+
+// MARK: Scope
+/// A phase being timed, recorded when dropped. Create it with `scope`
+pub struct Scope {
+    name: &'static str,
+    start: Instant,
+    allocated: (u64, u64),
+}
+
+/// Starts timing the phase `name` on this thread, `None` unless tracing is enabled
+///
+/// ```ignore
+/// let _scope = trace::scope("nixel parse");
+/// ```
+#[inline]
+pub fn scope(name: &'static str) -> Option<Scope> {
+    if !is_enabled() {
+        return None;
+    }
+    Some(Scope { name, start: Instant::now(), allocated: allocated() })
+}
+
+impl Drop for Scope {
+    fn drop(&mut self) {
+        let end = Instant::now();
+        let (count, bytes) = allocated();
+        let event = TraceEvent {
+            name: self.name,
+            start_us: timestamp_us(self.start),
+            duration_us: end.saturating_duration_since(self.start).as_micros() as u64,
+            thread: thread_id(),
+            allocations: count.saturating_sub(self.allocated.0),
+            allocated_bytes: bytes.saturating_sub(self.allocated.1),
+        };
+        EVENTS.lock().unwrap_or_else(|poisoned| poisoned.into_inner()).push(event);
+    }
+}
+
+// MARK: Python
+/// Whether the extension records trace events
+#[pyfunction]
+pub fn trace_enabled() -> bool {
+    is_enabled()
+}
+
+/// Starts or stops recording trace events
+#[pyfunction]
+pub fn set_trace_enabled(enabled: bool) {
+    set_enabled(enabled);
+}
+
+/// Every event recorded since the last call, as
+/// (name, start µs since the epoch, duration µs, thread id, allocations, allocated bytes)
+#[pyfunction]
+pub fn take_trace_events(py: Python) -> Vec<(&'static str, u64, u64, u64, u64, u64)> {
+    py.allow_threads(take_events)
+        .into_iter()
+        .map(|event| (event.name, event.start_us, event.duration_us, event.thread, event.allocations, event.allocated_bytes))
+        .collect()
+}
@@ -0,0 +1,539 @@
+// SPDX-License-Identifier: GPL-3.0-or-later
+//
+// This file is part of GNix.
+// GNix - The Graphical Nix Project
+// -----------------------------------------------------------------------------------------|
+// GNix is free software: you can redistribute it and/or modify                             |
+// it under the terms of the GNU General Public License as published by                     |
+// the Free Software Foundation, either version 3 of the License, or any later version.     |
+//                                                                                          |
+// GNix is distributed in the hope that it will be useful,                                  |
+// but WITHOUT ANY WARRANTY; without even the implied warranty of                           |
+// MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the                            |
+// GNU General Public License for more details.                                             |
+//                                                                                          |
+// You should have received a copy of the GNU General Public License                        |
+// along with GNix.  If not, see <https://www.gnu.org/licenses/>.                           |
+// -----------------------------------------------------------------------------------------|
+
+use std::collections::HashMap;
+
+use nixel::{Binding, Expression, FunctionHead, Part};
+
+use crate::index::AttrIndex;
+use crate::trace;
+
+// ==================== COMPACT TREE ====================
+// An owned, arena backed copy of the nixel AST. Nodes live in one `Vec` and
+// refer to their children through a flat edge list, strings are interned once
+// per tree. The tree has no Python objects in it, so it can be kept alive on the
+// Rust side and handed out to Python one node at a time.
+
+pub type NodeId = u32;
+pub type Symbol = u32;
+pub const NO_SYMBOL: Symbol = u32::MAX;
+
+// MARK: TextSpan
+#[derive(Clone, Copy, Debug, Default, PartialEq, Eq)]
+pub struct TextSpan {
+    pub start_line: u32,
+    pub start_column: u32,
+    pub end_line: u32,
+    pub end_column: u32,
+}
+
+impl TextSpan {
+    pub fn from_nixel(span: &nixel::Span) -> Self {
+        Self {
+            start_line: span.start.line as u32,
+            start_column: span.start.column as u32,
+            end_line: span.end.line as u32,
+            end_column: span.end.column as u32,
+        }
+    }
+
+    pub fn between(start: &TextSpan, end: &TextSpan) -> Self {
+        Self {
+            start_line: start.start_line,
+            start_column: start.start_column,
+            end_line: end.end_line,
+            end_column: end.end_column,
+        }
+    }
+}
+
+// MARK: Kind
+macro_rules! node_kinds {
+    ($($name:ident),+ $(,)?) => {
+        #[derive(Clone, Copy, Debug, PartialEq, Eq, Hash)]
+        pub enum Kind { $($name),+ }
+
+        impl Kind {
+            pub const ALL: &'static [Kind] = &[$(Kind::$name),+];
+
+            pub fn name(self) -> &'static str {
+                match self { $(Kind::$name => stringify!($name)),+ }
+            }
+
+            pub fn from_name(name: &str) -> Option<Kind> {
+                match name { $(stringify!($name) => Some(Kind::$name),)+ _ => None }
+            }
+        }
+    };
+}
+
+node_kinds!(
+    // Expressions
+    Assert, BinaryOperation, Error, Float, Function, FunctionApplication, HasAttribute,
+    Identifier, IfThenElse, IndentedString, Integer, LetIn, List, Map, Path, Uri,
+    PropertyAccess, SearchNixPath, String, UnaryOperation, With,
+    // Parts
+    Interpolation, Raw,
+    // Bindings
+    Inherit, KeyValue,
+    // Function heads
+    Destructured, DestructuredArgument, Simple,
+);
+
+impl Kind {
+    pub fn is_expression(self) -> bool {
+        !matches!(
+            self,
+            Kind::Interpolation | Kind::Raw | Kind::Inherit | Kind::KeyValue
+                | Kind::Destructured | Kind::DestructuredArgument | Kind::Simple
+        )
+    }
+
+    /// nixel does not give bindings and function heads a span of their own
+    pub fn has_span(self) -> bool {
+        !matches!(self, Kind::KeyValue | Kind::Destructured | Kind::DestructuredArgument | Kind::Simple)
+    }
+
+    /// Name of the string attribute carried by the node, if any
+    pub fn text_key(self) -> Option<&'static str> {
+        match self {
+            Kind::Identifier => Some("id"),
+            Kind::Error => Some("message"),
+            Kind::Float | Kind::Integer => Some("value"),
+            Kind::Uri => Some("uri"),
+            Kind::SearchNixPath => Some("path"),
+            Kind::Raw => Some("content"),
+            Kind::DestructuredArgument => Some("identifier"),
+            Kind::BinaryOperation | Kind::UnaryOperation => Some("operator"),
+            _ => None,
+        }
+    }
+
+    /// Name of the boolean attribute carried by the node, if any
+    pub fn flag_key(self) -> Option<&'static str> {
+        match self {
+            Kind::Map => Some("recursive"),
+            Kind::Destructured => Some("ellipsis"),
+            _ => None,
+        }
+    }
+
+    /// Child fields of the node, in the order nixel declares them
+    pub fn fields(self) -> &'static [Field] {
+        match self {
+            Kind::Assert | Kind::With => &[Field::Expression, Field::Target],
+            Kind::BinaryOperation => &[Field::Left, Field::Right],
+            Kind::Function => &[Field::Head, Field::Body],
+            Kind::FunctionApplication => &[Field::Function, Field::Arguments],
+            Kind::HasAttribute => &[Field::Expression, Field::AttributePath],
+            Kind::IfThenElse => &[Field::Predicate, Field::Then, Field::Else],
+            Kind::IndentedString | Kind::Path | Kind::String => &[Field::Parts],
+            Kind::LetIn => &[Field::Bindings, Field::Target],
+            Kind::List => &[Field::Elements],
+            Kind::Map => &[Field::Bindings],
+            Kind::PropertyAccess => &[Field::Expression, Field::AttributePath, Field::Default],
+            Kind::UnaryOperation => &[Field::Operand],
+            Kind::Interpolation => &[Field::Expression],
+            Kind::Inherit => &[Field::From, Field::Attributes],
+            Kind::KeyValue => &[Field::From, Field::To],
+            Kind::Destructured => &[Field::Identifier, Field::Arguments],
+            Kind::DestructuredArgument => &[Field::Default],
+            Kind::Simple => &[Field::Identifier],
+            _ => &[],
+        }
+    }
+
+    /// Whether `field` holds a list of children on this kind of node
+    pub fn is_list(self, field: Field) -> bool {
+        match field {
+            Field::Arguments | Field::AttributePath | Field::Parts | Field::Bindings
+                | Field::Elements | Field::Attributes => true,
+            Field::From => self == Kind::KeyValue,
+            _ => false,
+        }
+    }
+
+    /// Whether `field` holds string parts on this kind of node
+    pub fn is_part_list(self, field: Field) -> bool {
+        match field {
+            Field::AttributePath | Field::Parts | Field::Attributes => true,
+            Field::From => self == Kind::KeyValue,
+            _ => false,
+        }
+    }
+}
+
+// MARK: Field
+macro_rules! node_fields {
+    ($($name:ident => $key:literal),+ $(,)?) => {
+        #[derive(Clone, Copy, Debug, PartialEq, Eq, Hash)]
+        pub enum Field { $($name),+ }
+
+        impl Field {
+            pub const ALL: &'static [Field] = &[$(Field::$name),+];
+
+            pub fn name(self) -> &'static str {
+                match self { $(Field::$name => $key),+ }
+            }
+
+            pub fn from_name(name: &str) -> Option<Field> {
+                match name { $($key => Some(Field::$name),)+ _ => None }
+            }
+        }
+    };
+}
+
+node_fields!(
+    Expression => "expression",
+    Target => "target",
+    Left => "left",
+    Right => "right",
+    Head => "head",
+    Body => "body",
+    Function => "function",
+    Arguments => "arguments",
+    AttributePath => "attribute_path",
+    Default => "default",
+    Predicate => "predicate",
+    Then => "then",
+    Else => "else_",
+    Parts => "parts",
+    Bindings => "bindings",
+    Elements => "elements",
+    Operand => "operand",
+    From => "from",
+    To => "to",
+    Attributes => "attributes",
+    Identifier => "identifier",
+);
+
+// MARK: Node
+#[derive(Clone, Copy, Debug)]
+pub struct Edge {
+    pub field: Field,
+    pub node: NodeId,
+}
+
+#[derive(Clone, Debug)]
+pub struct Node {
+    pub kind: Kind,
+    pub flag: bool,
+    pub text: Symbol,
+    pub span: TextSpan,
+    pub first_edge: u32,
+    pub edge_count: u32,
+}
+
+// MARK: Tree
+#[derive(Clone, Debug, Default)]
+pub struct Tree {
+    pub nodes: Vec<Node>,
+    pub edges: Vec<Edge>,
+    pub symbols: Vec<Box<str>>,
+    pub root: NodeId,
+    pub index: AttrIndex,
+}
+
+impl Tree {
+    pub fn parse(nix_script: String) -> Tree {
+        let parsed = {
+            let _scope = trace::scope("nixel parse");
+            nixel::parse(nix_script)
+        };
+        Tree::from_expression(&parsed.expression)
+    }
+
+    pub fn from_expression(expression: &Expression) -> Tree {
+        let mut builder = Builder::default();
+        let root = {
+            let _scope = trace::scope("arena build");
+            builder.expression(expression)
+        };
+        builder.tree.root = root;
+        builder.tree.index = {
+            let _scope = trace::scope("attribute index");
+            AttrIndex::build(&builder.tree)
+        };
+        builder.tree
+    }
+
+    pub fn node(&self, id: NodeId) -> &Node {
+        &self.nodes[id as usize]
+    }
+
+    pub fn edges(&self, id: NodeId) -> &[Edge] {
+        let node = self.node(id);
+        let start = node.first_edge as usize;
+        &self.edges[start..start + node.edge_count as usize]
+    }
+
+    pub fn children(&self, id: NodeId, field: Field) -> impl Iterator<Item = NodeId> + '_ {
+        self.edges(id).iter().filter(move |edge| edge.field == field).map(|edge| edge.node)
+    }
+
+    pub fn child(&self, id: NodeId, field: Field) -> Option<NodeId> {
+        self.children(id, field).next()
+    }
+
+    pub fn symbol(&self, symbol: Symbol) -> &str {
+        &self.symbols[symbol as usize]
+    }
+
+    pub fn text(&self, id: NodeId) -> Option<&str> {
+        match self.node(id).text {
+            NO_SYMBOL => None,
+            symbol => Some(self.symbol(symbol)),
+        }
+    }
+
+    /// Depth first, pre-order walk starting at `id`, children visited in field order
+    pub fn walk(&self, id: NodeId) -> impl Iterator<Item = NodeId> + '_ {
+        let mut stack = vec![id];
+        std::iter::from_fn(move || {
+            let current = stack.pop()?;
+            stack.extend(self.edges(current).iter().rev().map(|edge| edge.node));
+            Some(current)
+        })
+    }
+
+    /// First KeyValue binding below `id` with a raw attribute named `key`, returns its value
+    pub fn find_key_pair(&self, id: NodeId, key: &str) -> Option<NodeId> {
+        self.walk(id)
+            .filter(|&node| self.node(node).kind == Kind::KeyValue)
+            .find(|&node| {
+                self.children(node, Field::From)
+                    .any(|part| self.node(part).kind == Kind::Raw && self.text(part) == Some(key))
+            })
+            .and_then(|node| self.child(node, Field::To))
+    }
+}
+
+// MARK: Builder
+#[derive(Default)]
+struct Builder {
+    tree: Tree,
+    symbol_ids: HashMap<Box<str>, Symbol>,
+}
+
+impl Builder {
+    fn intern(&mut self, text: &str) -> Symbol {
+        if let Some(&symbol) = self.symbol_ids.get(text) {
+            return symbol;
+        }
+        let symbol = self.tree.symbols.len() as Symbol;
+        self.tree.symbols.push(text.into());
+        self.symbol_ids.insert(text.into(), symbol);
+        symbol
+    }
+
+    fn push(&mut self, kind: Kind, flag: bool, text: Symbol, span: TextSpan, edges: Vec<Edge>) -> NodeId {
+        let first_edge = self.tree.edges.len() as u32;
+        let edge_count = edges.len() as u32;
+        self.tree.edges.extend(edges);
+        self.tree.nodes.push(Node { kind, flag, text, span, first_edge, edge_count });
+        (self.tree.nodes.len() - 1) as NodeId
+    }
+
+    fn leaf(&mut self, kind: Kind, text: &str, span: &nixel::Span) -> NodeId {
+        let text = self.intern(text);
+        self.push(kind, false, text, TextSpan::from_nixel(span), Vec::new())
+    }
+
+    fn edge(&mut self, edges: &mut Vec<Edge>, field: Field, expression: &Expression) {
+        let node = self.expression(expression);
+        edges.push(Edge { field, node });
+    }
+
+    fn optional_edge(&mut self, edges: &mut Vec<Edge>, field: Field, expression: &Option<Expression>) {
+        if let Some(expression) = expression {
+            self.edge(edges, field, expression);
+        }
+    }
+
+    fn part_edges(&mut self, edges: &mut Vec<Edge>, field: Field, parts: &[Part]) {
+        for part in parts {
+            let node = self.part(part);
+            edges.push(Edge { field, node });
+        }
+    }
+
+    fn binding_edges(&mut self, edges: &mut Vec<Edge>, bindings: &[Binding]) {
+        for binding in bindings {
+            let node = self.binding(binding);
+            edges.push(Edge { field: Field::Bindings, node });
+        }
+    }
+
+    fn part(&mut self, part: &Part) -> NodeId {
+        match part {
+            Part::Expression(expression) => self.expression(expression),
+            Part::Interpolation(interpolation) => {
+                let mut edges = Vec::with_capacity(1);
+                self.edge(&mut edges, Field::Expression, &interpolation.expression);
+                self.push(Kind::Interpolation, false, NO_SYMBOL, TextSpan::from_nixel(&interpolation.span), edges)
+            }
+            Part::Raw(raw) => self.leaf(Kind::Raw, &raw.content, &raw.span),
+        }
+    }
+
+    fn binding(&mut self, binding: &Binding) -> NodeId {
+        match binding {
+            Binding::Inherit(inherit) => {
+                let mut edges = Vec::new();
+                self.optional_edge(&mut edges, Field::From, &inherit.from);
+                self.part_edges(&mut edges, Field::Attributes, &inherit.attributes);
+                self.push(Kind::Inherit, false, NO_SYMBOL, TextSpan::from_nixel(&inherit.span), edges)
+            }
+            Binding::KeyValue(key_value) => {
+                let mut edges = Vec::with_capacity(key_value.from.len() + 1);
+                self.part_edges(&mut edges, Field::From, &key_value.from);
+                self.edge(&mut edges, Field::To, &key_value.to);
+                // bindings have no span in nixel, cover the attribute path and the value
+                let end = self.tree.node(edges[edges.len() - 1].node).span;
+                let start = self.tree.node(edges[0].node).span;
+                self.push(Kind::KeyValue, false, NO_SYMBOL, TextSpan::between(&start, &end), edges)
+            }
+        }
+    }
+
+    fn head(&mut self, head: &FunctionHead) -> NodeId {
+        match head {
+            FunctionHead::Destructured(destructured) => {
+                let mut edges = Vec::with_capacity(destructured.arguments.len() + 1);
+                if let Some(identifier) = &destructured.identifier {
+                    let node = self.leaf(Kind::Identifier, &identifier.id, &identifier.span);
+                    edges.push(Edge { field: Field::Identifier, node });
+                }
+                for argument in &destructured.arguments {
+                    let mut argument_edges = Vec::with_capacity(1);
+                    self.optional_edge(&mut argument_edges, Field::Default, &argument.default);
+                    let text = self.intern(&argument.identifier);
+                    let node = self.push(Kind::DestructuredArgument, false, text, TextSpan::default(), argument_edges);
+                    edges.push(Edge { field: Field::Arguments, node });
+                }
+                self.push(Kind::Destructured, destructured.ellipsis, NO_SYMBOL, TextSpan::default(), edges)
+            }
+            FunctionHead::Simple(simple) => {
+                let node = self.leaf(Kind::Identifier, &simple.identifier.id, &simple.identifier.span);
+                let span = self.tree.node(node).span;
+                self.push(Kind::Simple, false, NO_SYMBOL, span, vec![Edge { field: Field::Identifier, node }])
+            }
+        }
+    }
+
+    fn expression(&mut self, expression: &Expression) -> NodeId {
+        let mut edges = Vec::new();
+        let (kind, flag, text, span) = match expression {
+            Expression::Assert(node) => {
+                self.edge(&mut edges, Field::Expression, &node.expression);
+                self.edge(&mut edges, Field::Target, &node.target);
+                (Kind::Assert, false, NO_SYMBOL, &node.span)
+            }
+            Expression::BinaryOperation(node) => {
+                self.edge(&mut edges, Field::Left, &node.left);
+                self.edge(&mut edges, Field::Right, &node.right);
+                let operator = self.intern(&format!("{:?}", node.operator));
+                (Kind::BinaryOperation, false, operator, &node.span)
+            }
+            Expression::Error(node) => return self.leaf(Kind::Error, &node.message, &node.span),
+            Expression::Float(node) => return self.leaf(Kind::Float, &node.value, &node.span),
+            Expression::Function(node) => {
+                let head = self.head(&node.head);
+                edges.push(Edge { field: Field::Head, node: head });
+                self.edge(&mut edges, Field::Body, &node.body);
+                if self.tree.node(head).kind == Kind::Destructured {
+                    // destructured heads have no span in nixel, cover `{ ... }:` up to the body
+                    let body = self.tree.node(edges[1].node).span;
+                    let function = TextSpan::from_nixel(&node.span);
+                    self.tree.nodes[head as usize].span = TextSpan {
+                        end_line: body.start_line,
+                        end_column: body.start_column,
+                        ..function
+                    };
+                }
+                (Kind::Function, false, NO_SYMBOL, &node.span)
+            }
+            Expression::FunctionApplication(node) => {
+                self.edge(&mut edges, Field::Function, &node.function);
+                for argument in &node.arguments {
+                    self.edge(&mut edges, Field::Arguments, argument);
+                }
+                (Kind::FunctionApplication, false, NO_SYMBOL, &node.span)
+            }
+            Expression::HasAttribute(node) => {
+                self.edge(&mut edges, Field::Expression, &node.expression);
+                self.part_edges(&mut edges, Field::AttributePath, &node.attribute_path);
+                (Kind::HasAttribute, false, NO_SYMBOL, &node.span)
+            }
+            Expression::Identifier(node) => return self.leaf(Kind::Identifier, &node.id, &node.span),
+            Expression::IfThenElse(node) => {
+                self.edge(&mut edges, Field::Predicate, &node.predicate);
+                self.edge(&mut edges, Field::Then, &node.then);
+                self.edge(&mut edges, Field::Else, &node.else_);
+                (Kind::IfThenElse, false, NO_SYMBOL, &node.span)
+            }
+            Expression::IndentedString(node) => {
+                self.part_edges(&mut edges, Field::Parts, &node.parts);
+                (Kind::IndentedString, false, NO_SYMBOL, &node.span)
+            }
+            Expression::Integer(node) => return self.leaf(Kind::Integer, &node.value, &node.span),
+            Expression::LetIn(node) => {
+                self.binding_edges(&mut edges, &node.bindings);
+                self.edge(&mut edges, Field::Target, &node.target);
+                (Kind::LetIn, false, NO_SYMBOL, &node.span)
+            }
+            Expression::List(node) => {
+                for element in &node.elements {
+                    self.edge(&mut edges, Field::Elements, element);
+                }
+                (Kind::List, false, NO_SYMBOL, &node.span)
+            }
+            Expression::Map(node) => {
+                self.binding_edges(&mut edges, &node.bindings);
+                (Kind::Map, node.recursive, NO_SYMBOL, &node.span)
+            }
+            Expression::Path(node) => {
+                self.part_edges(&mut edges, Field::Parts, &node.parts);
+                (Kind::Path, false, NO_SYMBOL, &node.span)
+            }
+            Expression::Uri(node) => return self.leaf(Kind::Uri, &node.uri, &node.span),
+            Expression::PropertyAccess(node) => {
+                self.edge(&mut edges, Field::Expression, &node.expression);
+                self.part_edges(&mut edges, Field::AttributePath, &node.attribute_path);
+                self.optional_edge(&mut edges, Field::Default, &node.default);
+                (Kind::PropertyAccess, false, NO_SYMBOL, &node.span)
+            }
+            Expression::SearchNixPath(node) => return self.leaf(Kind::SearchNixPath, &node.path, &node.span),
+            Expression::String(node) => {
+                self.part_edges(&mut edges, Field::Parts, &node.parts);
+                (Kind::String, false, NO_SYMBOL, &node.span)
+            }
+            Expression::UnaryOperation(node) => {
+                self.edge(&mut edges, Field::Operand, &node.operand);
+                let operator = self.intern(&format!("{:?}", node.operator));
+                (Kind::UnaryOperation, false, operator, &node.span)
+            }
+            Expression::With(node) => {
+                self.edge(&mut edges, Field::Expression, &node.expression);
+                self.edge(&mut edges, Field::Target, &node.target);
+                (Kind::With, false, NO_SYMBOL, &node.span)
+            }
+        };
+        self.push(kind, flag, text, TextSpan::from_nixel(span), edges)
+    }
+}
@@ -0,0 +1,193 @@
+// SPDX-License-Identifier: GPL-3.0-or-later
+//
+// This file is part of GNix.
+// GNix - The Graphical Nix Project
+// -----------------------------------------------------------------------------------------|
+// GNix is free software: you can redistribute it and/or modify                             |
+// it under the terms of the GNU General Public License as published by                     |
+// the Free Software Foundation, either version 3 of the License, or any later version.     |
+//                                                                                          |
+// GNix is distributed in the hope that it will be useful,                                  |
+// but WITHOUT ANY WARRANTY; without even the implied warranty of                           |
+// MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the                            |
+// GNU General Public License for more details.                                             |
+//                                                                                          |
+// You should have received a copy of the GNU General Public License                        |
+// along with GNix.  If not, see <https://www.gnu.org/licenses/>.                           |
+// -----------------------------------------------------------------------------------------|
+
+use pyo3::prelude::*;
+use pyo3::types::PyString;
+
+use crate::lazy::packed_span;
+use crate::parser::grammar::*;
+use crate::tree::{Field, Kind, NodeId, Tree, NO_SYMBOL};
+
+// ==================== TYPED CONVERSION ====================
+// Builds the pyclasses of `grammar.rs` from a tree instead of nested dicts.
+// Spans are two packed integers and every distinct identifier or attribute name
+// becomes a single Python string shared by all the nodes using it.
+
+// MARK: TypedBuilder
+pub struct TypedBuilder<'py, 'a> {
+    py: Python<'py>,
+    tree: &'a Tree,
+    strings: Vec<Option<Py<PyString>>>,
+}
+
+impl<'py, 'a> TypedBuilder<'py, 'a> {
+    pub fn new(py: Python<'py>, tree: &'a Tree) -> Self {
+        Self { py, tree, strings: (0..tree.symbols.len()).map(|_| None).collect() }
+    }
+
+    fn string(&mut self, id: NodeId) -> Py<PyString> {
+        let symbol = self.tree.node(id).text;
+        if symbol == NO_SYMBOL {
+            return PyString::new_bound(self.py, "").unbind();
+        }
+        let py = self.py;
+        let tree = self.tree;
+        self.strings[symbol as usize]
+            .get_or_insert_with(|| PyString::new_bound(py, tree.symbol(symbol)).unbind())
+            .clone_ref(py)
+    }
+
+    fn text(&self, id: NodeId) -> String {
+        self.tree.text(id).unwrap_or_default().to_string()
+    }
+
+    fn span(&self, id: NodeId) -> Span {
+        packed_span(&self.tree.node(id).span)
+    }
+
+    fn child(&mut self, id: NodeId, field: Field) -> PyResult<PyObject> {
+        match self.tree.child(id, field) {
+            Some(child) => self.node(child),
+            None => Ok(self.py.None()),
+        }
+    }
+
+    fn optional(&mut self, id: NodeId, field: Field) -> PyResult<Option<PyObject>> {
+        self.tree.child(id, field).map(|child| self.node(child)).transpose()
+    }
+
+    fn list(&mut self, id: NodeId, field: Field) -> PyResult<Vec<PyObject>> {
+        let children: Vec<NodeId> = self.tree.children(id, field).collect();
+        children.into_iter().map(|child| self.node(child)).collect()
+    }
+
+    fn identifier(&mut self, id: NodeId) -> Identifier {
+        Identifier::new(self.string(id), self.span(id))
+    }
+
+    fn operator(&self, id: NodeId) -> PyObject {
+        let py = self.py;
+        match self.tree.text(id).unwrap_or_default() {
+            "Addition" => Addition::new().into_py(py),
+            "Concatenation" => Concatenation::new().into_py(py),
+            "EqualTo" => EqualTo::new().into_py(py),
+            "GreaterThan" => GreaterThan::new().into_py(py),
+            "GreaterThanOrEqualTo" => GreaterThanOrEqualTo::new().into_py(py),
+            "Division" => Division::new().into_py(py),
+            "Implication" => Implication::new().into_py(py),
+            "LessThan" => LessThan::new().into_py(py),
+            "LessThanOrEqualTo" => LessThanOrEqualTo::new().into_py(py),
+            "LogicalAnd" => LogicalAnd::new().into_py(py),
+            "LogicalOr" => LogicalOr::new().into_py(py),
+            "Multiplication" => Multiplication::new().into_py(py),
+            "NotEqualTo" => NotEqualTo::new().into_py(py),
+            "Subtraction" => Subtraction::new().into_py(py),
+            "Update" => Update::new().into_py(py),
+            "Not" => Not::new().into_py(py),
+            "Negate" => Negate::new().into_py(py),
+            _ => py.None(),
+        }
+    }
+
+    // MARK: node
+    pub fn node(&mut self, id: NodeId) -> PyResult<PyObject> {
+        let py = self.py;
+        let span = self.span(id);
+        Ok(match self.tree.node(id).kind {
+            Kind::Assert => Assert::new(self.child(id, Field::Expression)?, self.child(id, Field::Target)?, span).into_py(py),
+            Kind::BinaryOperation => BinaryOperation::new(
+                self.child(id, Field::Left)?,
+                self.operator(id),
+                self.child(id, Field::Right)?,
+                span,
+            ).into_py(py),
+            Kind::Error => Error::new(self.text(id), span).into_py(py),
+            Kind::Float => Float::new(self.text(id), span).into_py(py),
+            Kind::Function => Function::new(self.child(id, Field::Head)?, self.child(id, Field::Body)?, span).into_py(py),
+            Kind::FunctionApplication => FunctionApplication::new(
+                self.child(id, Field::Function)?,
+                self.list(id, Field::Arguments)?.into_py(py),
+                span,
+            ).into_py(py),
+            Kind::HasAttribute => HasAttribute::new(
+                self.child(id, Field::Expression)?,
+                self.list(id, Field::AttributePath)?,
+                span,
+            ).into_py(py),
+            Kind::Identifier => self.identifier(id).into_py(py),
+            Kind::IfThenElse => IfThenElse::new(
+                self.child(id, Field::Predicate)?,
+                self.child(id, Field::Then)?,
+                self.child(id, Field::Else)?,
+                span,
+            ).into_py(py),
+            Kind::IndentedString => IndentedString::new(self.list(id, Field::Parts)?, span).into_py(py),
+            Kind::Integer => Integer::new(self.text(id), span).into_py(py),
+            Kind::LetIn => LetIn::new(self.list(id, Field::Bindings)?, self.child(id, Field::Target)?, span).into_py(py),
+            Kind::List => List::new(self.list(id, Field::Elements)?, span).into_py(py),
+            Kind::Map => Map::new(self.tree.node(id).flag, self.list(id, Field::Bindings)?, span).into_py(py),
+            Kind::Path => Path::new(self.list(id, Field::Parts)?, span).into_py(py),
+            Kind::Uri => Uri::new(self.text(id), span).into_py(py),
+            Kind::PropertyAccess => PropertyAccess::new(
+                self.child(id, Field::Expression)?,
+                self.list(id, Field::AttributePath)?,
+                self.optional(id, Field::Default)?,
+                span,
+            ).into_py(py),
+            Kind::SearchNixPath => SearchNixPath::new(self.text(id), span).into_py(py),
+            Kind::String => NixString::new(self.list(id, Field::Parts)?, span).into_py(py),
+            Kind::UnaryOperation => UnaryOperation::new(self.operator(id), self.child(id, Field::Operand)?, span).into_py(py),
+            Kind::With => With::new(self.child(id, Field::Expression)?, self.child(id, Field::Target)?, span).into_py(py),
+            Kind::Interpolation => PartInterpolation::new(self.child(id, Field::Expression)?, span).into_py(py),
+            Kind::Raw => PartRaw::new(self.string(id), span).into_py(py),
+            Kind::Inherit => BindingInherit::new(
+                self.optional(id, Field::From)?,
+                self.list(id, Field::Attributes)?.into_py(py),
+                span,
+            ).into_py(py),
+            Kind::KeyValue => BindingKeyValue::new(
+                self.list(id, Field::From)?.into_py(py),
+                self.child(id, Field::To)?,
+            ).into_py(py),
+            Kind::Destructured => {
+                let identifier = self.tree.child(id, Field::Identifier).map(|child| self.identifier(child));
+                FunctionHeadDestructured::new(
+                    self.tree.node(id).flag,
+                    identifier,
+                    self.list(id, Field::Arguments)?,
+                    span,
+                ).into_py(py)
+            }
+            Kind::DestructuredArgument => {
+                FunctionHeadDestructuredArgument::new(self.text(id), self.optional(id, Field::Default)?).into_py(py)
+            }
+            Kind::Simple => {
+                let identifier = match self.tree.child(id, Field::Identifier) {
+                    Some(child) => self.identifier(child),
+                    None => Identifier::new(PyString::new_bound(py, "").unbind(), span),
+                };
+                FunctionHeadSimple::new(identifier, span).into_py(py)
+            }
+        })
+    }
+}
+
+/// Typed AST of the subtree rooted at `id`
+pub fn tree_to_typed(py: Python, tree: &Tree, id: NodeId) -> PyResult<PyObject> {
+    TypedBuilder::new(py, tree).node(id)
+}
@@ -16,299 +16,306 @@
 // along with GNix.  If not, see <https://www.gnu.org/licenses/>.                           |
 // -----------------------------------------------------------------------------------------|
 
-use crate::parser::grammar::*;
+use std::fs;
+use std::path::PathBuf;
+use std::sync::Arc;
 
+use nixel::{Binding, Expression, FunctionHead, Part};
+
+use pyo3::buffer::PyBuffer;
+use pyo3::exceptions::{PyOSError, PyValueError};
 use pyo3::prelude::*;
 use pyo3::types::{PyDict, PyList};
 use pyo3::Bound;
 
-use serde_json::Value;
-
-pub fn build_py(py: Python, value: &serde_json::Value) -> PyResult<PyObject> {
-    match value {
-        Value::Null => Ok(py.None()),
-        Value::Bool(b) => Ok(b.into_py(py)),
-        Value::Number(n) => {
-            if let Some(i) = n.as_i64() {
-                Ok(i.into_py(py))
-            } else if let Some(f) = n.as_f64() {
-                Ok(f.into_py(py))
-            } else {
-                Ok(py.None())
-            }
+use crate::index::{join_path, split_path, visit_bindings};
+use crate::lazy::LazyNode;
+use crate::trace;
+use crate::tree::{Field, Kind, Tree};
+use crate::typed::tree_to_typed;
+
+// ==================== AST CONVERSION ====================
+// The conversion walks the nixel AST directly and builds the Python objects in a
+// single pass. Nodes keep the shape that serde would give them (externally tagged
+// enums, e.g. `{"Map": {"recursive": ..., "bindings": [...], "span": ...}}`) so
+// existing consumers such as `find_key_pair` keep working.
+
+// MARK: tagged
+fn tagged(py: Python, tag: &str, fields: Bound<'_, PyDict>) -> PyResult<PyObject> {
+    let node = PyDict::new_bound(py);
+    node.set_item(tag, fields)?;
+    Ok(node.into_py(py))
+}
+
+// MARK: Position / Span
+pub fn position_to_py(py: Python, position: &nixel::Position) -> PyResult<PyObject> {
+    let dict = PyDict::new_bound(py);
+    dict.set_item("line", position.line)?;
+    dict.set_item("column", position.column)?;
+    Ok(dict.into_py(py))
+}
+
+pub fn span_to_py(py: Python, span: &nixel::Span) -> PyResult<PyObject> {
+    let dict = PyDict::new_bound(py);
+    dict.set_item("start", position_to_py(py, &span.start)?)?;
+    dict.set_item("end", position_to_py(py, &span.end)?)?;
+    Ok(dict.into_py(py))
+}
+
+// MARK: Parts
+pub fn part_to_py(py: Python, part: &Part) -> PyResult<PyObject> {
+    match part {
+        Part::Expression(expression) => {
+            let node = PyDict::new_bound(py);
+            node.set_item("Expression", expression_to_py(py, expression)?)?;
+            Ok(node.into_py(py))
         }
-        Value::String(s) => Ok(s.into_py(py)),
-        Value::Array(arr) => {
-            let py_list = PyList::empty_bound(py);
-            for item in arr {
-                py_list.append(build_py(py, item)?)?;
-            }
-            Ok(py_list.into_py(py))
+        Part::Interpolation(interpolation) => {
+            let fields = PyDict::new_bound(py);
+            fields.set_item("expression", expression_to_py(py, &interpolation.expression)?)?;
+            fields.set_item("span", span_to_py(py, &interpolation.span)?)?;
+            tagged(py, "Interpolation", fields)
         }
-        Value::Object(obj) => {
-            if let Some(expression) = obj.get("expression") {
-                return build_py(py, expression);
-            }
+        Part::Raw(raw) => {
+            let fields = PyDict::new_bound(py);
+            fields.set_item("content", &*raw.content)?;
+            fields.set_item("span", span_to_py(py, &raw.span)?)?;
+            tagged(py, "Raw", fields)
+        }
+    }
+}
 
-            let node_type = obj.get("type").and_then(Value::as_str).unwrap_or("");
-        
-            match node_type {
-                "Position" => Ok(Position::new(
-                    obj.get("line").and_then(Value::as_i64).unwrap_or(0),
-                    obj.get("column").and_then(Value::as_i64).unwrap_or(0),
-                ).into_py(py)),
-                
-                "Span" => Ok(Span::new(
-                    build_py(py, obj.get("start").unwrap_or(&Value::Null))?.extract(py)?,
-                    build_py(py, obj.get("end").unwrap_or(&Value::Null))?.extract(py)?,
-                ).into_py(py)),
-                
-                "Identifier" => Ok(Identifier::new(
-                    obj.get("id").and_then(Value::as_str).unwrap_or_default().to_string(),
-                    build_py(py, obj.get("span").unwrap_or(&Value::Null))?.extract(py)?,
-                ).into_py(py)),
-
-                "Error" => Ok(Error::new(
-                    obj.get("message").and_then(Value::as_str).unwrap_or_default().to_string(),            
-                    build_py(py, obj.get("span").unwrap_or(&Value::Null))?.extract(py)?,
-                ).into_py(py)),
-
-                "Integer" => Ok(Integer::new(
-                    obj.get("value").and_then(Value::as_str).unwrap_or_default().to_string(),
-                    build_py(py, obj.get("span").unwrap_or(&Value::Null))?.extract(py)?,
-                ).into_py(py)),
-
-                "Float" => Ok(Float::new(
-                    obj.get("value").and_then(Value::as_str).unwrap_or_default().to_string(),
-                    build_py(py, obj.get("span").unwrap_or(&Value::Null))?.extract(py)?,
-                ).into_py(py)),
-
-                "Function" => Ok(Function::new(
-                    build_py(py, obj.get("head").unwrap_or(&Value::Null))?,
-                    build_py(py, obj.get("body").unwrap_or(&Value::Null))?,
-                    build_py(py, obj.get("span").unwrap_or(&Value::Null))?.extract(py)?,
-                ).into_py(py)),
-
-                "Addition" => Ok(Addition::new().into_py(py)),
-                "Concatenation" => Ok(Concatenation::new().into_py(py)),
-                "EqualTo" => Ok(EqualTo::new().into_py(py)),
-                "GreaterThan" => Ok(GreaterThan::new().into_py(py)),
-                "GreaterThanOrEqualTo" => Ok(GreaterThanOrEqualTo::new().into_py(py)),
-                "Division" => Ok(Division::new().into_py(py)),
-                "Implication" => Ok(Implication::new().into_py(py)),
-                "LessThan" => Ok(LessThan::new().into_py(py)),
-                "LessThanOrEqualTo" => Ok(LessThanOrEqualTo::new().into_py(py)),
-                "LogicalAnd" => Ok(LogicalAnd::new().into_py(py)),
-                "LogicalOr" => Ok(LogicalOr::new().into_py(py)),
-                "Multiplication" => Ok(Multiplication::new().into_py(py)),
-                "NotEqualTo" => Ok(NotEqualTo::new().into_py(py)),
-                "Subtraction" => Ok(Subtraction::new().into_py(py)),
-                "Update" => Ok(Update::new().into_py(py)),
-                "Not" => Ok(Not::new().into_py(py)),
-                "Negate" => Ok(Negate::new().into_py(py)),
-
-                "List" => Ok(List::new(
-                    obj.get("elements").and_then(Value::as_array).unwrap_or(&vec![])
-                        .iter()
-                        .map(|v| build_py(py, v))
-                        .collect::<Result<Vec<_>, _>>()?,
-                    build_py(py, obj.get("span").unwrap_or(&Value::Null))?.extract(py)?,
-                ).into_py(py)),
-
-                "BinaryOperation" => Ok(BinaryOperation::new(
-                    build_py(py, obj.get("left").unwrap_or(&Value::Null))?,
-                    build_py(py, obj.get("operator").unwrap_or(&Value::Null))?,
-                    build_py(py, obj.get("right").unwrap_or(&Value::Null))?,
-                    build_py(py, obj.get("span").unwrap_or(&Value::Null))?.extract(py)?,
-                ).into_py(py)),
-
-                "FunctionHeadDestructuredArgument" => Ok(FunctionHeadDestructuredArgument::new(
-                    obj.get("identifier").and_then(Value::as_str).unwrap_or_default().to_string(),
-                    obj.get("default").map(|v| build_py(py, v)).transpose()?,
-                ).into_py(py)),
-
-                "FunctionHeadDestructured" => Ok(FunctionHeadDestructured::new(
-                    obj.get("ellipsis").and_then(Value::as_bool).unwrap_or(false),
-                    build_py(py, obj.get("identifier").unwrap_or(&Value::Null))?.extract(py)?,
-                    build_py(py, obj.get("arguments").unwrap_or(&Value::Null))?.extract(py)?,
-                    build_py(py, obj.get("span").unwrap_or(&Value::Null))?.extract(py)?,
-                ).into_py(py)),
-
-                "FunctionHeadSimple" => Ok(FunctionHeadSimple::new(
-                    build_py(py, obj.get("identifier").unwrap_or(&Value::Null))?.extract(py)?,
-                    build_py(py, obj.get("span").unwrap_or(&Value::Null))?.extract(py)?,
-                ).into_py(py)),
-
-                "FunctionApplication" => Ok(FunctionApplication::new(
-                    build_py(py, obj.get("function").unwrap_or(&Value::Null))?,
-                    build_py(py, obj.get("arguments").unwrap_or(&Value::Null))?,
-                    build_py(py, obj.get("span").unwrap_or(&Value::Null))?.extract(py)?,
-                ).into_py(py)),
-
-                "PartInterpolation" => Ok(PartInterpolation::new(
-                    build_py(py, obj.get("expression").unwrap_or(&Value::Null))?,
-                    build_py(py, obj.get("span").unwrap_or(&Value::Null))?.extract(py)?,
-                ).into_py(py)),
-
-                "PartRaw" => Ok(PartRaw::new(
-                    obj.get("content").and_then(Value::as_str).unwrap_or_default().to_string(),
-                    build_py(py, obj.get("span").unwrap_or(&Value::Null))?.extract(py)?,
-                ).into_py(py)),
-
-                "Assert" => Ok(Assert::new(
-                    build_py(py, obj.get("expression").unwrap_or(&Value::Null))?,
-                    build_py(py, obj.get("target").unwrap_or(&Value::Null))?,
-                    build_py(py, obj.get("span").unwrap_or(&Value::Null))?.extract(py)?,
-                ).into_py(py)),
-
-                "HasAttribute" => Ok(HasAttribute::new(
-                    build_py(py, obj.get("expression").unwrap_or(&Value::Null))?,
-                    obj.get("attribute_path").and_then(Value::as_array).unwrap_or(&vec![])
-                        .iter()
-                        .map(|v| build_py(py, v))
-                        .collect::<Result<Vec<_>, _>>()?,
-                    build_py(py, obj.get("span").unwrap_or(&Value::Null))?.extract(py)?,
-                ).into_py(py)),
-
-                "IndentedString" => Ok(IndentedString::new(
-                    obj.get("parts").and_then(Value::as_array).unwrap_or(&vec![])
-                        .iter()
-                        .map(|v| build_py(py, v))
-                        .collect::<Result<Vec<_>, _>>()?,
-                    build_py(py, obj.get("span").unwrap_or(&Value::Null))?.extract(py)?,
-                ).into_py(py)),
-
-                "IfThenElse" => Ok(IfThenElse::new(
-                    build_py(py, obj.get("predicate").unwrap_or(&Value::Null))?,
-                    build_py(py, obj.get("then").unwrap_or(&Value::Null))?,
-                    build_py(py, obj.get("else_").unwrap_or(&Value::Null))?,
-                    build_py(py, obj.get("span").unwrap_or(&Value::Null))?.extract(py)?,
-                ).into_py(py)),
-
-                "LetIn" => Ok(LetIn::new(
-                    obj.get("bindings").and_then(Value::as_array).unwrap_or(&vec![])
-                        .iter()
-                        .map(|v| build_py(py, v))
-                        .collect::<Result<Vec<_>, _>>()?,
-                    build_py(py, obj.get("target").unwrap_or(&Value::Null))?,
-                    build_py(py, obj.get("span").unwrap_or(&Value::Null))?.extract(py)?,
-                ).into_py(py)),
-
-                "Map" => Ok(Map::new(
-                    obj.get("recursive").and_then(Value::as_bool).unwrap_or(false),
-                    obj.get("bindings").and_then(Value::as_array).unwrap_or(&vec![])
-                        .iter()
-                        .map(|v| build_py(py, v))
-                        .collect::<Result<Vec<_>, _>>()?,
-                    build_py(py, obj.get("span").unwrap_or(&Value::Null))?.extract(py)?,
-                ).into_py(py)),
-
-                "Path" => Ok(Path::new(
-                    obj.get("parts").and_then(Value::as_array).unwrap_or(&vec![])
-                        .iter()
-                        .map(|v| build_py(py, v))
-                        .collect::<Result<Vec<_>, _>>()?,
-                    build_py(py, obj.get("span").unwrap_or(&Value::Null))?.extract(py)?,
-                ).into_py(py)),
-
-                "Uri" => Ok(Uri::new(
-                    obj.get("uri").and_then(Value::as_str).unwrap_or_default().to_string(),
-                    build_py(py, obj.get("span").unwrap_or(&Value::Null))?.extract(py)?,
-                ).into_py(py)),
-
-                "PropertyAccess" => Ok(PropertyAccess::new(
-                    build_py(py, obj.get("expression").unwrap_or(&Value::Null))?,
-                    obj.get("attribute_path").and_then(Value::as_array).unwrap_or(&vec![])
-                        .iter()
-                        .map(|v| build_py(py, v))
-                        .collect::<Result<Vec<_>, _>>()?,
-                    obj.get("default").map(|v| build_py(py, v)).transpose()?,
-                    build_py(py, obj.get("span").unwrap_or(&Value::Null))?.extract(py)?,
-                ).into_py(py)),
-
-                "SearchNixPath" => Ok(SearchNixPath::new(
-                    obj.get("path").and_then(Value::as_str).unwrap_or_default().to_string(),
-                    build_py(py, obj.get("span").unwrap_or(&Value::Null))?.extract(py)?,
-                ).into_py(py)),
-
-                "NixString" => Ok(NixString::new(
-                    obj.get("parts").and_then(Value::as_array).unwrap_or(&vec![])
-                        .iter()
-                        .map(|v| build_py(py, v))
-                        .collect::<Result<Vec<_>, _>>()?,
-                    build_py(py, obj.get("span").unwrap_or(&Value::Null))?.extract(py)?,
-                ).into_py(py)),
-
-                "UnaryOperation" => Ok(UnaryOperation::new(
-                    build_py(py, obj.get("operator").unwrap_or(&Value::Null))?,
-                    build_py(py, obj.get("operand").unwrap_or(&Value::Null))?,
-                    build_py(py, obj.get("span").unwrap_or(&Value::Null))?.extract(py)?,
-                ).into_py(py)),
-
-                "With" => Ok(With::new(
-                    build_py(py, obj.get("expression").unwrap_or(&Value::Null))?,
-                    build_py(py, obj.get("target").unwrap_or(&Value::Null))?,
-                    build_py(py, obj.get("span").unwrap_or(&Value::Null))?.extract(py)?,
-                ).into_py(py)),
-
-                "BindingInherit" => Ok(BindingInherit::new(
-                    obj.get("from").map(|v| build_py(py, v)).transpose()?,
-                    build_py(py, obj.get("attributes").unwrap_or(&Value::Null))?,
-                    build_py(py, obj.get("span").unwrap_or(&Value::Null))?.extract(py)?,
-                ).into_py(py)),
-
-                "BindingKeyValue" => Ok(BindingKeyValue::new(
-                    build_py(py, obj.get("from").unwrap_or(&Value::Null))?,
-                    build_py(py, obj.get("to").unwrap_or(&Value::Null))?,
-                ).into_py(py)),
-
-                _ => {
-                    let dict = PyDict::new_bound(py);
-                    for (k, v) in obj {
-                        dict.set_item(k, build_py(py, v)?)?;
-                    }
-                    Ok(dict.into_py(py))
-                }
-            }
+fn parts_to_py(py: Python, parts: &[Part]) -> PyResult<PyObject> {
+    let py_list = PyList::empty_bound(py);
+    for part in parts {
+        py_list.append(part_to_py(py, part)?)?;
+    }
+    Ok(py_list.into_py(py))
+}
+
+fn expressions_to_py(py: Python, expressions: &[Expression]) -> PyResult<PyObject> {
+    let py_list = PyList::empty_bound(py);
+    for expression in expressions {
+        py_list.append(expression_to_py(py, expression)?)?;
+    }
+    Ok(py_list.into_py(py))
+}
+
+fn optional_expression_to_py(py: Python, expression: &Option<Expression>) -> PyResult<PyObject> {
+    match expression {
+        Some(expression) => expression_to_py(py, expression),
+        None => Ok(py.None()),
+    }
+}
+
+// MARK: Bindings
+pub fn binding_to_py(py: Python, binding: &Binding) -> PyResult<PyObject> {
+    match binding {
+        Binding::Inherit(inherit) => {
+            let fields = PyDict::new_bound(py);
+            fields.set_item("from", optional_expression_to_py(py, &inherit.from)?)?;
+            fields.set_item("attributes", parts_to_py(py, &inherit.attributes)?)?;
+            fields.set_item("span", span_to_py(py, &inherit.span)?)?;
+            tagged(py, "Inherit", fields)
         }
+        Binding::KeyValue(key_value) => {
+            let fields = PyDict::new_bound(py);
+            fields.set_item("from", parts_to_py(py, &key_value.from)?)?;
+            fields.set_item("to", expression_to_py(py, &key_value.to)?)?;
+            tagged(py, "KeyValue", fields)
+        }
+    }
+}
+
+fn bindings_to_py(py: Python, bindings: &[Binding]) -> PyResult<PyObject> {
+    let py_list = PyList::empty_bound(py);
+    for binding in bindings {
+        py_list.append(binding_to_py(py, binding)?)?;
     }
+    Ok(py_list.into_py(py))
 }
 
-pub fn json_to_py(py: Python, value: Value) -> PyObject {
-    match value {
-        Value::Null => py.None(),
-        Value::Bool(b) => b.into_py(py),
-        Value::Number(n) => {
-            if let Some(i) = n.as_i64() {
-                i.into_py(py)
-            } else if let Some(f) = n.as_f64() {
-                f.into_py(py)
-            } else {
-                py.None()
+// MARK: Function heads
+pub fn function_head_to_py(py: Python, head: &FunctionHead) -> PyResult<PyObject> {
+    match head {
+        FunctionHead::Destructured(destructured) => {
+            let arguments = PyList::empty_bound(py);
+            for argument in &destructured.arguments {
+                let argument_fields = PyDict::new_bound(py);
+                argument_fields.set_item("identifier", &*argument.identifier)?;
+                argument_fields.set_item("default", optional_expression_to_py(py, &argument.default)?)?;
+                arguments.append(argument_fields)?;
             }
-        }
-        Value::String(s) => s.into_py(py),
-        Value::Array(arr) => {
-            let py_list = PyList::empty_bound(py);
-            for val in arr {
-                py_list.append(json_to_py(py, val)).unwrap();
+            let fields = PyDict::new_bound(py);
+            fields.set_item("ellipsis", destructured.ellipsis)?;
+            match &destructured.identifier {
+                Some(identifier) => fields.set_item("identifier", identifier_to_py(py, identifier)?)?,
+                None => fields.set_item("identifier", py.None())?,
             }
-            py_list.into_py(py)
+            fields.set_item("arguments", arguments)?;
+            tagged(py, "Destructured", fields)
         }
-        Value::Object(obj) => {
-            let py_dict = PyDict::new_bound(py);
-            for (key, val) in obj {
-                py_dict.set_item(key, json_to_py(py, val)).unwrap();
-            }
-            py_dict.into_py(py)
+        FunctionHead::Simple(simple) => {
+            let fields = PyDict::new_bound(py);
+            fields.set_item("identifier", identifier_to_py(py, &simple.identifier)?)?;
+            tagged(py, "Simple", fields)
         }
     }
 }
 
+fn identifier_to_py(py: Python, identifier: &nixel::Identifier) -> PyResult<PyObject> {
+    let fields = PyDict::new_bound(py);
+    fields.set_item("id", &*identifier.id)?;
+    fields.set_item("span", span_to_py(py, &identifier.span)?)?;
+    Ok(fields.into_py(py))
+}
+
+// MARK: Expressions
+pub fn expression_to_py(py: Python, expression: &Expression) -> PyResult<PyObject> {
+    let fields = PyDict::new_bound(py);
+    let tag = match expression {
+        Expression::Assert(node) => {
+            fields.set_item("expression", expression_to_py(py, &node.expression)?)?;
+            fields.set_item("target", expression_to_py(py, &node.target)?)?;
+            fields.set_item("span", span_to_py(py, &node.span)?)?;
+            "Assert"
+        }
+        Expression::BinaryOperation(node) => {
+            fields.set_item("left", expression_to_py(py, &node.left)?)?;
+            fields.set_item("operator", format!("{:?}", node.operator))?;
+            fields.set_item("right", expression_to_py(py, &node.right)?)?;
+            fields.set_item("span", span_to_py(py, &node.span)?)?;
+            "BinaryOperation"
+        }
+        Expression::Error(node) => {
+            fields.set_item("message", &*node.message)?;
+            fields.set_item("span", span_to_py(py, &node.span)?)?;
+            "Error"
+        }
+        Expression::Float(node) => {
+            fields.set_item("value", &*node.value)?;
+            fields.set_item("span", span_to_py(py, &node.span)?)?;
+            "Float"
+        }
+        Expression::Function(node) => {
+            fields.set_item("head", function_head_to_py(py, &node.head)?)?;
+            fields.set_item("body", expression_to_py(py, &node.body)?)?;
+            fields.set_item("span", span_to_py(py, &node.span)?)?;
+            "Function"
+        }
+        Expression::FunctionApplication(node) => {
+            fields.set_item("function", expression_to_py(py, &node.function)?)?;
+            fields.set_item("arguments", expressions_to_py(py, &node.arguments)?)?;
+            fields.set_item("span", span_to_py(py, &node.span)?)?;
+            "FunctionApplication"
+        }
+        Expression::HasAttribute(node) => {
+            fields.set_item("expression", expression_to_py(py, &node.expression)?)?;
+            fields.set_item("attribute_path", parts_to_py(py, &node.attribute_path)?)?;
+            fields.set_item("span", span_to_py(py, &node.span)?)?;
+            "HasAttribute"
+        }
+        Expression::Identifier(node) => {
+            fields.set_item("id", &*node.id)?;
+            fields.set_item("span", span_to_py(py, &node.span)?)?;
+            "Identifier"
+        }
+        Expression::IfThenElse(node) => {
+            fields.set_item("predicate", expression_to_py(py, &node.predicate)?)?;
+            fields.set_item("then", expression_to_py(py, &node.then)?)?;
+            fields.set_item("else_", expression_to_py(py, &node.else_)?)?;
+            fields.set_item("span", span_to_py(py, &node.span)?)?;
+            "IfThenElse"
+        }
+        Expression::IndentedString(node) => {
+            fields.set_item("parts", parts_to_py(py, &node.parts)?)?;
+            fields.set_item("span", span_to_py(py, &node.span)?)?;
+            "IndentedString"
+        }
+        Expression::Integer(node) => {
+            fields.set_item("value", &*node.value)?;
+            fields.set_item("span", span_to_py(py, &node.span)?)?;
+            "Integer"
+        }
+        Expression::LetIn(node) => {
+            fields.set_item("bindings", bindings_to_py(py, &node.bindings)?)?;
+            fields.set_item("target", expression_to_py(py, &node.target)?)?;
+            fields.set_item("span", span_to_py(py, &node.span)?)?;
+            "LetIn"
+        }
+        Expression::List(node) => {
+            fields.set_item("elements", expressions_to_py(py, &node.elements)?)?;
+            fields.set_item("span", span_to_py(py, &node.span)?)?;
+            "List"
+        }
+        Expression::Map(node) => {
+            fields.set_item("recursive", node.recursive)?;
+            fields.set_item("bindings", bindings_to_py(py, &node.bindings)?)?;
+            fields.set_item("span", span_to_py(py, &node.span)?)?;
+            "Map"
+        }
+        Expression::Path(node) => {
+            fields.set_item("parts", parts_to_py(py, &node.parts)?)?;
+            fields.set_item("span", span_to_py(py, &node.span)?)?;
+            "Path"
+        }
+        Expression::Uri(node) => {
+            fields.set_item("uri", &*node.uri)?;
+            fields.set_item("span", span_to_py(py, &node.span)?)?;
+            "Uri"
+        }
+        Expression::PropertyAccess(node) => {
+            fields.set_item("expression", expression_to_py(py, &node.expression)?)?;
+            fields.set_item("attribute_path", parts_to_py(py, &node.attribute_path)?)?;
+            fields.set_item("default", optional_expression_to_py(py, &node.default)?)?;
+            fields.set_item("span", span_to_py(py, &node.span)?)?;
+            "PropertyAccess"
+        }
+        Expression::SearchNixPath(node) => {
+            fields.set_item("path", &*node.path)?;
+            fields.set_item("span", span_to_py(py, &node.span)?)?;
+            "SearchNixPath"
+        }
+        Expression::String(node) => {
+            fields.set_item("parts", parts_to_py(py, &node.parts)?)?;
+            fields.set_item("span", span_to_py(py, &node.span)?)?;
+            "String"
+        }
+        Expression::UnaryOperation(node) => {
+            fields.set_item("operator", format!("{:?}", node.operator))?;
+            fields.set_item("operand", expression_to_py(py, &node.operand)?)?;
+            fields.set_item("span", span_to_py(py, &node.span)?)?;
+            "UnaryOperation"
+        }
+        Expression::With(node) => {
+            fields.set_item("expression", expression_to_py(py, &node.expression)?)?;
+            fields.set_item("target", expression_to_py(py, &node.target)?)?;
+            fields.set_item("span", span_to_py(py, &node.span)?)?;
+            "With"
+        }
+    };
+    tagged(py, tag, fields)
+}
+
 #[pyfunction]
 pub fn find_key_pair(py: Python, node: PyObject, key: &str) -> PyResult<Option<PyObject>> {
+    let _scope = trace::scope("find_key_pair");
+    // a dotted key names a full attribute path, answered the same way for lazy
+    // trees and dict ASTs: the first definition in source order
+    let segments = split_path(key);
+    if segments.len() > 1 {
+        return find_path(py, node, &segments);
+    }
     let bound_node = node.bind(py);
 
+    if let Ok(lazy) = bound_node.downcast::<LazyNode>() {
+        let lazy = lazy.get();
+        return lazy.tree
+            .find_key_pair(lazy.id, key)
+            .map(|id| lazy.child_to_py(py, id))
+            .transpose();
+    }
+
     if let Ok(dict) = bound_node.downcast::<PyDict>() {
         if let Some(result) = process_keyvalue(py, &dict, key)? {
             return Ok(Some(result));
@@ -330,6 +337,151 @@ pub fn find_key_pair(py: Python, node: PyObject, key: &str) -> PyResult<Option<P
     Ok(None)
 }
 
+/// Value of the first KeyValue binding defining the attribute path `segments`
+/// below `node`, following the nesting rules of the attribute index
+fn find_path(py: Python, node: PyObject, segments: &[String]) -> PyResult<Option<PyObject>> {
+    let bound_node = node.bind(py);
+
+    if let Ok(lazy) = bound_node.downcast::<LazyNode>() {
+        let lazy = lazy.get();
+        let path = join_path(segments);
+        let first = if lazy.id == lazy.tree.root {
+            lazy.tree.index.get(&path).iter().copied()
+                .find(|&binding| lazy.tree.node(binding).kind == Kind::KeyValue)
+        } else {
+            let mut first = None;
+            visit_bindings(&lazy.tree, lazy.id, "", &mut |found, binding| {
+                if first.is_none() && found == path && lazy.tree.node(binding).kind == Kind::KeyValue {
+                    first = Some(binding);
+                }
+            });
+            first
+        };
+        return first
+            .and_then(|binding| lazy.tree.child(binding, Field::To))
+            .map(|id| lazy.child_to_py(py, id))
+            .transpose();
+    }
+
+    Ok(find_path_in_dict(bound_node, segments)?.map(|value| value.into_py(py)))
+}
+
+fn find_path_in_dict<'py>(node: &Bound<'py, PyAny>, segments: &[String]) -> PyResult<Option<Bound<'py, PyAny>>> {
+    let Some((tag, fields)) = tagged_fields(node) else {
+        return Ok(None);
+    };
+    let field = |name: &str| fields.get_item(name).ok().flatten();
+    let children: Vec<Bound<'py, PyAny>> = match tag.as_str() {
+        "Map" => {
+            let Some(bindings) = field("bindings") else {
+                return Ok(None);
+            };
+            for binding in bindings.downcast::<PyList>()?.iter() {
+                if let Some(value) = find_path_in_binding(&binding, segments)? {
+                    return Ok(Some(value));
+                }
+            }
+            return Ok(None);
+        }
+        "Function" => field("body").into_iter().collect(),
+        "LetIn" | "With" | "Assert" => field("target").into_iter().collect(),
+        "IfThenElse" => field("then").into_iter().chain(field("else_")).collect(),
+        "FunctionApplication" => match field("arguments") {
+            Some(arguments) => arguments.downcast::<PyList>()?.iter().collect(),
+            None => Vec::new(),
+        },
+        _ => Vec::new(),
+    };
+    for child in children {
+        if let Some(value) = find_path_in_dict(&child, segments)? {
+            return Ok(Some(value));
+        }
+    }
+    Ok(None)
+}
+
+fn find_path_in_binding<'py>(binding: &Bound<'py, PyAny>, segments: &[String]) -> PyResult<Option<Bound<'py, PyAny>>> {
+    let Some((tag, fields)) = tagged_fields(binding) else {
+        return Ok(None);
+    };
+    if tag != "KeyValue" {
+        return Ok(None);
+    }
+    let (Some(from), Some(to)) = (fields.get_item("from")?, fields.get_item("to")?) else {
+        return Ok(None);
+    };
+    let mut depth = 0;
+    for part in from.downcast::<PyList>()?.iter() {
+        // dynamic attributes (`${name} = ...`) have no static path
+        match dict_attribute_name(&part) {
+            Some(name) if depth < segments.len() && name == segments[depth] => depth += 1,
+            _ => return Ok(None),
+        }
+    }
+    if depth == segments.len() {
+        return Ok(Some(to));
+    }
+    find_path_in_dict(&to, &segments[depth..])
+}
+
+/// The tag and fields of an externally tagged node, `{"Map": {...}}`
+fn tagged_fields<'py>(node: &Bound<'py, PyAny>) -> Option<(String, Bound<'py, PyDict>)> {
+    let dict = node.downcast::<PyDict>().ok()?;
+    if dict.len() != 1 {
+        return None;
+    }
+    let (tag, fields) = dict.iter().next()?;
+    Some((tag.extract().ok()?, fields.downcast_into::<PyDict>().ok()?))
+}
+
+/// Static name of an attribute path part of a dict AST, `foo` or `"foo"`
+fn dict_attribute_name(part: &Bound<'_, PyAny>) -> Option<String> {
+    let (tag, fields) = tagged_fields(part)?;
+    match tag.as_str() {
+        "Raw" => fields.get_item("content").ok()??.extract().ok(),
+        "Expression" => {
+            let (tag, fields) = tagged_fields(fields.as_any())?;
+            if tag != "String" {
+                return None;
+            }
+            let parts = fields.get_item("parts").ok()??;
+            let mut name = String::new();
+            for part in parts.downcast::<PyList>().ok()?.iter() {
+                let (tag, fields) = tagged_fields(&part)?;
+                if tag != "Raw" {
+                    return None;
+                }
+                name.push_str(&fields.get_item("content").ok()??.extract::<String>().ok()?);
+            }
+            Some(name)
+        }
+        _ => None,
+    }
+}
+
+/// Every binding of the tree `node` belongs to that defines exactly `path`
+#[pyfunction]
+pub fn find_definitions(py: Python, node: &Bound<'_, LazyNode>, path: &str) -> PyResult<Vec<PyObject>> {
+    let lazy = node.get();
+    lazy.tree.index.get(path)
+        .iter()
+        .map(|&binding| lazy.child_to_py(py, binding))
+        .collect()
+}
+
+/// Every indexed path of the tree `node` belongs to that starts with `prefix`
+#[pyfunction]
+pub fn find_definitions_with_prefix(py: Python, node: &Bound<'_, LazyNode>, prefix: &str) -> PyResult<Vec<(String, PyObject)>> {
+    let lazy = node.get();
+    let mut definitions = Vec::new();
+    for (path, bindings) in lazy.tree.index.with_prefix(prefix) {
+        for &binding in bindings {
+            definitions.push((path.to_string(), lazy.child_to_py(py, binding)?));
+        }
+    }
+    Ok(definitions)
+}
+
 pub fn process_keyvalue(
     py: Python<'_>,
     dict: &Bound<'_, PyDict>,
@@ -377,12 +529,58 @@ pub fn process_keyvalue(
 }
 
 #[pyfunction]
-pub fn parse_nix(py: Python, nix_script: String) -> PyResult<PyObject> {
-    let parsed = nixel::parse(nix_script);
-    let json_value = serde_json::to_value(&parsed)
-        .map_err(|e| PyErr::new::<pyo3::exceptions::PyRuntimeError, _>(e.to_string()))?;
-    
-    let ast = build_py(py, &json_value)?;
-    println!("{:?}", ast);
-    Ok(ast)
-}
\ No newline at end of file
+#[pyo3(signature = (nix_script, lazy=false, typed=false))]
+pub fn parse_nix(py: Python, nix_script: String, lazy: bool, typed: bool) -> PyResult<PyObject> {
+    parse_owned(py, nix_script, lazy, typed)
+}
+
+/// Parses an owned script, the tree is built without the GIL in lazy and typed mode
+fn parse_owned(py: Python, nix_script: String, lazy: bool, typed: bool) -> PyResult<PyObject> {
+    if lazy && typed {
+        return Err(PyValueError::new_err("lazy and typed are mutually exclusive"));
+    }
+    if lazy || typed {
+        let tree = Arc::new(py.allow_threads(|| Tree::parse(nix_script)));
+        let root = tree.root;
+        if typed {
+            let _scope = trace::scope("python objects");
+            return tree_to_typed(py, &tree, root);
+        }
+        return Ok(Py::new(py, LazyNode::new(tree, root))?.into_py(py));
+    }
+    let parsed = {
+        let _scope = trace::scope("nixel parse");
+        nixel::parse(nix_script)
+    };
+    let _scope = trace::scope("python objects");
+    expression_to_py(py, &parsed.expression)
+}
+
+#[pyfunction]
+#[pyo3(signature = (path, lazy=false, typed=false))]
+pub fn parse_nix_file(py: Python, path: PathBuf, lazy: bool, typed: bool) -> PyResult<PyObject> {
+    // read straight into the String nixel takes ownership of, the file never
+    // becomes a Python str
+    let nix_script = py.allow_threads(|| {
+        let _scope = trace::scope("read file");
+        fs::read_to_string(&path)
+    })
+        .map_err(|e| PyOSError::new_err(format!("{}: {}", path.display(), e)))?;
+    parse_owned(py, nix_script, lazy, typed)
+}
+
+#[pyfunction]
+#[pyo3(signature = (data, lazy=false, typed=false))]
+pub fn parse_nix_bytes(py: Python, data: PyBuffer<u8>, lazy: bool, typed: bool) -> PyResult<PyObject> {
+    let nix_script = if data.is_c_contiguous() {
+        // SAFETY: the buffer is contiguous, `data` keeps the exporter alive and
+        // its memory is only read while the GIL is held
+        let bytes = unsafe { std::slice::from_raw_parts(data.buf_ptr() as *const u8, data.len_bytes()) };
+        std::str::from_utf8(bytes)
+            .map_err(|e| PyValueError::new_err(e.to_string()))?
+            .to_owned()
+    } else {
+        String::from_utf8(data.to_vec(py)?).map_err(|e| PyValueError::new_err(e.to_string()))?
+    };
+    parse_owned(py, nix_script, lazy, typed)
+}
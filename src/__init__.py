@@ -17,11 +17,13 @@
 # along with GNix.  If not, see <https://www.gnu.org/licenses/>.                        #
 #########################################################################################
 
-from .app import GNix
-from PyQt5.QtWidgets import QApplication
 import sys
 
 def main():
+    # Qt is only imported once the GUI starts, so `src.nix_manager` can be used headless
+    from PyQt5.QtWidgets import QApplication
+    from .app import GNix
+
     app = QApplication(sys.argv)
     window = GNix()
     window.show()
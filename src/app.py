@@ -16,9 +16,17 @@
 # You should have received a copy of the GNU General Public License                     #
 # along with GNix.  If not, see <https://www.gnu.org/licenses/>.                        #
 #########################################################################################
-from PyQt5.QtWidgets import QMainWindow, QStackedWidget, QPushButton, QVBoxLayout, QWidget
+import importlib
 
-from src.pages.init_nixos_conf import InitNixosConfig
+from PyQt5.QtGui import QKeySequence
+from PyQt5.QtWidgets import QMainWindow, QShortcut, QStackedWidget, QPushButton, QVBoxLayout, QWidget
+
+from .nix_manager import profiling
+
+# page name -> (module, class), pages are imported and built on first navigation
+PAGES = {
+    "init_nixos_config": ("src.pages.init_nixos_conf", "InitNixosConfig"),
+}
 
 class GNix(QMainWindow):
     def __init__(self):
@@ -41,9 +49,33 @@ class GNix(QMainWindow):
         central_widget.setLayout(main_layout)
         self.setCentralWidget(central_widget)
         
-        self.load_pages()
-        self.stacked_widget.setCurrentWidget(self.init_nixos_config)
-    
-    def load_pages(self):
-        self.init_nixos_config = InitNixosConfig()
-        self.stacked_widget.addWidget(self.init_nixos_config)
\ No newline at end of file
+        self.pages = {}
+        self.show_page("init_nixos_config")
+
+        self.trace_panel = None
+        if profiling.ENABLED:
+            QShortcut(QKeySequence("Ctrl+Shift+D"), self, activated=self.show_trace_panel)
+
+    def page(self, name: str) -> QWidget:
+        """Returns the page `name`, importing and building it the first time
+
+        Args:
+            name (str): key of the page in `PAGES`
+        """
+        if name not in self.pages:
+            module, class_name = PAGES[name]
+            page = getattr(importlib.import_module(module), class_name)()
+            self.stacked_widget.addWidget(page)
+            self.pages[name] = page
+        return self.pages[name]
+
+    def show_page(self, name: str) -> None:
+        self.stacked_widget.setCurrentWidget(self.page(name))
+
+    def show_trace_panel(self) -> None:
+        if self.trace_panel is None:
+            from .trace_panel import TracePanel
+            self.trace_panel = TracePanel(self)
+        self.trace_panel.refresh()
+        self.trace_panel.show()
+        self.trace_panel.raise_()
@@ -0,0 +1,241 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of GNix.
+#########################################################################################
+# GNix - The Graphical Nix Project                                                      #
+#---------------------------------------------------------------------------------------#
+# GNix is free software: you can redistribute it and/or modify                          #
+# it under the terms of the GNU General Public License as published by                  #
+# the Free Software Foundation, either version 3 of the License, or any later version.  #
+#                                                                                       #
+# GNix is distributed in the hope that it will be useful,                               #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of                        #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the                         #
+# GNU General Public License for more details.                                          #
+#                                                                                       #
+# You should have received a copy of the GNU General Public License                     #
+# along with GNix.  If not, see <https://www.gnu.org/licenses/>.                        #
+#########################################################################################
+"""Item model of a configuration directory, as a folder template would create it.
+
+Each entry merges the template tree with what already exists on disk below the
+chosen directory. Children are only listed when a view expands their parent,
+through `canFetchMore`/`fetchMore`, and directories are scanned in batches. A
+new template or directory is applied as row insertions and removals on the
+entries already fetched, so expanded branches and selections survive.
+"""
+import os
+
+from PyQt5.QtCore import QAbstractItemModel, QModelIndex, Qt
+from PyQt5.QtGui import QBrush, QColor, QIcon
+
+FETCH_BATCH = 256
+ICONS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "icons")
+
+def sort_key(key: tuple) -> tuple:
+    """Directories first, then case insensitive by name"""
+    file, name = key
+    return file, name.lower(), name
+
+class ConfigTreeNode:
+    __slots__ = ("name", "file", "template", "path", "parent", "row", "children", "pending", "listed")
+
+    def __init__(self, name: str, file: bool, template, path, parent):
+        self.name = name
+        self.file = file
+        # template subtree (dict|None) and path on disk (str|None) of the entry
+        self.template = template
+        self.path = path
+        self.parent = parent
+        self.row = 0
+        self.children = []
+        # listed entries not handed to the view yet
+        self.pending = []
+        self.listed = False
+
+    @property
+    def key(self) -> tuple:
+        return self.file, self.name
+
+    def renumber(self, start: int = 0) -> None:
+        for row in range(start, len(self.children)):
+            self.children[row].row = row
+
+class ConfigTreeModel(QAbstractItemModel):
+    """Single column tree of a configuration directory
+
+    Args:
+        parent (QObject, optional): owner
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.root = ConfigTreeNode("", False, None, None, None)
+        self._icons = None
+
+    # MARK: sources
+    def set_template(self, tree) -> None:
+        """Shows the directory tree of a template, see `folderTemplate.as_dict`"""
+        self.root.template = tree
+        self.refresh()
+
+    def set_directory(self, path) -> None:
+        """Merges what exists below `path` into the tree, None to show the template only"""
+        self.root.path = path if path and os.path.isdir(path) else None
+        self.refresh()
+
+    def refresh(self) -> None:
+        """Re-lists every fetched directory and applies the differences"""
+        self.sync(self.root, QModelIndex())
+
+    def entries(self, node: ConfigTreeNode) -> list:
+        """Sorted (key, template, path) of the entries below `node`"""
+        merged = {}
+        if isinstance(node.template, dict):
+            for name, subtree in node.template.items():
+                # files map to None in template trees
+                merged[(subtree is None, name)] = [subtree, None]
+        if node.path is not None:
+            try:
+                with os.scandir(node.path) as scan:
+                    for entry in scan:
+                        if entry.name.startswith("."):
+                            continue
+                        try:
+                            file = not entry.is_dir()
+                        except OSError:
+                            continue
+                        merged.setdefault((file, entry.name), [None, None])[1] = entry.path
+            except OSError:
+                pass
+        return [(key, template, path) for key, (template, path) in sorted(merged.items(), key=lambda item: sort_key(item[0]))]
+
+    def child_node(self, parent: ConfigTreeNode, entry: tuple) -> ConfigTreeNode:
+        (file, name), template, path = entry
+        return ConfigTreeNode(name, file, template, path, parent)
+
+    # MARK: diffs
+    def sync(self, node: ConfigTreeNode, index: QModelIndex) -> None:
+        if not node.listed:
+            return
+        entries = self.entries(node)
+        if node.pending:
+            # only the rows already fetched are diffed, the rest waits for fetchMore
+            last = sort_key(node.children[-1].key) if node.children else None
+            fetched = next(
+                (row for row, (key, _, _) in enumerate(entries) if last is None or sort_key(key) > last), len(entries)
+            )
+            entries, node.pending = entries[:fetched], entries[fetched:]
+        keys = {key for key, _, _ in entries}
+
+        # removals, back to front in contiguous runs
+        row = len(node.children) - 1
+        while row >= 0:
+            if node.children[row].key in keys:
+                row -= 1
+                continue
+            last = row
+            while row > 0 and node.children[row - 1].key not in keys:
+                row -= 1
+            self.beginRemoveRows(index, row, last)
+            del node.children[row:last + 1]
+            node.renumber(row)
+            self.endRemoveRows()
+            row -= 1
+
+        # insertions in contiguous runs, both lists are sorted the same way
+        existing = {child.key: child for child in node.children}
+        row = 0
+        position = 0
+        while position < len(entries):
+            child = existing.get(entries[position][0])
+            if child is not None:
+                child.template, child.path = entries[position][1], entries[position][2]
+                self.sync(child, self.index(row, 0, index))
+                row += 1
+                position += 1
+                continue
+            run = position
+            while run < len(entries) and entries[run][0] not in existing:
+                run += 1
+            self.beginInsertRows(index, row, row + run - position - 1)
+            node.children[row:row] = [self.child_node(node, entry) for entry in entries[position:run]]
+            node.renumber(row)
+            self.endInsertRows()
+            row += run - position
+            position = run
+
+    # MARK: QAbstractItemModel
+    def node(self, index: QModelIndex) -> ConfigTreeNode:
+        return index.internalPointer() if index.isValid() else self.root
+
+    def index(self, row: int, column: int, parent: QModelIndex = QModelIndex()) -> QModelIndex:
+        node = self.node(parent)
+        if column != 0 or not 0 <= row < len(node.children):
+            return QModelIndex()
+        return self.createIndex(row, column, node.children[row])
+
+    def parent(self, index: QModelIndex) -> QModelIndex:
+        if not index.isValid():
+            return QModelIndex()
+        parent = index.internalPointer().parent
+        if parent is None or parent is self.root:
+            return QModelIndex()
+        return self.createIndex(parent.row, 0, parent)
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return len(self.node(parent).children)
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 1
+
+    def hasChildren(self, parent: QModelIndex = QModelIndex()) -> bool:
+        node = self.node(parent)
+        if node.file:
+            return False
+        return not node.listed or bool(node.children) or bool(node.pending)
+
+    def canFetchMore(self, parent: QModelIndex) -> bool:
+        node = self.node(parent)
+        return not node.file and (not node.listed or bool(node.pending))
+
+    def fetchMore(self, parent: QModelIndex) -> None:
+        node = self.node(parent)
+        if not node.listed:
+            node.pending = self.entries(node)
+            node.listed = True
+        batch, node.pending = node.pending[:FETCH_BATCH], node.pending[FETCH_BATCH:]
+        if not batch:
+            return
+        start = len(node.children)
+        self.beginInsertRows(parent, start, start + len(batch) - 1)
+        node.children.extend(self.child_node(node, entry) for entry in batch)
+        node.renumber(start)
+        self.endInsertRows()
+
+    def icon(self, file: bool) -> QIcon:
+        # built on first use, QIcon needs a running QApplication
+        if self._icons is None:
+            self._icons = (
+                QIcon(os.path.join(ICONS_PATH, "folder.png")),
+                QIcon(os.path.join(ICONS_PATH, "nix.png")),
+            )
+        return self._icons[file]
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        node = index.internalPointer()
+        if role == Qt.DisplayRole:
+            return node.name
+        if role == Qt.DecorationRole:
+            if node.file and not node.name.endswith(".nix"):
+                return None
+            return self.icon(node.file)
+        if role == Qt.ToolTipRole:
+            return node.path or "created with the configuration"
+        if role == Qt.ForegroundRole and node.path is None:
+            # not on disk yet
+            return QBrush(QColor(Qt.gray))
+        if role == Qt.UserRole:
+            return node.path
+        return None
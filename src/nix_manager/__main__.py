@@ -16,3 +16,222 @@
 # You should have received a copy of the GNU General Public License                     #
 # along with GNix.  If not, see <https://www.gnu.org/licenses/>.                        #
 #########################################################################################
+"""Headless command line interface, `python -m src.nix_manager <command> ...`
+
+Every positional target (a configuration directory, a file or a scaffold
+destination) is processed independently on a process pool and every result
+is written to stdout as one JSON object per line. Nothing here imports Qt,
+and the parser and templates are only imported by the worker processes,
+except for `query` selectors, which are compiled once up front.
+"""
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+def nix_files(path: str) -> list:
+    """`path` if it is a file, otherwise every non-hidden .nix file below it"""
+    if not os.path.isdir(path):
+        return [path]
+    found = []
+    for current, subdirectories, names in os.walk(path):
+        subdirectories[:] = sorted(name for name in subdirectories if not name.startswith("."))
+        found.extend(os.path.join(current, name) for name in sorted(names) if name.endswith(".nix") and not name.startswith("."))
+    return found
+
+def parse_target(target: str):
+    """(path, ParseResult) of every Nix file of a target"""
+    from nix_parser import parse_nix_many
+
+    paths = [os.path.abspath(path) for path in nix_files(target)]
+    return zip(paths, parse_nix_many(paths, lazy=True))
+
+def parse_target_sources(target: str):
+    """(path, bytes, ParseResult) of every readable Nix file of a target and
+    (path, error) of the others. Every file is read once, the bytes parsed are
+    the bytes returned"""
+    from nix_parser import parse_nix_sources
+
+    sources, unreadable = [], []
+    for path in nix_files(target):
+        path = os.path.abspath(path)
+        try:
+            with open(path, "rb") as f:
+                sources.append((path, f.read()))
+        except OSError as error:
+            unreadable.append((path, str(error)))
+    parsed = [(path, data, result) for (path, data), result in zip(sources, parse_nix_sources(sources, lazy=True))]
+    return parsed, unreadable
+
+# MARK: commands
+def scan(target: str, options: dict) -> list:
+    from .dependencies import file_imports
+
+    records = []
+    for path, result in parse_target(target):
+        record = {"command": "scan", "target": target, "path": path, "ok": result.ast is not None}
+        if result.ast is None:
+            record["error"] = result.error
+        else:
+            record["imports"] = sorted(file_imports(path, result.ast))
+        records.append(record)
+    return records
+
+def query(target: str, options: dict) -> list:
+    from .nix_edit import nixDocument
+
+    # compiled by `main`
+    selector = options["selector"]
+    parsed, unreadable = parse_target_sources(target)
+    records = [
+        {"command": "query", "target": target, "path": path, "ok": False, "error": error}
+        for path, error in unreadable
+    ]
+    for path, data, result in parsed:
+        if result.ast is None:
+            records.append({"command": "query", "target": target, "path": path, "ok": False, "error": result.error})
+            continue
+        matches = selector.run(result.ast)
+        # the tree is the one just parsed from these bytes, spans index into them
+        document = nixDocument(data.decode(), tree=result.ast) if matches else None
+        for match in matches:
+            records.append({
+                "command": "query",
+                "target": target,
+                "path": path,
+                "ok": True,
+                "attribute": match.path,
+                "line": match.span.start.line,
+                "column": match.span.start.column,
+                "end_line": match.span.end.line,
+                "end_column": match.span.end.column,
+                "text": document.text(match.node),
+            })
+    return records
+
+def scaffold(target: str, options: dict) -> list:
+    from .scaffold import scaffolder
+
+    # `DEST=host1,host2` scaffolds DEST for those hosts
+    destination, _, hosts = target.partition("=")
+    hosts = hosts.split(",") if hosts else options["hosts"]
+    path = scaffolder(
+        options["template"],
+        hosts=hosts,
+        users=options["users"],
+        configuration=options["configuration"],
+        hardware_configuration=options["hardware_configuration"],
+    ).create(destination)
+    return [{"command": "scaffold", "target": target, "path": path, "ok": True}]
+
+def edit(target: str, options: dict) -> list:
+    from .nix_edit import nixDocument
+
+    path = os.path.abspath(target)
+    document = nixDocument.from_file(path)
+    original = document.data
+    removed = 0
+    for operation, argument in options["operations"]:
+        attribute, _, value = argument.partition("=")
+        if operation == "set":
+            document.set_attribute(attribute, value)
+        elif operation == "unset":
+            document.remove_attribute(attribute)
+        elif operation == "add":
+            document.add_list_items(attribute, [value])
+        elif operation == "remove":
+            removed += document.remove_list_items(attribute, [value])
+    changed = document.data != original
+    if changed and not options["dry_run"]:
+        document.write(path)
+    record = {"command": "edit", "target": target, "path": path, "ok": True, "changed": changed}
+    if removed:
+        record["removed"] = removed
+    return [record]
+
+COMMANDS = {
+    "scan": scan,
+    "query": query,
+    "scaffold": scaffold,
+    "edit": edit,
+}
+
+def run(command: str, target: str, options: dict) -> list:
+    """Runs one command on one target, failures become an error record"""
+    try:
+        return COMMANDS[command](target, options)
+    except Exception as e:
+        return [{"command": command, "target": target, "ok": False, "error": f"{type(e).__name__}: {e}"}]
+
+# MARK: arguments
+class appendOperation(argparse.Action):
+    """Collects --set/--unset/--add/--remove in command line order"""
+    def __call__(self, parser, namespace, values, option_string=None):
+        operations = getattr(namespace, self.dest) or []
+        operations.append((option_string.lstrip("-"), values))
+        setattr(namespace, self.dest, operations)
+
+def argument_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m src.nix_manager", description="GNix without the GUI, results are printed as JSON Lines")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="worker processes (default: CPU count)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    scan_parser = commands.add_parser("scan", help="parse configurations and list each file's imports")
+    scan_parser.add_argument("targets", nargs="+", metavar="PATH", help="configuration directory or .nix file")
+
+    query_parser = commands.add_parser("query", help="find attributes matching a selector")
+    query_parser.add_argument("selector", help='selector, e.g. "**.programs.*.enable = true"')
+    query_parser.add_argument("targets", nargs="+", metavar="PATH", help="configuration directory or .nix file")
+
+    scaffold_parser = commands.add_parser("scaffold", help="create configurations from a folder template")
+    scaffold_parser.add_argument("targets", nargs="+", metavar="DEST[=HOST,...]", help="new configuration directory, optionally with its hosts")
+    scaffold_parser.add_argument("-t", "--template", default="default", help="template key or name")
+    scaffold_parser.add_argument("--host", dest="hosts", action="append", help="host name, repeatable (default: this machine)")
+    scaffold_parser.add_argument("--user", dest="users", action="append", help="user name, repeatable")
+    scaffold_parser.add_argument("--configuration", help="file copied into every host's configuration.nix")
+    scaffold_parser.add_argument("--hardware-configuration", help="file copied into every host's hardware-configuration.nix")
+
+    edit_parser = commands.add_parser("edit", help="edit Nix files in place, preserving formatting")
+    edit_parser.add_argument("targets", nargs="+", metavar="FILE", help=".nix file")
+    edit_parser.add_argument("--set", dest="operations", action=appendOperation, metavar="ATTR=EXPR", help="bind an attribute")
+    edit_parser.add_argument("--unset", dest="operations", action=appendOperation, metavar="ATTR", help="delete an attribute")
+    edit_parser.add_argument("--add", dest="operations", action=appendOperation, metavar="ATTR=EXPR", help="append to a list")
+    edit_parser.add_argument("--remove", dest="operations", action=appendOperation, metavar="ATTR=EXPR", help="remove from a list")
+    edit_parser.add_argument("-n", "--dry-run", action="store_true", help="report changes without writing")
+    return parser
+
+def main(argv: list = None) -> int:
+    args = argument_parser().parse_args(argv)
+    options = vars(args)
+    command, targets = options.pop("command"), options.pop("targets")
+    if command == "edit" and not options["operations"]:
+        argument_parser().error("edit needs at least one of --set, --unset, --add, --remove")
+    if command == "query":
+        from nix_parser import Query
+        try:
+            options["selector"] = Query(options["selector"])
+        except ValueError as e:
+            argument_parser().error(f"invalid selector: {e}")
+
+    jobs = max(1, min(options.pop("jobs"), len(targets)))
+    failed = False
+
+    def emit(records):
+        nonlocal failed
+        for record in records:
+            failed = failed or not record["ok"]
+            sys.stdout.write(json.dumps(record) + "\n")
+        sys.stdout.flush()
+
+    if jobs == 1:
+        for target in targets:
+            emit(run(command, target, options))
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            for records in pool.map(run, [command] * len(targets), targets, [options] * len(targets)):
+                emit(records)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
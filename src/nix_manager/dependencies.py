@@ -0,0 +1,304 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of GNix.
+#########################################################################################
+# GNix - The Graphical Nix Project                                                      #
+#---------------------------------------------------------------------------------------#
+# GNix is free software: you can redistribute it and/or modify                          #
+# it under the terms of the GNU General Public License as published by                  #
+# the Free Software Foundation, either version 3 of the License, or any later version.  #
+#                                                                                       #
+# GNix is distributed in the hope that it will be useful,                               #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of                        #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the                         #
+# GNU General Public License for more details.                                          #
+#                                                                                       #
+# You should have received a copy of the GNU General Public License                     #
+# along with GNix.  If not, see <https://www.gnu.org/licenses/>.                        #
+#########################################################################################
+"""Which Nix files import which, across a configuration.
+
+Edges come from path literals in `imports = [ ... ]` lists and in the
+`modules = [ ... ]` of flakes, resolved relative to the importing file, with
+directories resolving to their `default.nix`. The edges of every file are
+cached on disk keyed by the file's mtime and size, so building the graph of
+an unchanged configuration parses nothing. Reverse queries walk an in-memory
+reverse edge map and are memoised until the graph changes.
+"""
+import os
+import pickle
+import threading
+from collections import deque
+
+from nix_parser import Query
+
+from .parse_cache import CACHE_HOME, PARSE_CACHE
+from .profiling import traced
+
+CACHE_PATH = os.path.join(CACHE_HOME, "gnix", "dependencies.pickle")
+# bump when the way edges are extracted changes
+CACHE_VERSION = 1
+
+IMPORT_QUERIES = (Query("**.imports"), Query("**.modules"))
+
+def path_literal(node):
+    """Text of a path literal without interpolations, e.g. `./foo.nix`, else None"""
+    if node.kind != "Path":
+        return None
+    parts = node["parts"]
+    if not all(part.kind == "Raw" for part in parts):
+        return None
+    return "".join(part.text for part in parts)
+
+def imported_literal(element):
+    """The file a list element imports: `./foo.nix` or `import ./foo.nix ...`.
+    Inline modules and anything else are not imports, their own path literals
+    (`configFile = ./x.conf`) are data"""
+    literal = path_literal(element)
+    if literal is not None:
+        return literal
+    if element.kind == "FunctionApplication":
+        function, arguments = element["function"], element["arguments"]
+        if function.kind == "Identifier" and function.text == "import" and arguments:
+            return path_literal(arguments[0])
+    return None
+
+def import_literals(value) -> list:
+    """Path literals imported by the value of an `imports`/`modules` binding,
+    a list, lists joined with `++`, or a single path"""
+    if value.kind == "List":
+        literals = (imported_literal(element) for element in value["elements"])
+        return [literal for literal in literals if literal is not None]
+    if value.kind == "BinaryOperation" and value["operator"] == "Concatenation":
+        return import_literals(value["left"]) + import_literals(value["right"])
+    literal = imported_literal(value)
+    return [literal] if literal is not None else []
+
+def resolve(path: str, literal: str) -> str:
+    """Absolute path a literal in the file `path` refers to. Only literals not
+    ending in `.nix` are checked for being a directory"""
+    literal = os.path.expanduser(literal)
+    resolved = os.path.normpath(os.path.join(os.path.dirname(path), literal))
+    if not resolved.endswith(".nix") and os.path.isdir(resolved):
+        resolved = os.path.join(resolved, "default.nix")
+    return resolved
+
+def file_imports(path: str, tree) -> frozenset:
+    """Files imported by the file `path` parsed into `tree`, directories already
+    resolved to their `default.nix`"""
+    literals = set()
+    for query in IMPORT_QUERIES:
+        for match in query.run(tree):
+            binding = match.node
+            if binding.kind != "KeyValue":
+                continue
+            literals.update(import_literals(binding["to"]))
+    return frozenset(resolve(path, literal) for literal in literals)
+
+def stamp(path: str):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+class dependencyGraph:
+    """Import graph of a set of Nix files
+
+    Args:
+        cache_path (str, optional): pickle holding the edges of every file seen, None disables it
+    """
+    def __init__(self, cache_path: str = CACHE_PATH):
+        self.cache_path = cache_path
+        # file -> files it imports, and the reverse
+        self.imports = {}
+        self.importers = {}
+        self._stamps = {}
+        self._memo = {}
+        # the watcher thread updates the graph while the GUI queries it
+        self._lock = threading.RLock()
+        self._cache = self.read_cache()
+
+    # MARK: building
+    @traced("dependency graph build", "parse")
+    def build(self, paths: list) -> "dependencyGraph":
+        """Adds `paths` and every file they import, transitively. Files with
+        cached edges are not parsed, the others are parsed in parallel"""
+        frontier = {os.path.abspath(path) for path in paths}
+        while frontier:
+            to_parse = []
+            for path in frontier:
+                current = stamp(path)
+                cached = self._cache.get(path)
+                if current is None:
+                    self.set_imports(path, frozenset(), None)
+                elif cached is not None and cached[0] == current:
+                    self.set_imports(path, cached[1], current)
+                else:
+                    to_parse.append(path)
+            trees = PARSE_CACHE.parse_files(to_parse)
+            for path in to_parse:
+                tree = trees.get(path)
+                self.set_imports(path, file_imports(path, tree) if tree is not None else frozenset(), stamp(path))
+            frontier = {
+                imported
+                for path in frontier
+                for imported in self.imports.get(path, ())
+                if imported not in self.imports
+            }
+        self.write_cache()
+        return self
+
+    @traced("dependency graph update", "parse")
+    def update(self, path: str, tree=None) -> bool:
+        """Recomputes the edges of one file, after it changed
+
+        Args:
+            path (str): the file
+            tree (LazyNode, optional): its tree, parsed through the parse cache if not given
+
+        Returns:
+            bool: whether the edges of `path` changed
+        """
+        path = os.path.abspath(path)
+        if tree is None and os.path.isfile(path):
+            tree = PARSE_CACHE.parse_files([path]).get(path)
+        imports = file_imports(path, tree) if tree is not None else frozenset()
+        changed = self.imports.get(path) != imports
+        self.set_imports(path, imports, stamp(path))
+        new_files = [imported for imported in imports if imported not in self.imports]
+        if new_files:
+            self.build(new_files)
+        else:
+            self.write_cache()
+        return changed
+
+    def remove(self, path: str) -> None:
+        """Drops the outgoing edges of a deleted file, files importing it keep their edge"""
+        path = os.path.abspath(path)
+        self.set_imports(path, frozenset(), None)
+        self.write_cache()
+
+    def apply_changes(self, changed: list, removed: list, index=None) -> None:
+        """Updates the graph from a `configWatcher` change notification
+
+        Args:
+            changed (list): files that changed
+            removed (list): files that were deleted
+            index (configIndex, optional): index holding the new trees
+        """
+        for path in changed:
+            self.update(path, index.tree(path) if index is not None else None)
+        for path in removed:
+            self.remove(path)
+
+    def set_imports(self, path: str, imports: frozenset, file_stamp) -> None:
+        with self._lock:
+            self._set_imports(path, imports, file_stamp)
+
+    def _set_imports(self, path: str, imports: frozenset, file_stamp) -> None:
+        old = self.imports.get(path, frozenset())
+        for imported in old - imports:
+            importers = self.importers.get(imported)
+            if importers is not None:
+                importers.discard(path)
+        for imported in imports - old:
+            self.importers.setdefault(imported, set()).add(path)
+        self.imports[path] = imports
+        if file_stamp is not None:
+            self._cache[path] = (file_stamp, imports)
+        else:
+            self._cache.pop(path, None)
+        if old != imports or path not in self._stamps:
+            self._memo.clear()
+        self._stamps[path] = file_stamp
+
+    # MARK: queries
+    def _closure(self, path: str, edges: dict, kind: str) -> frozenset:
+        key = (kind, path)
+        # `_set_imports` clears the memo from the watcher thread
+        with self._lock:
+            result = self._memo.get(key)
+            if result is None:
+                result = self._walk(path, edges, key)
+            return result
+
+    def _walk(self, path: str, edges: dict, key: tuple) -> frozenset:
+        seen = set()
+        queue = deque(edges.get(path, ()))
+        while queue:
+            current = queue.popleft()
+            if current in seen:
+                continue
+            seen.add(current)
+            queue.extend(edges.get(current, ()))
+        seen.discard(path)
+        result = frozenset(seen)
+        self._memo[key] = result
+        return result
+
+    def dependencies(self, path: str, transitive: bool = True) -> frozenset:
+        """Files `path` imports, directly or through other files"""
+        path = os.path.abspath(path)
+        if not transitive:
+            with self._lock:
+                return frozenset(self.imports.get(path, ()))
+        return self._closure(path, self.imports, "dependencies")
+
+    def dependents(self, path: str, transitive: bool = True) -> frozenset:
+        """Files importing `path`, directly or through other files"""
+        path = os.path.abspath(path)
+        if not transitive:
+            with self._lock:
+                return frozenset(self.importers.get(path, ()))
+        return self._closure(path, self.importers, "dependents")
+
+    def roots(self) -> list:
+        """Files nothing imports, i.e. flakes and host configurations"""
+        with self._lock:
+            return sorted(path for path in self.imports if not self.importers.get(path))
+
+    def affected_roots(self, path: str) -> list:
+        """Roots that depend on `path`, e.g. the hosts affected by editing a module"""
+        path = os.path.abspath(path)
+        dependents = self.dependents(path)
+        if not dependents:
+            return [path] if path in self.imports else []
+        with self._lock:
+            return sorted(dependent for dependent in dependents if not self.importers.get(dependent))
+
+    def missing(self) -> list:
+        """(importer, file) of every import of a file that does not exist"""
+        with self._lock:
+            edges = [(path, imported) for path, imports in self.imports.items() for imported in imports]
+        return sorted(edge for edge in edges if not os.path.isfile(edge[1]))
+
+    # MARK: cache
+    def read_cache(self) -> dict:
+        if self.cache_path is None:
+            return {}
+        try:
+            with open(self.cache_path, "rb") as f:
+                version, entries = pickle.load(f)
+        except (OSError, pickle.PickleError, EOFError, ValueError, TypeError):
+            return {}
+        return entries if version == CACHE_VERSION else {}
+
+    def write_cache(self) -> None:
+        if self.cache_path is None:
+            return
+        # the watcher thread and the GUI both write the cache
+        tmp_path = f"{self.cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            with self._lock:
+                entries = dict(self._cache)
+            with open(tmp_path, "wb") as f:
+                pickle.dump((CACHE_VERSION, entries), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.cache_path)
+        except OSError:
+            # the cache is an optimisation, a read only home is not an error
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
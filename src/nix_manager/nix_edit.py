@@ -0,0 +1,266 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of GNix.
+#########################################################################################
+# GNix - The Graphical Nix Project                                                      #
+#---------------------------------------------------------------------------------------#
+# GNix is free software: you can redistribute it and/or modify                          #
+# it under the terms of the GNU General Public License as published by                  #
+# the Free Software Foundation, either version 3 of the License, or any later version.  #
+#                                                                                       #
+# GNix is distributed in the hope that it will be useful,                               #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of                        #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the                         #
+# GNU General Public License for more details.                                          #
+#                                                                                       #
+# You should have received a copy of the GNU General Public License                     #
+# along with GNix.  If not, see <https://www.gnu.org/licenses/>.                        #
+#########################################################################################
+"""Programmatic edits of Nix files as byte-range patches.
+
+Edits never re-print a file: the spans of the parsed tree locate the text to
+replace and only those bytes change, so formatting and comments elsewhere are
+kept as they are. After every patch the tree is brought up to date with
+`reparse_nix`, which only parses the top-level bindings the patch touched.
+"""
+import os
+import re
+import threading
+from typing import List, NamedTuple
+
+from nix_parser import find_definitions, parse_nix, reparse_nix
+
+from .nix_syntax import attr_name, join_path, split_path, to_nix
+from .profiling import traced
+
+WHITESPACE = b" \t"
+
+class nixEdit(NamedTuple):
+    """Replace the UTF-8 bytes `start:end` of a script with `text`"""
+    start: int
+    end: int
+    text: str
+
+class nixDocument:
+    """A Nix script together with its lazy tree, edited in place.
+
+    Values passed to the edit methods are Nix source, use `to_nix` to write
+    Python values. Attribute paths are dotted, e.g. `services.openssh.enable`,
+    with segments that are not identifiers quoted, e.g. `networking.hosts."127.0.0.1"`.
+    """
+    def __init__(self, script: str, tree=None):
+        self.script = script
+        self.tree = tree if tree is not None else parse_nix(script, lazy=True)
+        self.data = script.encode()
+        self._line_starts = None
+
+    @classmethod
+    def from_file(cls, path: str) -> "nixDocument":
+        # newline="" keeps CRLF files byte for byte
+        with open(path, encoding="utf-8", newline="") as f:
+            return cls(f.read())
+
+    @traced("write file", "filesystem")
+    def write(self, path: str) -> None:
+        """Writes the script to `path` atomically. A symlink is followed and its
+        target replaced, and the mode and owner of an existing file are kept"""
+        path = os.path.realpath(path)
+        directory, name = os.path.split(path)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            stat = None
+        tmp_path = os.path.join(directory, f".{name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        try:
+            with open(fd, "wb") as f:
+                f.write(self.data)
+                if stat is not None:
+                    os.fchmod(f.fileno(), stat.st_mode & 0o7777)
+                    try:
+                        os.fchown(f.fileno(), stat.st_uid, stat.st_gid)
+                    except PermissionError:
+                        # only root can give the file away, it stays ours
+                        pass
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    # MARK: positions
+    def offset(self, position) -> int:
+        """Byte offset of a parser `Position`, lines and columns are 1-based
+        and columns count bytes, as everywhere in nix_parser"""
+        if self._line_starts is None:
+            self._line_starts = [0] + [match.end() for match in re.finditer(b"\n", self.data)]
+        return self._line_starts[position.line - 1] + position.column - 1
+
+    def span_range(self, node) -> tuple:
+        """(start, end) byte range of an expression, or of a binding from its
+        first attribute name to the end of its value"""
+        if node.kind == "KeyValue":
+            return self.offset(node["from"][0].span.start), self.offset(node["to"].span.end)
+        return self.offset(node.span.start), self.offset(node.span.end)
+
+    def text(self, node) -> str:
+        start, end = self.span_range(node)
+        return self.data[start:end].decode()
+
+    def indent(self, offset: int) -> str:
+        """Leading whitespace of the line containing `offset`"""
+        line_start = self.data.rfind(b"\n", 0, offset) + 1
+        line_end = line_start
+        while line_end < len(self.data) and self.data[line_end] in WHITESPACE:
+            line_end += 1
+        return self.data[line_start:line_end].decode()
+
+    # MARK: patches
+    @traced("apply edit", "edit")
+    def apply(self, edit: nixEdit) -> None:
+        """Patches the script and updates the tree incrementally"""
+        if not 0 <= edit.start <= edit.end <= len(self.data):
+            raise ValueError(f"edit {edit.start}:{edit.end} is outside the script")
+        self.tree = reparse_nix(self.tree, self.script, edit.start, edit.end, edit.text)
+        self.data = self.data[:edit.start] + edit.text.encode() + self.data[edit.end:]
+        self.script = self.data.decode()
+        self._line_starts = None
+
+    def removal(self, start: int, end: int) -> nixEdit:
+        """Edit deleting `start:end` together with the whitespace around it:
+        the whole line if nothing else is on it, otherwise the blanks before it"""
+        data = self.data
+        line_start = data.rfind(b"\n", 0, start) + 1
+        line_end = data.find(b"\n", end)
+        if line_end == -1:
+            line_end = len(data)
+        if not data[line_start:start].strip() and not data[end:line_end].strip():
+            return nixEdit(line_start, min(line_end + 1, len(data)), "")
+        blank_start = start
+        while blank_start > line_start and data[blank_start - 1] in WHITESPACE:
+            blank_start -= 1
+        if blank_start > line_start:
+            return nixEdit(blank_start, end, "")
+        blank_end = end
+        while blank_end < line_end and data[blank_end] in WHITESPACE:
+            blank_end += 1
+        return nixEdit(start, blank_end, "")
+
+    def insertion(self, container, last_child, text: str, close: bytes) -> nixEdit:
+        """Edit adding `text` as the last entry of a `{ }` or `[ ]` container.
+        Multi-line containers get a new line indented like their last entry,
+        single line containers get the text before the closing bracket"""
+        start, end = self.span_range(container)
+        close_at = end - 1
+        if self.data[close_at:end] != close:
+            raise ValueError(f"expected {close.decode()} at byte {close_at}")
+        line_start = self.data.rfind(b"\n", 0, close_at) + 1
+        if line_start > start and not self.data[line_start:close_at].strip():
+            if last_child is None:
+                indent = self.indent(close_at) + "  "
+            else:
+                indent = self.indent(self.span_range(last_child)[0])
+            return nixEdit(line_start, line_start, f"{indent}{text}\n")
+        if self.data[close_at - 1] in WHITESPACE:
+            return nixEdit(close_at, close_at, f"{text} ")
+        return nixEdit(close_at, close_at, f" {text}")
+
+    # MARK: lookups
+    def config_map(self):
+        """The attribute set a module evaluates to, below `{ ... }:`, `let`, `with` and `assert`"""
+        node = self.tree
+        while node.kind in ("Function", "LetIn", "With", "Assert"):
+            node = node["body"] if node.kind == "Function" else node["target"]
+        if node.kind != "Map":
+            raise ValueError("the script is not an attribute set")
+        return node
+
+    @traced("key_values", "lookup")
+    def key_values(self, path: str) -> list:
+        """`KeyValue` bindings defining exactly `path`"""
+        # the index spells each path one way, `a."b"` is found as `a.b`
+        path = join_path(split_path(path))
+        return [binding for binding in find_definitions(self.tree, path) if binding.kind == "KeyValue"]
+
+    def value(self, path: str):
+        """Value bound to `path`, below `with`/`let`/`assert`, None if `path` is not defined"""
+        for binding in self.key_values(path):
+            node = binding["to"]
+            while node.kind in ("LetIn", "With", "Assert"):
+                node = node["target"]
+            return node
+        return None
+
+    # MARK: attribute sets
+    def set_attribute(self, path: str, value: str) -> None:
+        """Binds `path` to the Nix expression `value`. An existing definition has
+        its value replaced, otherwise the binding is added to the innermost
+        attribute set already defining a prefix of `path`"""
+        bindings = self.key_values(path)
+        if bindings:
+            start, end = self.span_range(bindings[0]["to"])
+            self.apply(nixEdit(start, end, value))
+            return
+        segments = split_path(path)
+        target, rest = self.config_map(), segments
+        for i in range(len(segments) - 1, 0, -1):
+            maps = [binding["to"] for binding in self.key_values(join_path(segments[:i])) if binding["to"].kind == "Map"]
+            if maps:
+                target, rest = maps[0], segments[i:]
+                break
+        bindings = target["bindings"]
+        text = ".".join(attr_name(segment) for segment in rest) + f" = {value};"
+        self.apply(self.insertion(target, bindings[-1] if bindings else None, text, b"}"))
+
+    def remove_attribute(self, path: str) -> None:
+        """Deletes every binding of exactly `path`, including its `;`
+
+        Raises:
+            KeyError: `path` is not defined
+        """
+        bindings = self.key_values(path)
+        if not bindings:
+            raise KeyError(path)
+        # last first, so earlier offsets stay valid
+        ranges = sorted((self.span_range(binding) for binding in bindings), reverse=True)
+        for start, end in ranges:
+            semicolon = end
+            while semicolon < len(self.data) and self.data[semicolon] in WHITESPACE:
+                semicolon += 1
+            if self.data[semicolon:semicolon + 1] == b";":
+                end = semicolon + 1
+            self.apply(self.removal(start, end))
+
+    # MARK: lists
+    def list_at(self, path: str):
+        node = self.value(path)
+        if node is None:
+            raise KeyError(path)
+        if node.kind != "List":
+            raise ValueError(f"{path} is not a list")
+        return node
+
+    def add_list_items(self, path: str, items: List[str]) -> None:
+        """Appends the Nix expressions `items` to the list bound to `path`, e.g.
+        `add_list_items("environment.systemPackages", ["htop"])`"""
+        for item in items:
+            node = self.list_at(path)
+            elements = node["elements"]
+            self.apply(self.insertion(node, elements[-1] if elements else None, item, b"]"))
+
+    def remove_list_items(self, path: str, items: List[str]) -> int:
+        """Removes every element of the list bound to `path` whose source is one
+        of `items`, returns how many were removed"""
+        removed = 0
+        for item in items:
+            while True:
+                matches = [element for element in self.list_at(path)["elements"] if self.text(element) == item]
+                if not matches:
+                    break
+                self.apply(self.removal(*self.span_range(matches[-1])))
+                removed += 1
+        return removed
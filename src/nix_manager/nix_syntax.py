@@ -0,0 +1,98 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of GNix.
+#########################################################################################
+# GNix - The Graphical Nix Project                                                      #
+#---------------------------------------------------------------------------------------#
+# GNix is free software: you can redistribute it and/or modify                          #
+# it under the terms of the GNU General Public License as published by                  #
+# the Free Software Foundation, either version 3 of the License, or any later version.  #
+#                                                                                       #
+# GNix is distributed in the hope that it will be useful,                               #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of                        #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the                         #
+# GNU General Public License for more details.                                          #
+#                                                                                       #
+# You should have received a copy of the GNU General Public License                     #
+# along with GNix.  If not, see <https://www.gnu.org/licenses/>.                        #
+#########################################################################################
+"""Nix source of Python values and dotted attribute paths.
+
+Nothing here needs the `nix_parser` extension. Paths follow the rules of its
+attribute index: segments are separated by `.`, and segments that are not
+plain identifiers are double quoted with `"` and `\\` escaped, so
+`networking."a.b"` and `networking.a.b` are different paths.
+"""
+import re
+from typing import List
+
+IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_'-]*")
+
+def attr_name(name: str) -> str:
+    """Nix source of one attribute name, quoted if it is not a plain identifier"""
+    if IDENTIFIER.fullmatch(name):
+        return name
+    return to_nix(name)
+
+def to_nix(value) -> str:
+    """Serialises a Python value into Nix source
+
+    Args:
+        value: bool, None, int, float, str, list or dict with str keys
+
+    Returns:
+        str: Nix expression, lists and attribute sets are written on one line
+
+    Raises:
+        TypeError: `value` has no Nix equivalent
+    """
+    if value is True:
+        return "true"
+    if value is False:
+        return "false"
+    if value is None:
+        return "null"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, str):
+        escaped = (
+            value.replace("\\", "\\\\")
+            .replace('"', '\\"')
+            .replace("${", "\\${")
+            .replace("\n", "\\n")
+            .replace("\t", "\\t")
+        )
+        return f'"{escaped}"'
+    if isinstance(value, (list, tuple)):
+        return "[ " + "".join(f"{to_nix(item)} " for item in value) + "]"
+    if isinstance(value, dict):
+        return "{ " + "".join(f"{attr_name(key)} = {to_nix(item)}; " for key, item in value.items()) + "}"
+    raise TypeError(f"cannot convert {type(value).__name__} to Nix")
+
+# MARK: attribute paths
+def split_path(path: str) -> List[str]:
+    """Segments of a dotted attribute path, `a."b.c"` is `["a", "b.c"]`"""
+    segments, segment = [], []
+    quoted = escaped = False
+    for c in path:
+        if escaped:
+            segment.append(c)
+            escaped = False
+        elif c == "\\" and quoted:
+            escaped = True
+        elif c == '"':
+            quoted = not quoted
+        elif c == "." and not quoted:
+            segments.append("".join(segment))
+            segment = []
+        else:
+            segment.append(c)
+    segments.append("".join(segment))
+    return segments
+
+def join_path(segments: List[str]) -> str:
+    """Dotted attribute path of `segments`, as the attribute index writes it"""
+    return ".".join(
+        segment if IDENTIFIER.fullmatch(segment) else '"' + segment.replace("\\", "\\\\").replace('"', '\\"') + '"'
+        for segment in segments
+    )
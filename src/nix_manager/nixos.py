@@ -19,11 +19,15 @@
 
 # from nix_parser import parse
 from typing import List
-from subprocess import run, CalledProcessError
 import os
-import yaml
 
-from nix_parser import parse_nix, find_key_pair
+from .dependencies import dependencyGraph
+from .nix_edit import nixDocument
+from .nixos_folder_templates.templates import TEMPLATES, folderTemplate
+from .parse_cache import PARSE_CACHE
+from .profiling import traced
+from .scaffold import scaffolder
+from .watcher import configIndex, configWatcher
 
 {
     "configurationName": "name",
@@ -49,20 +53,32 @@ from nix_parser import parse_nix, find_key_pair
     ]
 }
 
-def nixos_config_init(path: str):
-    BASH_PATH = "src/nix_manager/bash/nix_config_init.sh"
-    try:
-        run([BASH_PATH, path])
-    except CalledProcessError as e:
-        print("Script failed with error ", e)
+def nixos_config_init(path: str, template: str = "default", **kwargs) -> str:
+    """Creates a new configuration directory at `path`, see `scaffolder` for `kwargs`
+
+    Returns:
+        str: absolute path of the new configuration
+    """
+    return scaffolder(template, **kwargs).create(path)
 
 FOLDER_TEMPLATES_PATH = "src/nix_manager/nixos_folder_templates"
 TEMPLATES_PATH = "templates"
 
 class nixFile(dict):
+    """A parsed nix file.
+
+    `parsed` is a `nix_parser.LazyNode`, not the dict `parse_nix` used to
+    return. It has the dict's fields without the kind level (`parsed["bindings"]`
+    for `ast["Map"]["bindings"]`, the kind is `parsed.kind`), call
+    `parsed.to_dict()` where the plain dict is needed.
+    """
     def __init__(self, script, locate_modules=False):
         self.script = script
-        self.parsed = parse_nix(script)
+        self.parsed = PARSE_CACHE.parse(script)
+
+    def edit(self) -> nixDocument:
+        """Returns an editable copy of the file, see `nixDocument`"""
+        return nixDocument(self.script, self.parsed)
 
 class nixosConfigDirectory:
     flakes: bool = False
@@ -71,34 +87,82 @@ class nixosConfigDirectory:
     path: str = ""
     
     # hashmap of folder_template
-    folder_tree: dict = {}
+    folder_tree: folderTemplate = None
     existing_config_files: list = []
     
+    @traced("load config directory", "filesystem")
     def __init__(self):
-        with open(FOLDER_TEMPLATES_PATH + "/default.yaml") as f:
-            self.folder_tree = yaml.load(f, Loader=yaml.Loader)   
+        self.folder_tree = TEMPLATES["default"]
 
+        self.existing_config_files = []
         if os.path.isfile("/etc/nixos/hardware-configuration.nix"):
             self.existing_config_files.append("/etc/nixos/hardware-configuration.nix")
-            with open("/etc/nixos/hardware-configuration.nix") as f:
-                pass
 
         if os.path.isfile("/etc/nixos/configuration.nix"):
             self.existing_config_files.append("/etc/nixos/configuration.nix")
-            with open("/etc/nixos/configuration.nix") as f:
-                pass
+
+        # path -> LazyNode, unchanged files are loaded from the on-disk parse cache
+        self.parsed_config_files = PARSE_CACHE.parse_files(self.existing_config_files)
+        self.index = configIndex()
+        self.index.update(self.parsed_config_files)
+        self.watcher = None
+        self.graph = None
     
     def folder_structure(self, name):
-        if os.path.isfile(FOLDER_TEMPLATES_PATH + f"/{name}.yaml"):
-            with open(FOLDER_TEMPLATES_PATH + f"/{name}.yaml") as f:
-                self.folder_tree = yaml.load(f, Loader=yaml.Loader)
+        if name in TEMPLATES:
+            self.folder_tree = TEMPLATES[name]
 
+    @traced("add_file", "filesystem")
     def add_file(self, path, locate_modules=True):
-        if os.path.isfile(path):
-            script = nixFile(script, locate_modules=True)
-             
-        
-        
-
-            
-            
\ No newline at end of file
+        path = os.path.abspath(path)
+        if not os.path.isfile(path):
+            return
+        with open(path, encoding="utf-8") as f:
+            script = f.read()
+        if path not in self.existing_config_files:
+            self.existing_config_files.append(path)
+        self.parsed_config_files[path] = nixFile(script, locate_modules=locate_modules).parsed
+        self.index.update({path: self.parsed_config_files[path]})
+        if self.graph is not None:
+            self.graph.update(path, self.parsed_config_files[path])
+
+    @traced("dependency graph", "parse")
+    def dependencies(self) -> dependencyGraph:
+        """Import graph of the existing files and everything they import, built on
+        first use and kept up to date by `add_file` and `watch`"""
+        if self.graph is None:
+            self.graph = dependencyGraph().build(self.existing_config_files)
+        return self.graph
+
+    def watch(self, on_change=None, **kwargs) -> configWatcher:
+        """Keeps `existing_config_files`, `parsed_config_files` and `index` in sync
+        with disk, watching the existing files and `path` if it is set
+
+        Args:
+            on_change (Callable, optional): called with (changed, removed) file lists,
+                on the watcher thread
+            kwargs: passed to `configWatcher`
+
+        Returns:
+            configWatcher: the running watcher, stopped by `unwatch`
+        """
+        self.unwatch()
+        paths = list(self.existing_config_files)
+        if self.path and os.path.isdir(self.path):
+            paths.append(self.path)
+
+        def changed(changed_files, removed_files):
+            self.existing_config_files = self.index.files()
+            self.parsed_config_files = {path: self.index.tree(path) for path in self.existing_config_files}
+            if self.graph is not None:
+                self.graph.apply_changes(changed_files, removed_files, self.index)
+            if on_change is not None:
+                on_change(changed_files, removed_files)
+
+        self.watcher = configWatcher(paths, index=self.index, on_change=changed, **kwargs).start()
+        return self.watcher
+
+    def unwatch(self) -> None:
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
@@ -1,33 +1,185 @@
-import yaml
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of GNix.
+#########################################################################################
+# GNix - The Graphical Nix Project                                                      #
+#---------------------------------------------------------------------------------------#
+# GNix is free software: you can redistribute it and/or modify                          #
+# it under the terms of the GNU General Public License as published by                  #
+# the Free Software Foundation, either version 3 of the License, or any later version.  #
+#                                                                                       #
+# GNix is distributed in the hope that it will be useful,                               #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of                        #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the                         #
+# GNU General Public License for more details.                                          #
+#                                                                                       #
+# You should have received a copy of the GNU General Public License                     #
+# along with GNix.  If not, see <https://www.gnu.org/licenses/>.                        #
+#########################################################################################
+"""Registry of the folder templates in this directory.
+
+Nothing is read on import. The first lookup compiles every `*.yaml` template
+into an immutable `folderTemplate`, kept in memory and pickled to the user's
+cache directory together with the mtime and size of the YAML file, so later
+runs only parse templates that changed.
+"""
 import os
+import pickle
+from collections.abc import Mapping
+from typing import NamedTuple, Optional, Tuple
+
+import yaml
+
+from ..profiling import traced
+
+TEMPLATES_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+CACHE_HOME = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+CACHE_PATH = os.path.join(CACHE_HOME, "gnix", "folder-templates.pickle")
+# bump when the compiled classes below change shape
+CACHE_VERSION = 1
+
+class templateNode(NamedTuple):
+    """A file, or a directory and its entries, in a folder template"""
+    name: str
+    children: Tuple["templateNode", ...] = ()
+    is_file: bool = False
+
+    def as_dict(self):
+        """None for files, name -> entry for directories, empty ones included"""
+        if self.is_file:
+            return None
+        return {child.name: child.as_dict() for child in self.children}
+
+class folderTemplate(NamedTuple):
+    """A compiled folder template
+
+    Attributes:
+        key (str): file name without `.yaml`, e.g. `default-with-users`
+        name (str): display name
+        desc (str): description
+        root (tuple): top level entries
+    """
+    key: str
+    name: str
+    desc: str
+    root: Tuple[templateNode, ...]
+
+    def as_dict(self) -> dict:
+        """The directory tree below `root` as nested dicts, files map to None"""
+        return {node.name: node.as_dict() for node in self.root}
+
+def compile_node(name: str, entries) -> templateNode:
+    """Builds the entry `name` of a YAML tree. Names containing a `.` are files,
+    everything else is a directory"""
+    if "." in name:
+        return templateNode(name, is_file=True)
+    if not isinstance(entries, dict):
+        return templateNode(name)
+    return templateNode(name, tuple(compile_node(str(child), value) for child, value in entries.items()))
+
+def compile_template(path: str) -> folderTemplate:
+    """Parses and compiles the YAML template at `path`"""
+    with open(path, encoding="utf-8") as f:
+        data = yaml.load(f, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader)) or {}
+    key = os.path.splitext(os.path.basename(path))[0]
+    root = data.get("root")
+    return folderTemplate(
+        key=key,
+        name=str(data.get("name", key)),
+        desc=str(data.get("desc", "")),
+        root=compile_node("root", root).children,
+    )
+
+class templateRegistry(Mapping):
+    """Read-only mapping of template key -> `folderTemplate`, loaded on first use.
+
+    Args:
+        directory (str, optional): directory holding the `*.yaml` templates
+        cache_path (str, optional): pickle holding compiled templates, None disables it
+    """
+    def __init__(self, directory: str = TEMPLATES_DIRECTORY, cache_path: Optional[str] = CACHE_PATH):
+        self.directory = directory
+        self.cache_path = cache_path
+        self._templates = None
+
+    @property
+    def templates(self) -> dict:
+        if self._templates is None:
+            self.reload()
+        return self._templates
+
+    def __getitem__(self, key: str) -> folderTemplate:
+        return self.templates[key]
 
-AVAILABLE_TEMPLATES = ["default", "default_with_users"]
+    def __iter__(self):
+        return iter(self.templates)
 
-def build_tree(structure):
-    """Recursively builds a dictionary-based tree from the parsed YAML structure."""
-    if not isinstance(structure, dict):
-        return None  # Prevents incorrect structure parsing
+    def __len__(self) -> int:
+        return len(self.templates)
 
-    tree = {}
+    def by_name(self, name: str) -> folderTemplate:
+        """Looks a template up by its key or its display name
 
-    for key, value in structure.items():
-        if isinstance(value, dict):  # Nested directories
-            tree[key] = build_tree(value) or {}  # Ensure empty dicts for empty folders
-        else:
-            tree[key] = None  # Placeholder for files
+        Raises:
+            KeyError: no template is called `name`
+        """
+        if name in self.templates:
+            return self.templates[name]
+        for template in self.templates.values():
+            if template.name == name:
+                return template
+        raise KeyError(name)
 
-    return tree
+    @traced("load templates", "scaffold")
+    def reload(self) -> None:
+        """Re-reads the template directory, only templates whose file changed are parsed again"""
+        cached = self.read_cache()
+        entries = {}
+        try:
+            files = sorted((entry for entry in os.scandir(self.directory) if entry.name.endswith(".yaml")), key=lambda entry: entry.name)
+        except OSError:
+            files = []
+        for entry in files:
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            stamp = (stat.st_mtime_ns, stat.st_size)
+            hit = cached.get(entry.name)
+            if hit is not None and hit[0] == stamp:
+                entries[entry.name] = hit
+                continue
+            try:
+                entries[entry.name] = (stamp, compile_template(entry.path))
+            except (OSError, yaml.YAMLError):
+                continue
+        if entries != cached:
+            self.write_cache(entries)
+        self._templates = {template.key: template for _, template in entries.values()}
 
-def parse_yaml_tree(yaml_path):
-    """Parses the YAML file and returns the tree as a dictionary."""
-    with open(yaml_path, "r") as file:
-        data = yaml.safe_load(file)
+    def read_cache(self) -> dict:
+        if self.cache_path is None:
+            return {}
+        try:
+            with open(self.cache_path, "rb") as f:
+                version, directory, entries = pickle.load(f)
+        except (OSError, pickle.PickleError, EOFError, ValueError, TypeError, AttributeError, ImportError):
+            return {}
+        if version != CACHE_VERSION or directory != self.directory:
+            return {}
+        return entries
 
-    return {"root": build_tree(data["root"])} if "root" in data else {}
+    def write_cache(self, entries: dict) -> None:
+        if self.cache_path is None:
+            return
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                pickle.dump((CACHE_VERSION, self.directory, entries), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.cache_path)
+        except OSError:
+            # the cache is an optimisation, a read only home is not an error
+            pass
 
-TEMPLATES = {}
-directory = "src/nix_manager/nixos_folder_templates"
-yaml_files = [directory + "/" + f for f in os.listdir(directory) if f.endswith(".yaml")]
-import json
-for file in yaml_files:
-    print(json.dumps(parse_yaml_tree(file), indent=2))
+TEMPLATES = templateRegistry()
@@ -0,0 +1,198 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of GNix.
+#########################################################################################
+# GNix - The Graphical Nix Project                                                      #
+#---------------------------------------------------------------------------------------#
+# GNix is free software: you can redistribute it and/or modify                          #
+# it under the terms of the GNU General Public License as published by                  #
+# the Free Software Foundation, either version 3 of the License, or any later version.  #
+#                                                                                       #
+# GNix is distributed in the hope that it will be useful,                               #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of                        #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the                         #
+# GNU General Public License for more details.                                          #
+#                                                                                       #
+# You should have received a copy of the GNU General Public License                     #
+# along with GNix.  If not, see <https://www.gnu.org/licenses/>.                        #
+#########################################################################################
+import hashlib
+import os
+import threading
+
+from nix_parser import parse_nix, parse_nix_sources, dump_tree, load_tree, PARSER_VERSION
+
+from .profiling import traced
+
+CACHE_HOME = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+CACHE_PATH = os.path.join(CACHE_HOME, "gnix", "ast")
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+def content_hash(script) -> str:
+    """Hash used as the cache key of a Nix script
+
+    Args:
+        script (str|bytes): Nix script, str is hashed as UTF-8
+
+    Returns:
+        str: hex digest
+    """
+    if isinstance(script, str):
+        script = script.encode()
+    return hashlib.blake2b(script, digest_size=20).hexdigest()
+
+class parseCache:
+    """Content addressed cache of parsed Nix trees.
+
+    Trees are stored with `dump_tree` under `<path>/<PARSER_VERSION>/<hash>`, so a
+    parser upgrade never reads stale entries. Reading an entry bumps its mtime and
+    the least recently used entries are evicted once the cache grows past `max_bytes`.
+    """
+    def __init__(self, path: str = CACHE_PATH, max_bytes: int = CACHE_MAX_BYTES):
+        self.path = os.path.join(path, PARSER_VERSION)
+        self.max_bytes = max_bytes
+        self._size = None
+
+    def entry_path(self, key: str) -> str:
+        return os.path.join(self.path, key[:2], key)
+
+    @traced("parse cache load", "filesystem")
+    def load(self, key: str):
+        """Loads the tree stored under `key`
+
+        Args:
+            key (str): content hash
+
+        Returns:
+            LazyNode|None: root of the cached tree, None on a miss or a corrupt entry
+        """
+        path = self.entry_path(key)
+        try:
+            with open(path, "rb") as f:
+                tree = load_tree(f.read())
+            os.utime(path)
+            return tree
+        except (OSError, ValueError):
+            return None
+
+    @traced("parse cache store", "filesystem")
+    def store(self, key: str, tree) -> None:
+        """Writes `tree` under `key`, atomically, evicting old entries if needed
+
+        Args:
+            key (str): content hash
+            tree (LazyNode): any node of the tree to store
+        """
+        data = dump_tree(tree)
+        path = self.entry_path(key)
+        # one temp file per thread, threads storing the same key must not share it
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            # the cache is an optimisation, a read only or full disk is not an error
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            return
+        if self._size is not None:
+            self._size += len(data)
+        if self.size() > self.max_bytes:
+            self.evict()
+
+    def entries(self) -> list:
+        """Returns (mtime, size, path) of every entry"""
+        entries = []
+        try:
+            shards = list(os.scandir(self.path))
+        except OSError:
+            return entries
+        for shard in shards:
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(".tmp"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def size(self) -> int:
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self.entries())
+        return self._size
+
+    def evict(self) -> None:
+        """Deletes least recently used entries until the cache is below 3/4 of `max_bytes`"""
+        entries = sorted(self.entries())
+        size = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 3 // 4
+        for _, entry_size, path in entries:
+            if size <= target:
+                break
+            try:
+                os.remove(path)
+                size -= entry_size
+            except OSError:
+                pass
+        self._size = size
+
+    @traced("parse", "parse")
+    def parse(self, script: str):
+        """Parses `script` lazily, reusing the cached tree if the content was seen before
+
+        Args:
+            script (str): Nix script
+
+        Returns:
+            LazyNode: root of the tree
+        """
+        key = content_hash(script)
+        tree = self.load(key)
+        if tree is None:
+            tree = parse_nix(script, lazy=True)
+            self.store(key, tree)
+        return tree
+
+    @traced("parse_files", "parse")
+    def parse_files(self, paths: list) -> dict:
+        """Parses many files, cache misses are parsed in parallel with `parse_nix_sources`.
+        Every file is read once, the tree is parsed from exactly the bytes that were hashed
+
+        Args:
+            paths (list): files to parse
+
+        Returns:
+            dict: path, as given -> LazyNode, unreadable and non UTF-8 files are left out
+        """
+        trees = {}
+        misses = []
+        for path in paths:
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+            except OSError:
+                continue
+            key = content_hash(data)
+            tree = self.load(key)
+            if tree is None:
+                misses.append((path, key, data))
+            else:
+                trees[path] = tree
+
+        results = parse_nix_sources([(os.fspath(path), data) for path, _, data in misses], lazy=True)
+        for (path, key, _), result in zip(misses, results):
+            if result.ast is None:
+                continue
+            self.store(key, result.ast)
+            trees[path] = result.ast
+        return trees
+
+PARSE_CACHE = parseCache()
@@ -0,0 +1,191 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of GNix.
+#########################################################################################
+# GNix - The Graphical Nix Project                                                      #
+#---------------------------------------------------------------------------------------#
+# GNix is free software: you can redistribute it and/or modify                          #
+# it under the terms of the GNU General Public License as published by                  #
+# the Free Software Foundation, either version 3 of the License, or any later version.  #
+#                                                                                       #
+# GNix is distributed in the hope that it will be useful,                               #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of                        #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the                         #
+# GNU General Public License for more details.                                          #
+#                                                                                       #
+# You should have received a copy of the GNU General Public License                     #
+# along with GNix.  If not, see <https://www.gnu.org/licenses/>.                        #
+#########################################################################################
+"""Opt-in tracing of the parse, lookup, edit, scaffold and filesystem phases
+
+Set `GNIX_TRACE=1` to record, or `GNIX_TRACE=/path/to/trace.json` to also write
+a Chrome trace there when the process exits (open it in chrome://tracing or
+https://ui.perfetto.dev). The Rust extension reads the same variable and
+records its own phases (`nixel parse`, `arena build`, `python objects`, ...)
+with allocation counts, `chrome_trace` merges both.
+
+The variable is read once on import. When it is not set `traced` returns the
+function it decorates unchanged and `span` returns a shared no-op context
+manager, so the hooks cost nothing. The extension is optional here, without it
+only the Python phases are recorded.
+"""
+import atexit
+import contextlib
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+TRACE_VARIABLE = "GNIX_TRACE"
+_setting = os.environ.get(TRACE_VARIABLE, "")
+ENABLED = _setting not in ("", "0")
+# anything but a plain flag is where the trace is written on exit
+TRACE_PATH = _setting if ENABLED and _setting.lower() not in ("1", "true", "yes", "on") else None
+
+# (name, category, start µs, duration µs, thread, allocations, allocated bytes, python blocks)
+_events = []
+_lock = threading.Lock()
+# perf_counter timestamps shifted onto the epoch, like the extension's
+_EPOCH_OFFSET_NS = time.time_ns() - time.perf_counter_ns()
+_NO_SPAN = contextlib.nullcontext()
+
+class _span:
+    __slots__ = ("name", "category", "start", "blocks")
+
+    def __init__(self, name: str, category: str):
+        self.name = name
+        self.category = category
+
+    def __enter__(self):
+        self.blocks = sys.getallocatedblocks()
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        end = time.perf_counter_ns()
+        blocks = sys.getallocatedblocks() - self.blocks
+        _events.append((
+            self.name,
+            self.category,
+            (self.start + _EPOCH_OFFSET_NS) // 1000,
+            (end - self.start) // 1000,
+            threading.get_native_id(),
+            None,
+            None,
+            blocks,
+        ))
+        return False
+
+def span(name: str, category: str = "python"):
+    """Context manager recording the block it wraps as the phase `name`
+
+    Args:
+        name (str): phase name shown in the trace
+        category (str, optional): e.g. `parse`, `lookup`, `scaffold`, `filesystem`
+    """
+    return _span(name, category) if ENABLED else _NO_SPAN
+
+def traced(name: str = None, category: str = "python"):
+    """Decorator recording every call of the function as the phase `name`,
+    defaulting to its qualified name. Returns the function itself when tracing is off"""
+    def decorator(function):
+        if not ENABLED:
+            return function
+        phase = name or function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with _span(phase, category):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# MARK: results
+def _take_native_events() -> list:
+    """Drains the extension's event buffer, empty when the extension is not built"""
+    try:
+        from nix_parser import take_trace_events
+    except ImportError:
+        return []
+    return take_trace_events()
+
+def collect() -> list:
+    """Moves the extension's events into the Python buffer and returns a copy of all events"""
+    native = _take_native_events()
+    with _lock:
+        _events.extend(
+            (name, "nix_parser", start, duration, thread, allocations, allocated_bytes, None)
+            for name, start, duration, thread, allocations, allocated_bytes in native
+        )
+        return list(_events)
+
+def clear() -> None:
+    _take_native_events()
+    with _lock:
+        _events.clear()
+
+def summary() -> list:
+    """Per phase totals, slowest first
+
+    Returns:
+        list: dicts with name, category, calls, total_ms, max_ms, allocations,
+            allocated_bytes (extension phases) and python_blocks (net change of
+            live Python objects, Python phases)
+    """
+    phases = {}
+    for name, category, _, duration, _, allocations, allocated_bytes, blocks in collect():
+        phase = phases.setdefault((category, name), {
+            "name": name,
+            "category": category,
+            "calls": 0,
+            "total_ms": 0.0,
+            "max_ms": 0.0,
+            "allocations": None,
+            "allocated_bytes": None,
+            "python_blocks": None,
+        })
+        phase["calls"] += 1
+        phase["total_ms"] += duration / 1000
+        phase["max_ms"] = max(phase["max_ms"], duration / 1000)
+        for key, value in (("allocations", allocations), ("allocated_bytes", allocated_bytes), ("python_blocks", blocks)):
+            if value is not None:
+                phase[key] = (phase[key] or 0) + value
+    return sorted(phases.values(), key=lambda phase: phase["total_ms"], reverse=True)
+
+def chrome_trace() -> dict:
+    """Every event recorded so far in the Chrome trace event format"""
+    pid = os.getpid()
+    events = []
+    for name, category, start, duration, thread, allocations, allocated_bytes, blocks in collect():
+        args = {}
+        if allocations is not None:
+            args["allocations"] = allocations
+            args["allocated_bytes"] = allocated_bytes
+        if blocks is not None:
+            args["python_blocks"] = blocks
+        events.append({
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": start,
+            "dur": duration,
+            "pid": pid,
+            "tid": thread,
+            "args": args,
+        })
+    for thread in threading.enumerate():
+        if thread.native_id is not None:
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": thread.native_id, "args": {"name": thread.name}})
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+def write_chrome_trace(path: str) -> None:
+    """Writes `chrome_trace()` to `path` as JSON"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(chrome_trace(), f)
+    os.replace(tmp_path, path)
+
+if TRACE_PATH is not None:
+    atexit.register(write_chrome_trace, TRACE_PATH)
@@ -0,0 +1,211 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of GNix.
+#########################################################################################
+# GNix - The Graphical Nix Project                                                      #
+#---------------------------------------------------------------------------------------#
+# GNix is free software: you can redistribute it and/or modify                          #
+# it under the terms of the GNU General Public License as published by                  #
+# the Free Software Foundation, either version 3 of the License, or any later version.  #
+#                                                                                       #
+# GNix is distributed in the hope that it will be useful,                               #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of                        #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the                         #
+# GNU General Public License for more details.                                          #
+#                                                                                       #
+# You should have received a copy of the GNU General Public License                     #
+# along with GNix.  If not, see <https://www.gnu.org/licenses/>.                        #
+#########################################################################################
+"""Creates new configuration directories from the folder templates.
+
+Templates are the YAML files in `nixos_folder_templates`. Below `root`, keys
+with a `.` in them are files and every other key is a directory. The entries
+below `hosts` and `users` are examples: the first one is the layout every host
+(user) gets, and the examples are replaced by the names asked for. Trees are
+the dicts of `folderTemplate.as_dict`, where files map to None.
+
+Everything is written into a temporary directory next to the target, which is
+renamed into place once complete, so a failed scaffold leaves nothing behind.
+"""
+import os
+import shutil
+import socket
+import tempfile
+
+from .nix_syntax import attr_name
+from .nixos_folder_templates.templates import TEMPLATES, folderTemplate
+from .profiling import traced
+
+NIXOS_CONFIG_PATH = "/etc/nixos"
+
+MODULE_STUB = "{ config, pkgs, lib, ... }:\n\n{\n}\n"
+
+def check_entry_name(name: str) -> str:
+    """Raises ValueError unless `name` can be a single directory entry"""
+    if not name or name in (".", "..") or "/" in name or "\0" in name:
+        raise ValueError(f"invalid host or user name {name!r}")
+    return name
+
+def expand_tree(tree: dict, hosts: list = None, users: list = None) -> dict:
+    """Replaces the example hosts and users of a template tree with real names
+
+    Args:
+        tree (dict): directory tree, name -> subtree for directories, None for files
+        hosts (list, optional): host names, defaults to the examples in the template
+        users (list, optional): user names, defaults to the examples in the template
+
+    Returns:
+        dict: the expanded tree, every host and user is a directory
+
+    Raises:
+        ValueError: a host or user name is empty or contains a `/`
+    """
+    expanded = {}
+    for name, subtree in tree.items():
+        names = {"hosts": hosts, "users": users}.get(name)
+        if names is not None and subtree:
+            layout = next(iter(subtree.values())) or {}
+            subtree = {check_entry_name(entry): layout for entry in names}
+        expanded[name] = expand_tree(subtree) if subtree is not None else None
+    return expanded
+
+def flake_nix(hosts: dict) -> str:
+    """Source of a flake defining one `nixosConfiguration` per host
+
+    Args:
+        hosts (dict): host name -> module paths relative to the flake
+    """
+    system = f"{os.uname().machine}-linux"
+    configurations = "".join(
+        f"      {attr_name(host)} = nixpkgs.lib.nixosSystem {{\n"
+        f'        system = "{system}";\n'
+        "        specialArgs = { inherit inputs; };\n"
+        "        modules = [\n"
+        + "".join(f"          ./{module}\n" for module in modules)
+        + "        ];\n"
+        "      };\n"
+        for host, modules in hosts.items()
+    )
+    return (
+        "{\n"
+        '  description = "NixOS configuration";\n\n'
+        '  inputs.nixpkgs.url = "github:NixOS/nixpkgs/nixos-unstable";\n\n'
+        "  outputs = { self, nixpkgs, ... }@inputs: {\n"
+        "    nixosConfigurations = {\n"
+        f"{configurations}"
+        "    };\n"
+        "  };\n"
+        "}\n"
+    )
+
+@traced("copy file", "filesystem")
+def copy_file(source: str, destination: str) -> None:
+    """Copies `source` to `destination` in the kernel, with `copy_file_range`
+    or `sendfile`, falling back to a userspace copy where neither works"""
+    with open(source, "rb", buffering=0) as src, open(destination, "wb", buffering=0) as dst:
+        remaining = os.fstat(src.fileno()).st_size
+        try:
+            while remaining > 0:
+                copied = os.copy_file_range(src.fileno(), dst.fileno(), remaining)
+                if copied == 0:
+                    return
+                remaining -= copied
+            return
+        except (AttributeError, OSError):
+            # not Linux, or an older kernel refusing to copy between file systems
+            pass
+        offset = os.lseek(src.fileno(), 0, os.SEEK_CUR)
+        try:
+            while remaining > 0:
+                copied = os.sendfile(dst.fileno(), src.fileno(), offset, remaining)
+                if copied == 0:
+                    return
+                offset += copied
+                remaining -= copied
+            return
+        except OSError:
+            pass
+        src.seek(offset)
+        shutil.copyfileobj(src, dst)
+
+class scaffolder:
+    """Builds a configuration directory from a folder template.
+
+    Args:
+        template (str|folderTemplate): template key or name, see `TEMPLATES.by_name`
+        hosts (list, optional): host names, defaults to this machine's hostname
+        users (list, optional): user names, defaults to the template examples
+        configuration (str, optional): file copied into every host's `configuration.nix`,
+            defaults to /etc/nixos/configuration.nix when it exists
+        hardware_configuration (str, optional): as `configuration`, for `hardware-configuration.nix`
+    """
+    def __init__(self, template: "str|folderTemplate" = "default", hosts: list = None, users: list = None,
+                 configuration: str = None, hardware_configuration: str = None):
+        if isinstance(template, str):
+            template = TEMPLATES.by_name(template)
+        if hosts is None:
+            hosts = [socket.gethostname()]
+        self.tree = expand_tree(template.as_dict(), hosts=hosts, users=users)
+        self.sources = {
+            "configuration.nix": configuration or self.existing("configuration.nix"),
+            "hardware-configuration.nix": hardware_configuration or self.existing("hardware-configuration.nix"),
+        }
+
+    @staticmethod
+    def existing(name: str):
+        path = os.path.join(NIXOS_CONFIG_PATH, name)
+        return path if os.path.isfile(path) else None
+
+    def host_modules(self) -> dict:
+        """host name -> .nix files of the host, relative to the configuration root"""
+        hosts = self.tree.get("hosts")
+        if not isinstance(hosts, dict):
+            return {}
+        return {
+            host: [f"hosts/{host}/{name}" for name, entry in layout.items() if entry is None and name.endswith(".nix")]
+            for host, layout in hosts.items()
+        }
+
+    def write_tree(self, directory: str, tree: dict, top_level: bool = False) -> None:
+        for name, subtree in tree.items():
+            path = os.path.join(directory, name)
+            if subtree is not None:
+                os.mkdir(path)
+                self.write_tree(path, subtree)
+            elif name == "flake.nix" and top_level:
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(flake_nix(self.host_modules()))
+            elif self.sources.get(name) is not None:
+                copy_file(self.sources[name], path)
+            else:
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(MODULE_STUB if name.endswith(".nix") else "")
+
+    @traced("scaffold", "scaffold")
+    def create(self, path: str) -> str:
+        """Writes the configuration to `path`, which must not exist or be an empty directory
+
+        Args:
+            path (str): directory of the new configuration
+
+        Returns:
+            str: absolute path of the configuration
+
+        Raises:
+            FileExistsError: `path` is a file or a non-empty directory
+        """
+        path = os.path.abspath(path)
+        if os.path.lexists(path) and (not os.path.isdir(path) or os.listdir(path)):
+            raise FileExistsError(f"{path} already exists and is not empty")
+        parent = os.path.dirname(path)
+        os.makedirs(parent, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=".gnix-", dir=parent)
+        try:
+            self.write_tree(staging, self.tree, top_level=True)
+            os.chmod(staging, 0o755)
+            # atomically replaces an empty directory at `path`
+            os.rename(staging, path)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        return path
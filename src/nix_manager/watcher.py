@@ -0,0 +1,494 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of GNix.
+#########################################################################################
+# GNix - The Graphical Nix Project                                                      #
+#---------------------------------------------------------------------------------------#
+# GNix is free software: you can redistribute it and/or modify                          #
+# it under the terms of the GNU General Public License as published by                  #
+# the Free Software Foundation, either version 3 of the License, or any later version.  #
+#                                                                                       #
+# GNix is distributed in the hope that it will be useful,                               #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of                        #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the                         #
+# GNU General Public License for more details.                                          #
+#                                                                                       #
+# You should have received a copy of the GNU General Public License                     #
+# along with GNix.  If not, see <https://www.gnu.org/licenses/>.                        #
+#########################################################################################
+"""Keeps parsed Nix files in sync with the files on disk.
+
+`configWatcher` watches files and directory trees with inotify, or by polling
+mtimes where inotify is not available. Bursts of events, e.g. an editor's
+save, are debounced and then only the `.nix` files that changed are parsed
+again. The results go into a `configIndex`, which the GUI and the CLI query
+without reading anything from disk.
+"""
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import threading
+import time
+
+from nix_parser import Query, find_definitions, find_definitions_with_prefix
+
+from .parse_cache import PARSE_CACHE
+from .profiling import traced
+
+class configIndex:
+    """Live map of file -> parsed tree, with attribute lookups across files.
+
+    Updates swap in a new dict, so readers never block and always see a
+    consistent set of trees.
+    """
+    def __init__(self):
+        self._trees = {}
+        self._lock = threading.Lock()
+
+    def update(self, trees: dict, removed=()) -> None:
+        """Replaces the trees of the files in `trees` and drops `removed`
+
+        Args:
+            trees (dict): path -> LazyNode
+            removed (Iterable, optional): paths no longer on disk
+        """
+        with self._lock:
+            current = dict(self._trees)
+            current.update(trees)
+            for path in removed:
+                current.pop(path, None)
+            self._trees = current
+
+    def __contains__(self, path: str) -> bool:
+        return path in self._trees
+
+    def __len__(self) -> int:
+        return len(self._trees)
+
+    def files(self) -> list:
+        return sorted(self._trees)
+
+    def tree(self, path: str):
+        """Root of the tree of `path`, None if the file is not indexed"""
+        return self._trees.get(path)
+
+    @traced("index definitions", "lookup")
+    def definitions(self, attribute: str) -> list:
+        """(file, binding) of every definition of the dotted `attribute`, see `find_definitions`"""
+        return [
+            (path, binding)
+            for path, tree in sorted(self._trees.items())
+            for binding in find_definitions(tree, attribute)
+        ]
+
+    def definitions_with_prefix(self, prefix: str) -> list:
+        """(file, attribute, binding) of every attribute starting with `prefix`"""
+        return [
+            (path, attribute, binding)
+            for path, tree in sorted(self._trees.items())
+            for attribute, binding in find_definitions_with_prefix(tree, prefix)
+        ]
+
+    @traced("index query", "lookup")
+    def query(self, selector) -> list:
+        """(file, QueryMatch) of every match of `selector` in every file
+
+        Args:
+            selector (str|Query): selector, see `nix_parser.Query`
+        """
+        if isinstance(selector, str):
+            selector = Query(selector)
+        paths = sorted(self._trees)
+        trees = self._trees
+        results = selector.run_many([trees[path] for path in paths])
+        return [(path, match) for path, matches in zip(paths, results) for match in matches]
+
+# MARK: inotify
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (
+    IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+    | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+)
+EVENT_HEADER = struct.Struct("iIII")
+
+class inotify:
+    """Minimal ctypes binding of the Linux inotify API
+
+    Raises:
+        OSError: inotify is not available
+    """
+    def __init__(self):
+        libc_name = ctypes.util.find_library("c")
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._add_watch.restype = ctypes.c_int
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self._rm_watch.restype = ctypes.c_int
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+
+    def add_watch(self, path: str, mask: int = WATCH_MASK) -> int:
+        wd = self._add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), path)
+        return wd
+
+    def rm_watch(self, wd: int) -> None:
+        """Stops watching `wd`, a watch the kernel already dropped is ignored"""
+        self._rm_watch(self.fd, wd)
+
+    def read(self) -> list:
+        """Pending events as (wd, mask, name), empty if there are none"""
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            events.append((wd, mask, os.fsdecode(name)))
+        return events
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+# MARK: configWatcher
+def is_hidden(name: str) -> bool:
+    return name.startswith(".")
+
+class configWatcher:
+    """Watches Nix files and directory trees and keeps `index` up to date
+
+    Args:
+        paths (list): files and directories to watch, directories are watched recursively
+        index (configIndex, optional): index to keep up to date, a new one by default
+        on_change (Callable, optional): called with (changed, removed) file lists after
+            the index was updated, on the watcher thread
+        debounce (float, optional): seconds without events before changes are applied
+        poll_interval (float, optional): seconds between scans when polling
+        use_inotify (bool, optional): False forces polling
+    """
+    # changes are applied at the latest this long after the first event of a burst
+    MAX_DELAY_FACTOR = 10
+
+    def __init__(self, paths: list, index: configIndex = None, on_change=None,
+                 debounce: float = 0.2, poll_interval: float = 1.0, use_inotify: bool = True):
+        self.files = {os.path.abspath(path) for path in paths if not os.path.isdir(path)}
+        self.directories = {os.path.abspath(path) for path in paths if os.path.isdir(path)}
+        self.index = index if index is not None else configIndex()
+        self.on_change = on_change
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self.polling = not use_inotify
+        self._pending = set()
+        self._watches = {}
+        self._missing = set()
+        self._stop = threading.Event()
+        self._thread = None
+        self._notify = None
+        self._wake_read, self._wake_write = None, None
+        self._previous = {}
+
+    # MARK: tracked files
+    def roots(self) -> dict:
+        """Directories watched on their own, directory -> whether it is watched recursively"""
+        roots = {os.path.dirname(path): False for path in self.files}
+        roots.update((directory, True) for directory in self.directories)
+        return roots
+
+    def root_files(self, directory: str, recursive: bool) -> set:
+        """Watched Nix files on disk below the root `directory`"""
+        if recursive:
+            return self.scan(directory)
+        return {path for path in self.files if os.path.dirname(path) == directory and os.path.isfile(path)}
+
+    def in_tree(self, path: str) -> bool:
+        """Whether `path` is below a watched directory, outside hidden directories"""
+        for directory in self.directories:
+            if path.startswith(directory + os.sep):
+                relative = os.path.relpath(path, directory)
+                return not any(is_hidden(part) for part in relative.split(os.sep))
+        return False
+
+    def tracks(self, path: str) -> bool:
+        """Whether `path` is one of the watched Nix files"""
+        return path in self.files or (path.endswith(".nix") and self.in_tree(path))
+
+    @traced("scan", "filesystem")
+    def scan(self, directory: str = None) -> set:
+        """Every watched Nix file on disk, or every one below `directory`"""
+        found = set()
+        roots = [directory] if directory is not None else sorted(self.directories)
+        for root in roots:
+            for current, subdirectories, names in os.walk(root):
+                subdirectories[:] = [name for name in subdirectories if not is_hidden(name)]
+                found.update(os.path.join(current, name) for name in names if name.endswith(".nix") and not is_hidden(name))
+        if directory is None:
+            found.update(path for path in self.files if os.path.isfile(path))
+        return found
+
+    # MARK: lifecycle
+    def start(self) -> "configWatcher":
+        """Parses every watched file and starts watching in a background thread"""
+        # watch before scanning, so files created in between are not missed
+        if not self.polling:
+            try:
+                self._setup_inotify()
+            except OSError:
+                self._close_inotify()
+                self.polling = True
+        if self.polling:
+            self._previous = self.snapshot()
+            self._pending = set(self._previous)
+        else:
+            self._pending = self.scan()
+        self.flush()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="gnix-config-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._wake_write is not None:
+            os.write(self._wake_write, b"\0")
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._close_inotify()
+
+    @traced("re-index", "parse")
+    def flush(self) -> None:
+        """Parses the changed files now and updates the index"""
+        pending, self._pending = self._pending, set()
+        if not pending:
+            return
+        changed = sorted(path for path in pending if os.path.isfile(path))
+        removed = sorted(path for path in pending if not os.path.isfile(path) and path in self.index)
+        trees = PARSE_CACHE.parse_files(changed)
+        # unreadable files are treated as removed
+        removed += [path for path in changed if path not in trees and path in self.index]
+        changed = [path for path in changed if path in trees]
+        if not changed and not removed:
+            return
+        self.index.update(trees, removed)
+        if self.on_change is not None:
+            self.on_change(changed, removed)
+
+    def _run(self) -> None:
+        if self.polling:
+            self._run_polling()
+        else:
+            self._run_inotify()
+
+    # MARK: inotify loop
+    def _setup_inotify(self) -> None:
+        self._notify = inotify()
+        self._wake_read, self._wake_write = os.pipe()
+        for directory, recursive in sorted(self.roots().items()):
+            self._watch_root(directory, recursive)
+
+    def _close_inotify(self) -> None:
+        if self._notify is not None:
+            self._notify.close()
+            self._notify = None
+        for fd in (self._wake_read, self._wake_write):
+            if fd is not None:
+                os.close(fd)
+        self._wake_read, self._wake_write = None, None
+        self._watches = {}
+        self._missing = set()
+
+    def _watch(self, directory: str, recursive: bool) -> bool:
+        """Watches `directory`, returns False if it does not exist (anymore)"""
+        try:
+            self._watches[self._notify.add_watch(directory)] = directory
+        except OSError as e:
+            # out of watches is fatal, a directory that vanished is not
+            if e.errno in (errno.ENOSPC, errno.ENOMEM):
+                raise
+            return False
+        if not recursive:
+            return True
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            return True
+        for entry in entries:
+            if not is_hidden(entry.name) and entry.is_dir(follow_symlinks=False):
+                self._watch(entry.path, recursive=True)
+        return True
+
+    def _watch_root(self, directory: str, recursive: bool) -> bool:
+        """Watches a root, one that does not exist is checked for again every `poll_interval`"""
+        if self._watch(directory, recursive):
+            self._missing.discard(directory)
+            return True
+        self._missing.add(directory)
+        return False
+
+    def _unwatch(self, directory: str) -> None:
+        """Drops the watches of `directory` and of every directory below it"""
+        prefix = directory + os.sep
+        for wd, path in list(self._watches.items()):
+            if path == directory or path.startswith(prefix):
+                self._notify.rm_watch(wd)
+                del self._watches[wd]
+
+    def _lost(self, directory: str) -> None:
+        """A watched directory was deleted or moved away"""
+        roots = self.roots()
+        if directory not in roots:
+            # a subdirectory moved inside the tree is watched under its new path
+            # already, one deleted or moved out is reported by its parent
+            if not os.path.isdir(directory):
+                self._unwatch(directory)
+            return
+        # the watches follow the moved directory, not the path
+        self._unwatch(directory)
+        prefix = directory + os.sep
+        self._pending |= {file for file in self.index.files() if file.startswith(prefix)}
+        if self._watch_root(directory, roots[directory]):
+            self._pending |= self.root_files(directory, roots[directory])
+
+    def _check_missing(self) -> None:
+        """Watches the roots that were missing again once they are back"""
+        roots = self.roots()
+        for directory in sorted(self._missing):
+            if self._watch_root(directory, roots[directory]):
+                self._pending |= self.root_files(directory, roots[directory])
+
+    def _rewatch(self) -> None:
+        """Drops the watches of directories that are gone and watches every root
+        again, which also picks up directories created while events were lost"""
+        for wd, path in list(self._watches.items()):
+            if not os.path.isdir(path):
+                self._notify.rm_watch(wd)
+                del self._watches[wd]
+        for directory, recursive in sorted(self.roots().items()):
+            self._watch_root(directory, recursive)
+
+    def _handle(self, wd: int, mask: int, name: str) -> None:
+        if mask & IN_Q_OVERFLOW:
+            # events were lost, watch what was created meanwhile and compare
+            # everything against the index
+            self._rewatch()
+            self._pending |= self.scan() | set(self.index.files())
+            return
+        if mask & IN_IGNORED:
+            self._watches.pop(wd, None)
+            return
+        directory = self._watches.get(wd)
+        if directory is None:
+            return
+        if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+            self._lost(directory)
+            return
+        if not name:
+            return
+        path = os.path.join(directory, name)
+        if mask & IN_ISDIR:
+            if not self.in_tree(path):
+                return
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                self._watch(path, recursive=True)
+                self._pending |= self.scan(path)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                prefix = path + os.sep
+                self._pending |= {file for file in self.index.files() if file.startswith(prefix)}
+            return
+        if self.tracks(path):
+            self._pending.add(path)
+
+    def _run_inotify(self) -> None:
+        poller = select.poll()
+        poller.register(self._notify.fd, select.POLLIN)
+        poller.register(self._wake_read, select.POLLIN)
+        first_event = last_event = None
+        while not self._stop.is_set():
+            if last_event is None:
+                timeout = None
+            else:
+                now = time.monotonic()
+                deadline = min(last_event + self.debounce, first_event + self.debounce * self.MAX_DELAY_FACTOR)
+                timeout = max(0, int((deadline - now) * 1000))
+            if self._missing:
+                interval = int(self.poll_interval * 1000)
+                timeout = interval if timeout is None else min(timeout, interval)
+            poller.poll(timeout)
+            if self._stop.is_set():
+                break
+            try:
+                events = self._notify.read()
+                for wd, mask, name in events:
+                    self._handle(wd, mask, name)
+                if self._missing:
+                    self._check_missing()
+            except OSError:
+                # out of watches while following a new directory
+                self._close_inotify()
+                self.polling = True
+                self._previous = self.snapshot()
+                self._pending |= set(self._previous)
+                self.flush()
+                self._run_polling()
+                return
+            now = time.monotonic()
+            if self._pending and (events or last_event is None):
+                first_event = first_event or now
+                last_event = now
+            if last_event is not None and (
+                now - last_event >= self.debounce or now - first_event >= self.debounce * self.MAX_DELAY_FACTOR
+            ):
+                first_event = last_event = None
+                self.flush()
+
+    # MARK: polling loop
+    def snapshot(self) -> dict:
+        stamps = {}
+        for path in self.scan():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            stamps[path] = (stat.st_mtime_ns, stat.st_size)
+        return stamps
+
+    def _run_polling(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            current = self.snapshot()
+            previous = self._previous
+            self._pending |= {path for path, stamp in current.items() if previous.get(path) != stamp}
+            self._pending |= set(previous) - set(current)
+            self._previous = current
+            self.flush()
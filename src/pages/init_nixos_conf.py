@@ -16,16 +16,36 @@
 # You should have received a copy of the GNU General Public License                     #
 # along with GNix.  If not, see <https://www.gnu.org/licenses/>.                        #
 #########################################################################################
+import os
 import socket
 
-from PyQt5.QtWidgets import QWidget, QTreeView, QPushButton, QFileDialog, QLineEdit, QCheckBox, QToolTip, QLabel, QComboBox
-from PyQt5.QtGui import QStandardItemModel, QStandardItem, QIcon, QRegularExpressionValidator
+from PyQt5.QtWidgets import QWidget, QTreeView, QPushButton, QFileDialog, QLineEdit, QCheckBox, QToolTip, QLabel, QComboBox, QMessageBox
+from PyQt5.QtGui import QRegularExpressionValidator
 from PyQt5.QtCore import QPoint, QTimer, QRegularExpression
-from PyQt5.uic import loadUi
 
 from ..nix_manager.nixos_folder_templates.templates import TEMPLATES
-
-HOSTNAME = socket.gethostname()
+from ..nix_manager.parse_cache import PARSE_CACHE
+from ..nix_manager.scaffold import expand_tree, scaffolder
+from ..config_tree import ConfigTreeModel
+from ..workers import TaskRunner
+from .ui import load_ui
+
+def parse_config_job(task, path: str):
+    """Parses the config at `path` through the parse cache, runs on a worker thread"""
+    task.report(0, 1)
+    trees = PARSE_CACHE.parse_files([path])
+    task.check()
+    task.report(1, 1)
+    return trees.get(path)
+
+def scaffold_job(task, path: str, template: str, configuration: str, hardware_configuration: str) -> str:
+    """Creates the new configuration directory, runs on a worker thread"""
+    task.check()
+    return scaffolder(
+        template,
+        configuration=configuration or None,
+        hardware_configuration=hardware_configuration or None,
+    ).create(path)
 
 class InitNixosConfig(QWidget):
     """InitNixosConfig QWidget, widget contain the GUI for creating a new Nixos Configuration"""
@@ -51,41 +71,11 @@ class InitNixosConfig(QWidget):
         self.folderStructure: QComboBox
         
         super().__init__()
-        loadUi("src/pages/New_Nixos_Config.ui", self)
+        load_ui(self, "New_Nixos_Config")
         
-        self.model = QStandardItemModel()
+        self.model = ConfigTreeModel(self)
         self.configOverview.setModel(self.model)
 
-        rootNode = self.model.invisibleRootItem()
-
-        folderIcon = QIcon('src/assets/icons/folder.png')
-        nixIcon = QIcon('src/assets/icons/nix.png')
-
-        hostsFolder = QStandardItem(folderIcon, 'hosts')
-        currentHost = QStandardItem(folderIcon, HOSTNAME)
-        modulesFolder = QStandardItem(folderIcon, 'modules')
-        exampleModule = QStandardItem(folderIcon, 'example_module')
-        usersFolder = QStandardItem(folderIcon, 'users')
-        exampleUser = QStandardItem(folderIcon, 'example_user')
-        userPlaceholder = QStandardItem('user configuration')
-
-        # Add child items to "Folder 1"
-        configurationDotNix = QStandardItem(nixIcon, 'configuration.nix')
-        HConfigurationDotNix= QStandardItem(nixIcon, 'hardware-configuration.nix')
-        defaultDotNix = QStandardItem(nixIcon, 'default.nix')
-
-        currentHost.appendRow([configurationDotNix])
-        currentHost.appendRow([HConfigurationDotNix])
-        hostsFolder.appendRow([currentHost])
-
-        exampleModule.appendRow([defaultDotNix])
-        modulesFolder.appendRow([exampleModule])
-
-        exampleUser.appendRow([userPlaceholder])
-        usersFolder.appendRow([exampleUser])
-
-        rootNode.appendRows([hostsFolder, modulesFolder, usersFolder, QStandardItem(nixIcon, "flake.nix")])
-
         self.newConfigLocation.clicked.connect(self.handle_directory(self.newConfig))
         self.existingConfigLocation.clicked.connect(self.handle_file(self.existingConfig))
         self.existingHardwareConfigLocation.clicked.connect(self.handle_file(self.existingHardwareConfig))
@@ -107,16 +97,81 @@ class InitNixosConfig(QWidget):
         configName_validator = QRegularExpressionValidator(regex, self.configName)
         self.configName.setValidator(configName_validator)
         
+        self.tasks = TaskRunner(self)
+        self.parsed_configs = {}
+        self.existingConfig.textChanged.connect(lambda path: self.handle_config_file_change(self.existingConfig, path))
+        self.existingHardwareConfig.textChanged.connect(lambda path: self.handle_config_file_change(self.existingHardwareConfig, path))
+        self.nextButton.clicked.connect(self.handle_next_button)
+
+        self.newConfig.textChanged.connect(self.handle_config_location_change)
+        self.configName.textChanged.connect(self.handle_config_location_change)
+
         self.folderStructure.currentTextChanged.connect(self.handle_folder_structure_change)
-    
+        for template in TEMPLATES.values():
+            self.folderStructure.addItem(template.name, template.key)
+
     def handle_folder_structure_change(self, value) -> None:
         """handles the folder structure template being changed
 
         :param value: value changed to
         :type value: Any
         """
-        
+        key = self.folderStructure.currentData()
+        if key not in TEMPLATES:
+            return
+        self.model.set_template(expand_tree(TEMPLATES[key].as_dict(), hosts=[socket.gethostname()]))
+
+    def handle_config_location_change(self, _=None) -> None:
+        """Shows what already exists at the location of the new configuration"""
+        location = self.newConfig.text()
+        name = self.configName.text()
+        self.model.set_directory(os.path.join(location, name) if location and name else None)
     
+    def handle_config_file_change(self, target: QLineEdit, path: str) -> None:
+        """Parses an existing config in the background, a parse still running
+        for the previous path of `target` is cancelled
+
+        Args:
+            target (QLineEdit): the line edit holding the path
+            path (str): new path
+        """
+        key = target.objectName()
+        self.parsed_configs.pop(key, None)
+        if not os.path.isfile(path):
+            self.tasks.cancel(key)
+            return
+
+        def store(tree):
+            self.parsed_configs[key] = tree
+        self.tasks.submit(key, parse_config_job, path, on_result=store)
+
+    def handle_next_button(self) -> None:
+        """Scaffolds the new configuration in the background"""
+        location = self.newConfig.text()
+        name = self.configName.text()
+        if not location or not name:
+            QMessageBox.warning(self, "New NixOS Config", "Choose a location and a name for the configuration.")
+            return
+
+        def done(path):
+            QMessageBox.information(self, "New NixOS Config", f"Created {path}")
+
+        def failed(error):
+            QMessageBox.warning(self, "New NixOS Config", f"Could not create the configuration: {error}")
+
+        self.nextButton.setEnabled(False)
+        self.tasks.submit(
+            "scaffold",
+            scaffold_job,
+            os.path.join(location, name),
+            self.folderStructure.currentData() or "default",
+            self.existingConfig.text(),
+            self.existingHardwareConfig.text(),
+            on_result=done,
+            on_error=failed,
+            on_finished=lambda: self.nextButton.setEnabled(True),
+        )
+
     def handle_file(self, target: QLineEdit, prompt: str = "Open File", initial_path: str = "~/", file_type=None):
         """Returns a function object that will be a handler for opening a file browser that returns a file
 
@@ -197,46 +252,3 @@ class InitNixosConfig(QWidget):
         """fix for bug that allowed users to set invalid config
         """
         self.enableGit.setChecked(True)
-    
-    def handle_next_button(self):
-        """This function will generate a configuration for the Nixos configuration directory\n
-        example dict structure:
-        ```
-        {
-            "configurationName": "name",
-            "configurationLocation": "location",
-            "git": True,
-            "github": True,
-            "gitlab": True,
-            "flakes": True,
-            "homeManager": True,
-            "existingConfig": "location",
-            "existingHConfig": "location",
-            "directoryTree": [
-                {"hosts": {
-                    "host1": ["hardware-configuration.nix", "configuration.nix"]
-                }},
-                {"users": {
-                    "user1": []
-                }},
-                {"modules": {
-                    "module1": "default.nix"
-                }},
-                "flake.nix"
-            ]
-        }
-        ```
-        """
-        config = {}
-        config["configurationName"] = self.configName.text()
-        config["configurationLocation"] = self.newConfig.text()
-        config["git"] = self.enableGit.isChecked()
-        config["github"] = self.enableGithub.isChecked()
-        config["gitlab"] = self.enableGitlab.isChecked()
-        config["flakes"] = self.enableFlakes.isChecked()
-        config["homeManager"] = self.enableHomeManager.isChecked()
-        config["existingConfig"] = self.existingConfig.text()
-        config["existingHConfig"] = self.existingHardwareConfig.text()
-        config["directoryTree"] = []
-        
-        
\ No newline at end of file
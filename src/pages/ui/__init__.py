@@ -0,0 +1,100 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of GNix.
+#########################################################################################
+# GNix - The Graphical Nix Project                                                      #
+#---------------------------------------------------------------------------------------#
+# GNix is free software: you can redistribute it and/or modify                          #
+# it under the terms of the GNU General Public License as published by                  #
+# the Free Software Foundation, either version 3 of the License, or any later version.  #
+#                                                                                       #
+# GNix is distributed in the hope that it will be useful,                               #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of                        #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the                         #
+# GNU General Public License for more details.                                          #
+#                                                                                       #
+# You should have received a copy of the GNU General Public License                     #
+# along with GNix.  If not, see <https://www.gnu.org/licenses/>.                        #
+#########################################################################################
+"""Loads the pages' Qt Designer `.ui` files.
+
+`python -m src.pages.ui` compiles every `.ui` file in `src/pages` into a Python
+module in this package, so a launch no longer parses the XML. `load_ui` uses
+the compiled module when it is newer than its `.ui` file and falls back to
+`PyQt5.uic.loadUi` otherwise, widgets end up with the same attributes either way.
+"""
+import glob
+import importlib
+import os
+import re
+
+UI_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+PAGES_DIRECTORY = os.path.dirname(UI_DIRECTORY)
+
+def module_name(name: str) -> str:
+    """Name of the compiled module of `<name>.ui`"""
+    return f"{name.lower()}_ui"
+
+def asset_path(path: str) -> str:
+    """Resolves a path in a `.ui` file, which is relative to the `.ui` file"""
+    return os.path.normpath(os.path.join(PAGES_DIRECTORY, path))
+
+def load_ui(widget, name: str) -> None:
+    """Builds the contents of `widget` from `src/pages/<name>.ui`
+
+    Args:
+        widget (QWidget): top level widget of the form
+        name (str): file name of the form without `.ui`
+    """
+    ui_path = os.path.join(PAGES_DIRECTORY, f"{name}.ui")
+    compiled_path = os.path.join(UI_DIRECTORY, module_name(name) + ".py")
+    try:
+        if os.path.getmtime(compiled_path) >= os.path.getmtime(ui_path):
+            module = importlib.import_module(f"{__name__}.{module_name(name)}")
+            form_class = next(value for key, value in vars(module).items() if key.startswith("Ui_"))
+            form = form_class()
+            form.setupUi(widget)
+            # loadUi sets the child widgets as attributes of the widget itself
+            for attribute, value in vars(form).items():
+                setattr(widget, attribute, value)
+            return
+    except (OSError, ImportError, StopIteration):
+        pass
+
+    from PyQt5.uic import loadUi
+    loadUi(ui_path, widget)
+
+def compile_ui(ui_path: str) -> str:
+    """Compiles one `.ui` file into this package
+
+    Args:
+        ui_path (str): path of the `.ui` file
+
+    Returns:
+        str: path of the generated module
+    """
+    import io
+
+    from PyQt5 import uic
+
+    name = os.path.splitext(os.path.basename(ui_path))[0]
+    source = io.StringIO()
+    with open(ui_path, encoding="utf-8") as f:
+        uic.compileUi(f, source)
+    code = source.getvalue()
+    # the forms only use file paths, there are no compiled resource modules to import
+    code = re.sub(r"^import \w+_rc\n", "", code, flags=re.M)
+    # pixmap paths are relative to the .ui file, not to the working directory
+    code = re.sub(r'QtGui\.QPixmap\("([^"]*)"\)', r'QtGui.QPixmap(asset_path("\1"))', code)
+    code = code.replace("from PyQt5 import", "from src.pages.ui import asset_path\nfrom PyQt5 import", 1)
+
+    output_path = os.path.join(UI_DIRECTORY, module_name(name) + ".py")
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(code)
+    os.replace(tmp_path, output_path)
+    return output_path
+
+def compile_all() -> list:
+    """Compiles every `.ui` file in `src/pages`, returns the generated modules"""
+    return [compile_ui(path) for path in sorted(glob.glob(os.path.join(PAGES_DIRECTORY, "*.ui")))]
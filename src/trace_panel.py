@@ -0,0 +1,102 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of GNix.
+#########################################################################################
+# GNix - The Graphical Nix Project                                                      #
+#---------------------------------------------------------------------------------------#
+# GNix is free software: you can redistribute it and/or modify                          #
+# it under the terms of the GNU General Public License as published by                  #
+# the Free Software Foundation, either version 3 of the License, or any later version.  #
+#                                                                                       #
+# GNix is distributed in the hope that it will be useful,                               #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of                        #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the                         #
+# GNU General Public License for more details.                                          #
+#                                                                                       #
+# You should have received a copy of the GNU General Public License                     #
+# along with GNix.  If not, see <https://www.gnu.org/licenses/>.                        #
+#########################################################################################
+"""Debug panel listing the phases recorded by `nix_manager.profiling`.
+
+Only reachable when GNIX_TRACE is set, with Ctrl+Shift+D. The table shows the
+totals per phase, slowest first, and the trace can be exported for
+chrome://tracing or Perfetto.
+"""
+from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import (QDialog, QFileDialog, QHBoxLayout, QHeaderView, QPushButton,
+                             QTableWidget, QTableWidgetItem, QVBoxLayout)
+
+from .nix_manager import profiling
+
+# header -> key in `profiling.summary()` rows
+COLUMNS = (
+    ("Phase", "name"),
+    ("Category", "category"),
+    ("Calls", "calls"),
+    ("Total ms", "total_ms"),
+    ("Max ms", "max_ms"),
+    ("Allocations", "allocations"),
+    ("Allocated KiB", "allocated_bytes"),
+    ("Python objects", "python_blocks"),
+)
+
+def cell(key: str, value) -> QTableWidgetItem:
+    if value is None:
+        return QTableWidgetItem("")
+    if key in ("total_ms", "max_ms"):
+        text = f"{value:.3f}"
+    elif key == "allocated_bytes":
+        text = f"{value / 1024:.1f}"
+    else:
+        text = str(value)
+    item = QTableWidgetItem(text)
+    if not isinstance(value, str):
+        item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+    return item
+
+class TracePanel(QDialog):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Trace")
+        self.resize(800, 400)
+
+        self.table = QTableWidget(0, len(COLUMNS), self)
+        self.table.setHorizontalHeaderLabels([header for header, _ in COLUMNS])
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.verticalHeader().hide()
+
+        refresh_button = QPushButton("Refresh", self)
+        refresh_button.clicked.connect(self.refresh)
+        clear_button = QPushButton("Clear", self)
+        clear_button.clicked.connect(self.handle_clear)
+        export_button = QPushButton("Export Chrome trace...", self)
+        export_button.clicked.connect(self.handle_export)
+
+        buttons = QHBoxLayout()
+        buttons.addWidget(refresh_button)
+        buttons.addWidget(clear_button)
+        buttons.addStretch()
+        buttons.addWidget(export_button)
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.table)
+        layout.addLayout(buttons)
+
+        self.refresh()
+
+    def refresh(self) -> None:
+        phases = profiling.summary()
+        self.table.setRowCount(len(phases))
+        for row, phase in enumerate(phases):
+            for column, (_, key) in enumerate(COLUMNS):
+                self.table.setItem(row, column, cell(key, phase[key]))
+        self.table.resizeColumnsToContents()
+
+    def handle_clear(self) -> None:
+        profiling.clear()
+        self.refresh()
+
+    def handle_export(self) -> None:
+        path, _ = QFileDialog.getSaveFileName(self, "Export Chrome trace", "gnix-trace.json", "Trace (*.json)")
+        if path:
+            profiling.write_chrome_trace(path)
@@ -0,0 +1,155 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of GNix.
+#########################################################################################
+# GNix - The Graphical Nix Project                                                      #
+#---------------------------------------------------------------------------------------#
+# GNix is free software: you can redistribute it and/or modify                          #
+# it under the terms of the GNU General Public License as published by                  #
+# the Free Software Foundation, either version 3 of the License, or any later version.  #
+#                                                                                       #
+# GNix is distributed in the hope that it will be useful,                               #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of                        #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the                         #
+# GNU General Public License for more details.                                          #
+#                                                                                       #
+# You should have received a copy of the GNU General Public License                     #
+# along with GNix.  If not, see <https://www.gnu.org/licenses/>.                        #
+#########################################################################################
+"""Runs parsing, scanning and scaffolding off the Qt main thread.
+
+Jobs are plain functions taking the running `Task` as their first argument,
+they call `task.report(done, total)` to stream progress and `task.check()`
+between steps so a cancelled job stops early. Signals are delivered on the
+main thread, results of cancelled jobs are dropped.
+"""
+import threading
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+class TaskCancelled(Exception):
+    """Raised by `Task.check` once the task was cancelled"""
+
+class TaskSignals(QObject):
+    progress = pyqtSignal(int, int)
+    result = pyqtSignal(object)
+    error = pyqtSignal(object)
+    finished = pyqtSignal()
+
+class Task(QRunnable):
+    """A job submitted to a `TaskRunner`
+
+    Args:
+        fn (Callable): job, called as `fn(task, *args, **kwargs)` on a pool thread
+    """
+    def __init__(self, fn, *args, **kwargs):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = TaskSignals()
+        self._cancelled = threading.Event()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    def is_cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def check(self) -> None:
+        """Stops the job if it was cancelled
+
+        Raises:
+            TaskCancelled: the task was cancelled
+        """
+        if self._cancelled.is_set():
+            raise TaskCancelled()
+
+    def report(self, done: int, total: int) -> None:
+        """Emits progress, `done` out of `total` steps"""
+        if not self._cancelled.is_set():
+            self.signals.progress.emit(done, total)
+
+    def run(self) -> None:
+        try:
+            if self._cancelled.is_set():
+                return
+            result = self.fn(self, *self.args, **self.kwargs)
+            if not self._cancelled.is_set():
+                self.signals.result.emit(result)
+        except TaskCancelled:
+            pass
+        except Exception as e:
+            if not self._cancelled.is_set():
+                self.signals.error.emit(e)
+        finally:
+            self.signals.finished.emit()
+
+class TaskRunner(QObject):
+    """Submits tasks to a thread pool, keeping at most one live task per key.
+    Submitting under a key cancels the task already running under it, so a
+    page only ever sees the result of the latest request.
+
+    Args:
+        parent (QObject, optional): owner
+        pool (QThreadPool, optional): defaults to the global pool
+    """
+    def __init__(self, parent: QObject = None, pool: QThreadPool = None):
+        super().__init__(parent)
+        self.pool = pool or QThreadPool.globalInstance()
+        self.tasks = {}
+
+    def submit(self, key: str, fn, *args, on_result=None, on_progress=None, on_error=None, on_finished=None, **kwargs) -> Task:
+        """Runs `fn(task, *args, **kwargs)` on the pool
+
+        Args:
+            key (str): slot of the task, e.g. `"parse:existingConfig"`
+            fn (Callable): job
+            on_result (Callable, optional): called with the return value of `fn`
+            on_progress (Callable, optional): called with (done, total)
+            on_error (Callable, optional): called with the exception `fn` raised
+            on_finished (Callable, optional): called once the task stopped, even if cancelled
+
+        Returns:
+            Task: the submitted task
+        """
+        self.cancel(key)
+        task = Task(fn, *args, **kwargs)
+        # a cancelled task may still have signals queued, drop them
+        if on_result is not None:
+            task.signals.result.connect(lambda value: task.is_cancelled() or on_result(value))
+        if on_progress is not None:
+            task.signals.progress.connect(lambda done, total: task.is_cancelled() or on_progress(done, total))
+        if on_error is not None:
+            task.signals.error.connect(lambda error: task.is_cancelled() or on_error(error))
+        task.signals.finished.connect(lambda: self._finished(key, task, on_finished))
+        self.tasks[key] = task
+        self.pool.start(task)
+        return task
+
+    def _finished(self, key: str, task: Task, on_finished) -> None:
+        if self.tasks.get(key) is task:
+            del self.tasks[key]
+        if on_finished is not None:
+            on_finished()
+
+    def cancel(self, key: str) -> None:
+        task = self.tasks.pop(key, None)
+        if task is not None:
+            task.cancel()
+            # never started, it can be taken off the queue, `run` will not emit
+            # `finished` for it, so emit it here
+            if self.pool.tryTake(task):
+                task.signals.finished.emit()
+
+    def cancel_all(self) -> None:
+        for key in list(self.tasks):
+            self.cancel(key)
+
+    def is_running(self, key: str) -> bool:
+        return key in self.tasks
+
+    def wait(self, msecs: int = -1) -> bool:
+        """Blocks until every task of the pool is done, mostly for tests and shutdown"""
+        return self.pool.waitForDone(msecs)
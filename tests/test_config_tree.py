@@ -0,0 +1,52 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of GNix.
+#########################################################################################
+# GNix - The Graphical Nix Project                                                      #
+#---------------------------------------------------------------------------------------#
+# GNix is free software: you can redistribute it and/or modify                          #
+# it under the terms of the GNU General Public License as published by                  #
+# the Free Software Foundation, either version 3 of the License, or any later version.  #
+#                                                                                       #
+# GNix is distributed in the hope that it will be useful,                               #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of                        #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the                         #
+# GNU General Public License for more details.                                          #
+#                                                                                       #
+# You should have received a copy of the GNU General Public License                     #
+# along with GNix.  If not, see <https://www.gnu.org/licenses/>.                        #
+#########################################################################################
+"""`ConfigTreeModel` refreshes of partially fetched directories"""
+import pytest
+
+pytest.importorskip("PyQt5", reason="PyQt5 is not installed")
+
+from PyQt5.QtCore import QCoreApplication, QModelIndex
+
+from src.config_tree import FETCH_BATCH, ConfigTreeModel
+
+
+def names(model):
+    return [model.index(row, 0).data() for row in range(model.rowCount())]
+
+
+def test_refresh_keeps_unfetched_rows_pending(tmp_path):
+    QCoreApplication.instance() or QCoreApplication([])
+    for i in range(FETCH_BATCH * 2):
+        (tmp_path / f"f{i:04}").touch()
+    model = ConfigTreeModel()
+    model.set_directory(str(tmp_path))
+    model.fetchMore(QModelIndex())
+    assert model.rowCount() == FETCH_BATCH
+
+    (tmp_path / "e").touch()
+    (tmp_path / "f0001").unlink()
+    (tmp_path / "g").touch()
+    model.refresh()
+    assert model.rowCount() == FETCH_BATCH
+    assert names(model)[:3] == ["e", "f0000", "f0002"]
+    assert model.canFetchMore(QModelIndex())
+
+    while model.canFetchMore(QModelIndex()):
+        model.fetchMore(QModelIndex())
+    assert names(model) == sorted(path.name for path in tmp_path.iterdir())
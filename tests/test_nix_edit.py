@@ -0,0 +1,145 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of GNix.
+#########################################################################################
+# GNix - The Graphical Nix Project                                                      #
+#---------------------------------------------------------------------------------------#
+# GNix is free software: you can redistribute it and/or modify                          #
+# it under the terms of the GNU General Public License as published by                  #
+# the Free Software Foundation, either version 3 of the License, or any later version.  #
+#                                                                                       #
+# GNix is distributed in the hope that it will be useful,                               #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of                        #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the                         #
+# GNU General Public License for more details.                                          #
+#                                                                                       #
+# You should have received a copy of the GNU General Public License                     #
+# along with GNix.  If not, see <https://www.gnu.org/licenses/>.                        #
+#########################################################################################
+"""Round trips of `nixDocument` edits over the files in tests/static"""
+import os
+
+import pytest
+
+pytest.importorskip("nix_parser.nix_parser", reason="the nix_parser extension is not built")
+
+from nix_parser import find_definitions_with_prefix, parse_nix
+
+from src.nix_manager.nix_edit import nixDocument, to_nix
+
+STATIC = os.path.join(os.path.dirname(__file__), "static")
+# valid Nix only, basix-nix.nix is missing a `;` and relies on the parser's error recovery
+STATIC_FILES = [os.path.join(STATIC, name) for name in ("basic-nix.nix", "example-nixos-config.nix")]
+
+
+def load(path: str) -> nixDocument:
+    with open(path, encoding="utf-8") as f:
+        return nixDocument(f.read())
+
+
+def assert_tree_matches_script(document: nixDocument) -> None:
+    """The incrementally updated tree must equal a full parse of the edited script"""
+    assert document.tree.to_dict() == parse_nix(document.script)
+
+
+def attribute_paths(document: nixDocument) -> list:
+    return sorted({path for path, binding in find_definitions_with_prefix(document.tree, "") if binding.kind == "KeyValue"})
+
+
+@pytest.mark.parametrize("path", STATIC_FILES)
+def test_replace_value_round_trip(path):
+    document = load(path)
+    original = document.script
+    for attribute in attribute_paths(document):
+        value = document.text(document.key_values(attribute)[0]["to"])
+        document.set_attribute(attribute, "null")
+        assert document.text(document.key_values(attribute)[0]["to"]) == "null"
+        document.set_attribute(attribute, value)
+        assert document.script == original
+    assert_tree_matches_script(document)
+
+
+@pytest.mark.parametrize("path", STATIC_FILES)
+def test_add_remove_attribute_round_trip(path):
+    document = load(path)
+    original = document.script
+    containers = [""] + [attribute for attribute in attribute_paths(document) if document.value(attribute).kind == "Map"]
+    for container in containers:
+        attribute = f"{container}.gnixTest.enable" if container else "gnixTest.enable"
+        document.set_attribute(attribute, "true")
+        assert_tree_matches_script(document)
+        assert document.text(document.value(attribute)) == "true"
+        document.remove_attribute(attribute)
+        assert document.script == original
+    assert_tree_matches_script(document)
+
+
+@pytest.mark.parametrize("path", STATIC_FILES)
+def test_add_remove_list_item_round_trip(path):
+    document = load(path)
+    original = document.script
+    lists = [attribute for attribute in attribute_paths(document) if document.value(attribute).kind == "List"]
+    assert lists
+    for attribute in lists:
+        document.add_list_items(attribute, ["htop", to_nix("gnix")])
+        assert_tree_matches_script(document)
+        sources = [document.text(element) for element in document.list_at(attribute)["elements"]]
+        assert sources[-2:] == ["htop", '"gnix"']
+        assert document.remove_list_items(attribute, ['"gnix"', "htop"]) == 2
+        assert document.script == original
+    assert_tree_matches_script(document)
+
+
+def test_edits_keep_formatting_and_comments():
+    document = load(os.path.join(STATIC, "example-nixos-config.nix"))
+    original = document.script
+    document.add_list_items("environment.systemPackages", ["htop"])
+    document.set_attribute("networking.hostName", to_nix("gnix"))
+    document.remove_attribute("programs.sway.enable")
+
+    expected = (
+        original.replace("    gnumake\n", "    gnumake\n    htop\n")
+        .replace('networking.hostName = "nix";', 'networking.hostName = "gnix";')
+        .replace("    sway.enable = true;\n", "")
+    )
+    assert document.script == expected
+    assert_tree_matches_script(document)
+
+
+def test_write_keeps_symlink_and_mode(tmp_path):
+    target = tmp_path / "dotfiles" / "configuration.nix"
+    target.parent.mkdir()
+    target.write_bytes(b"{\r\n  a = 1;\r\n}\r\n")
+    target.chmod(0o640)
+    link = tmp_path / "configuration.nix"
+    link.symlink_to(target)
+
+    document = nixDocument.from_file(str(link))
+    document.set_attribute("a", "2")
+    document.write(str(link))
+
+    assert link.is_symlink()
+    assert target.read_bytes() == b"{\r\n  a = 2;\r\n}\r\n"
+    assert target.stat().st_mode & 0o777 == 0o640
+    assert sorted(os.listdir(target.parent)) == ["configuration.nix"]
+
+
+def test_to_nix():
+    assert to_nix({"enable": True, "ports": [22, 80], "user name": None}) == '{ enable = true; ports = [ 22 80 ]; "user name" = null; }'
+    assert to_nix('say "${hi}"\n') == '"say \\"\\${hi}\\"\\n"'
+    with pytest.raises(TypeError):
+        to_nix(object())
+
+
+def test_quoted_segment_round_trip():
+    original = '{\n  a.x = 1;\n  a.b.c = 3;\n}\n'
+    document = nixDocument(original)
+    document.set_attribute('a."b.c"', "2")
+    assert 'a."b.c" = 2;' in document.script
+    assert document.text(document.value('a."b.c"')) == "2"
+    assert document.text(document.value("a.b.c")) == "3"
+    assert_tree_matches_script(document)
+    document.set_attribute('a."b.c"', "4")
+    assert document.text(document.value('a."b.c"')) == "4"
+    document.remove_attribute('a."b.c"')
+    assert document.script == original
@@ -0,0 +1,138 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of GNix.
+#########################################################################################
+# GNix - The Graphical Nix Project                                                      #
+#---------------------------------------------------------------------------------------#
+# GNix is free software: you can redistribute it and/or modify                          #
+# it under the terms of the GNU General Public License as published by                  #
+# the Free Software Foundation, either version 3 of the License, or any later version.  #
+#                                                                                       #
+# GNix is distributed in the hope that it will be useful,                               #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of                        #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the                         #
+# GNU General Public License for more details.                                          #
+#                                                                                       #
+# You should have received a copy of the GNU General Public License                     #
+# along with GNix.  If not, see <https://www.gnu.org/licenses/>.                        #
+#########################################################################################
+"""Attribute paths of the index, `find_key_pair` on lazy trees and dict ASTs, incremental re-parsing"""
+import os
+
+import pytest
+
+pytest.importorskip("nix_parser.nix_parser", reason="the nix_parser extension is not built")
+
+from nix_parser import (
+    LazyNode, Query, find_definitions, find_definitions_with_prefix, find_key_pair, parse_directory, parse_nix,
+    reparse_nix, set_trace_enabled, take_trace_events,
+)
+
+SCRIPT = """{
+  a."b.c" = 1;
+  a.b.c = 2;
+  x = { a = { b = { c = 3; }; }; };
+  a = { b.c = 4; };
+  "quoted\\"name" = 5;
+}
+"""
+
+
+def test_dict_nodes_keep_their_expression_fields():
+    ast = parse_nix('with pkgs; assert x ? y; { a = "${b}"; c = d.e or f; }')
+    with_ = ast["With"]
+    assert with_["expression"]["Identifier"]["id"] == "pkgs"
+    assert_ = with_["target"]["Assert"]
+    assert set(assert_["expression"]["HasAttribute"]) == {"expression", "attribute_path", "span"}
+    bindings = assert_["target"]["Map"]["bindings"]
+    interpolation = bindings[0]["KeyValue"]["to"]["String"]["parts"][0]["Interpolation"]
+    assert interpolation["expression"]["Identifier"]["id"] == "b"
+    access = bindings[1]["KeyValue"]["to"]["PropertyAccess"]
+    assert access["expression"]["Identifier"]["id"] == "d"
+    assert access["default"]["Identifier"]["id"] == "f"
+    assert find_key_pair(ast, "c")["PropertyAccess"] == access
+    # the index and dotted lookups follow with/assert targets in both modes
+    assert find_key_pair(ast, "a.x") is None
+    assert [path for path, _ in find_definitions_with_prefix(parse_nix('with pkgs; assert x; { a.b = 1; }', lazy=True), "")] == ["a.b"]
+    assert find_key_pair(parse_nix("with pkgs; assert x; { a.b = 1; }"), "a.b")["Integer"]["value"] == "1"
+
+
+def test_lazy_children_convert_like_their_parent():
+    def fields(node):
+        # `{"Expression": {kind: fields}}`, `{kind: fields}` or the bare fields
+        converted = node.to_dict()
+        converted = converted.get("Expression", converted)
+        return converted.get(node.kind, converted)
+
+    def check(node):
+        for key in node.keys():
+            value = node[key]
+            children = value if isinstance(value, list) else [value]
+            if not all(isinstance(child, LazyNode) for child in children):
+                continue
+            expected = fields(node)[key]
+            for child, child_dict in zip(children, expected if isinstance(value, list) else [expected], strict=True):
+                assert child.to_dict() == child_dict
+                check(child)
+
+    check(parse_nix('args @ { x, ... }: { a."b.c".${x} = 1; inherit (x) "y"; z = "${x}"; }', lazy=True))
+
+
+def test_quoted_segments_do_not_collide():
+    tree = parse_nix(SCRIPT, lazy=True)
+    paths = [path for path, _ in find_definitions_with_prefix(tree, "a.")]
+    assert paths == ['a."b.c"', "a.b.c", "a.b.c"]
+    assert len(find_definitions(tree, 'a."b.c"')) == 1
+    assert len(find_definitions(tree, "a.b.c")) == 2
+    assert [match.path for match in Query('a."b.c"').run(tree)] == ['a."b.c"']
+    assert [match.path for match in Query('"quoted\\"name"').run(tree)] == ['"quoted\\"name"']
+
+
+@pytest.mark.parametrize("key", ["a.b.c", 'a."b.c"', "x.a.b.c", "c", "b.c", "missing.path"])
+def test_lazy_and_dict_find_the_same_definition(key):
+    lazy = find_key_pair(parse_nix(SCRIPT, lazy=True), key)
+    ast = find_key_pair(parse_nix(SCRIPT), key)
+    if ast is None:
+        assert lazy is None
+    else:
+        assert lazy is not None and lazy.to_dict() == ast
+
+
+def test_dotted_key_returns_first_definition_in_source_order():
+    assert find_key_pair(parse_nix(SCRIPT), "a.b.c")["Integer"]["value"] == "2"
+    assert find_key_pair(parse_nix(SCRIPT, lazy=True), "a.b.c").text == "2"
+
+
+@pytest.mark.parametrize("inserted", ["  b = 2;\n", "  b = 2; # new\n  c.d = [ 3 ];\n", "  # comment only\n"])
+def test_binding_appended_before_closing_brace_is_reparsed_incrementally(inserted):
+    script = "{ pkgs, ... }:\n{\n  a = 1;\n}\n"
+    at = script.rindex("}")
+    set_trace_enabled(True)
+    try:
+        take_trace_events()
+        tree = reparse_nix(parse_nix(script, lazy=True), script, at, at, inserted)
+        phases = [event[0] for event in take_trace_events()]
+    finally:
+        set_trace_enabled(False)
+    assert "reparse" in phases
+    assert "full reparse" not in phases
+    edited = script[:at] + inserted + script[at:]
+    assert tree.to_dict() == parse_nix(edited, lazy=True).to_dict()
+
+
+@pytest.mark.skipif(os.geteuid() == 0, reason="root can list any directory")
+def test_unreadable_directory_is_an_error_result(tmp_path):
+    (tmp_path / "a.nix").write_text("{ a = 1; }\n")
+    locked = tmp_path / "locked"
+    locked.mkdir()
+    (locked / "b.nix").write_text("{ b = 2; }\n")
+    (tmp_path / "z").mkdir()
+    (tmp_path / "z" / "c.nix").write_text("{ c = 3; }\n")
+    locked.chmod(0)
+    try:
+        results = {result.path: result for result in parse_directory(str(tmp_path))}
+    finally:
+        locked.chmod(0o755)
+    assert results[str(locked)].ast is None and results[str(locked)].error
+    assert results[str(tmp_path / "a.nix")].ast is not None
+    assert results[str(tmp_path / "z" / "c.nix")].ast is not None
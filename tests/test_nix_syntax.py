@@ -0,0 +1,44 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of GNix.
+#########################################################################################
+# GNix - The Graphical Nix Project                                                      #
+#---------------------------------------------------------------------------------------#
+# GNix is free software: you can redistribute it and/or modify                          #
+# it under the terms of the GNU General Public License as published by                  #
+# the Free Software Foundation, either version 3 of the License, or any later version.  #
+#                                                                                       #
+# GNix is distributed in the hope that it will be useful,                               #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of                        #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the                         #
+# GNU General Public License for more details.                                          #
+#                                                                                       #
+# You should have received a copy of the GNU General Public License                     #
+# along with GNix.  If not, see <https://www.gnu.org/licenses/>.                        #
+#########################################################################################
+"""Nix source and dotted attribute paths of `nix_syntax`, no extension needed"""
+import pytest
+
+from src.nix_manager.nix_syntax import attr_name, join_path, split_path, to_nix
+
+
+@pytest.mark.parametrize("path, segments", [
+    ("services.openssh.enable", ["services", "openssh", "enable"]),
+    ('a."b.c"', ["a", "b.c"]),
+    ('networking.hosts."127.0.0.1"', ["networking", "hosts", "127.0.0.1"]),
+    ('"quoted\\"name".x', ['quoted"name', "x"]),
+    ('"back\\\\slash"', ["back\\slash"]),
+])
+def test_split_join_round_trip(path, segments):
+    assert split_path(path) == segments
+    assert join_path(segments) == path
+
+
+def test_unneeded_quotes_are_dropped():
+    assert join_path(split_path('a."b".c')) == "a.b.c"
+
+
+def test_attr_name_and_to_nix():
+    assert attr_name("enable") == "enable"
+    assert attr_name("b.c") == '"b.c"'
+    assert to_nix({"a": [1, True, None], "b c": "${x}"}) == '{ a = [ 1 true null ]; "b c" = "\\${x}"; }'
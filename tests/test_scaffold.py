@@ -0,0 +1,45 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of GNix.
+#########################################################################################
+# GNix - The Graphical Nix Project                                                      #
+#---------------------------------------------------------------------------------------#
+# GNix is free software: you can redistribute it and/or modify                          #
+# it under the terms of the GNU General Public License as published by                  #
+# the Free Software Foundation, either version 3 of the License, or any later version.  #
+#                                                                                       #
+# GNix is distributed in the hope that it will be useful,                               #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of                        #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the                         #
+# GNU General Public License for more details.                                          #
+#                                                                                       #
+# You should have received a copy of the GNU General Public License                     #
+# along with GNix.  If not, see <https://www.gnu.org/licenses/>.                        #
+#########################################################################################
+"""Configuration directories created by `scaffolder`"""
+import os
+
+import pytest
+
+from src.nix_manager.scaffold import expand_tree, scaffolder
+
+
+def test_dotted_names_are_directories(tmp_path):
+    path = scaffolder("default-with-users", hosts=["box.example.com"], users=["john.doe"]).create(str(tmp_path / "config"))
+    assert os.path.isdir(os.path.join(path, "hosts", "box.example.com"))
+    assert os.path.isfile(os.path.join(path, "hosts", "box.example.com", "configuration.nix"))
+    assert os.path.isdir(os.path.join(path, "users", "john.doe"))
+    with open(os.path.join(path, "flake.nix"), encoding="utf-8") as f:
+        flake = f.read()
+    assert "./hosts/box.example.com/configuration.nix" in flake
+
+
+def test_empty_directories_stay_directories():
+    tree = expand_tree({"modules": {}, "flake.nix": None})
+    assert tree == {"modules": {}, "flake.nix": None}
+
+
+@pytest.mark.parametrize("name", ["a/b", "..", ""])
+def test_invalid_host_names(name):
+    with pytest.raises(ValueError):
+        expand_tree({"hosts": {"host1": {"configuration.nix": None}}}, hosts=[name])
@@ -0,0 +1,48 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of GNix.
+#########################################################################################
+# GNix - The Graphical Nix Project                                                      #
+#---------------------------------------------------------------------------------------#
+# GNix is free software: you can redistribute it and/or modify                          #
+# it under the terms of the GNU General Public License as published by                  #
+# the Free Software Foundation, either version 3 of the License, or any later version.  #
+#                                                                                       #
+# GNix is distributed in the hope that it will be useful,                               #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of                        #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the                         #
+# GNU General Public License for more details.                                          #
+#                                                                                       #
+# You should have received a copy of the GNU General Public License                     #
+# along with GNix.  If not, see <https://www.gnu.org/licenses/>.                        #
+#########################################################################################
+"""Static checks over the Python sources, these need neither Qt nor the extension"""
+import ast
+import glob
+import os
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCES = sorted(glob.glob(os.path.join(ROOT, "src", "**", "*.py"), recursive=True))
+
+
+@pytest.mark.parametrize("path", SOURCES, ids=lambda path: os.path.relpath(path, ROOT))
+def test_methods_defined_once(path):
+    """A second `def` of a method silently replaces the first"""
+    with open(path, encoding="utf-8") as f:
+        module = ast.parse(f.read(), path)
+    for node in ast.walk(module):
+        if not isinstance(node, ast.ClassDef):
+            continue
+        seen = {}
+        for statement in node.body:
+            if not isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                continue
+            # property setters and overloads reuse the name on purpose
+            if any(isinstance(decorator, ast.Attribute) for decorator in statement.decorator_list):
+                continue
+            assert statement.name not in seen, (
+                f"{node.name}.{statement.name} defined on lines {seen[statement.name]} and {statement.lineno}"
+            )
+            seen[statement.name] = statement.lineno
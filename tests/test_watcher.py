@@ -0,0 +1,89 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of GNix.
+#########################################################################################
+# GNix - The Graphical Nix Project                                                      #
+#---------------------------------------------------------------------------------------#
+# GNix is free software: you can redistribute it and/or modify                          #
+# it under the terms of the GNU General Public License as published by                  #
+# the Free Software Foundation, either version 3 of the License, or any later version.  #
+#                                                                                       #
+# GNix is distributed in the hope that it will be useful,                               #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of                        #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the                         #
+# GNU General Public License for more details.                                          #
+#                                                                                       #
+# You should have received a copy of the GNU General Public License                     #
+# along with GNix.  If not, see <https://www.gnu.org/licenses/>.                        #
+#########################################################################################
+"""`configWatcher` following watched directories that are deleted, moved or recreated"""
+import os
+import shutil
+import time
+
+import pytest
+
+pytest.importorskip("nix_parser.nix_parser", reason="the nix_parser extension is not built")
+
+from src.nix_manager.watcher import IN_Q_OVERFLOW, configWatcher
+
+
+def wait_for(condition, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+def write(path, text: str = "{ a = 1; }\n") -> str:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    return str(path)
+
+
+@pytest.fixture
+def watcher(tmp_path):
+    root = tmp_path / "config"
+    write(root / "hosts" / "configuration.nix")
+    watcher = configWatcher([str(root)], debounce=0.02, poll_interval=0.05).start()
+    if watcher.polling:
+        watcher.stop()
+        pytest.skip("inotify is not available")
+    yield watcher, str(root)
+    watcher.stop()
+
+
+def test_deleted_root_is_watched_again_once_recreated(watcher):
+    watcher, root = watcher
+    assert wait_for(lambda: len(watcher.index) == 1)
+    shutil.rmtree(root)
+    assert wait_for(lambda: len(watcher.index) == 0)
+    path = write(os.path.join(root, "flake.nix"))
+    assert wait_for(lambda: path in watcher.index)
+
+
+def test_moved_root_drops_its_files_and_stops_following_them(watcher, tmp_path):
+    watcher, root = watcher
+    moved = str(tmp_path / "moved")
+    os.rename(root, moved)
+    assert wait_for(lambda: len(watcher.index) == 0)
+    write(os.path.join(moved, "hosts", "other.nix"))
+    path = write(os.path.join(root, "new.nix"))
+    assert wait_for(lambda: path in watcher.index)
+    assert watcher.index.files() == [path]
+
+
+def test_overflow_watches_directories_created_meanwhile(watcher):
+    watcher, root = watcher
+    directory = os.path.join(root, "modules")
+    os.makedirs(directory)
+    # pretend the creation was lost: forget the watch, then overflow
+    for wd, path in list(watcher._watches.items()):
+        if path == directory:
+            watcher._notify.rm_watch(wd)
+    assert wait_for(lambda: directory not in watcher._watches.values())
+    watcher._handle(-1, IN_Q_OVERFLOW, "")
+    assert directory in watcher._watches.values()
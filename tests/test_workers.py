@@ -0,0 +1,56 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of GNix.
+#########################################################################################
+# GNix - The Graphical Nix Project                                                      #
+#---------------------------------------------------------------------------------------#
+# GNix is free software: you can redistribute it and/or modify                          #
+# it under the terms of the GNU General Public License as published by                  #
+# the Free Software Foundation, either version 3 of the License, or any later version.  #
+#                                                                                       #
+# GNix is distributed in the hope that it will be useful,                               #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of                        #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the                         #
+# GNU General Public License for more details.                                          #
+#                                                                                       #
+# You should have received a copy of the GNU General Public License                     #
+# along with GNix.  If not, see <https://www.gnu.org/licenses/>.                        #
+#########################################################################################
+"""`TaskRunner` callbacks of running and cancelled tasks"""
+import threading
+
+import pytest
+
+pytest.importorskip("PyQt5", reason="PyQt5 is not installed")
+
+from PyQt5.QtCore import QCoreApplication, QThreadPool
+
+from src.workers import TaskRunner
+
+
+@pytest.fixture
+def runner():
+    app = QCoreApplication.instance() or QCoreApplication([])
+    pool = QThreadPool()
+    pool.setMaxThreadCount(1)
+    runner = TaskRunner(pool=pool)
+    yield runner
+    runner.cancel_all()
+    runner.wait()
+    app.processEvents()
+
+
+def test_cancelled_queued_task_still_finishes(runner):
+    release = threading.Event()
+    runner.submit("busy", lambda task: release.wait(5))
+    finished = []
+    results = []
+    runner.submit("queued", lambda task: "done", on_result=results.append, on_finished=lambda: finished.append(True))
+    runner.cancel("queued")
+    assert finished == [True]
+    assert not runner.is_running("queued")
+    release.set()
+    runner.wait()
+    QCoreApplication.processEvents()
+    assert results == []
+    assert finished == [True]